@@ -1,26 +1,13 @@
-import json
 import os
 import warnings
 
 import click
-from dotenv import load_dotenv
-from snews import messages
 
 from . import snews_pt_utils
-from .auxiliary.try_scenarios import try_scenarios
-from .messages import Publisher
-from .snews_sub import Subscriber
-
-envpath = os.path.join(os.path.dirname(__file__), "auxiliary/test-config.env")
-load_dotenv(envpath)
-
-if int(os.getenv("HAS_NAME_CHANGED")) == 0:
-    warning_text = click.style(
-        'You are using default detector name "TEST"\n'
-        "Please change this by snews_pt.snews_pt_utils.set_name()",
-        fg="red",
-    )
-    warnings.warn(warning_text, UserWarning)
+
+# Commands import what they need themselves: the command line has to start fast,
+# e.g. for `snews_pt heartbeat` from a cron job, and not every command needs
+# hop, the snews models or the subscriber.
 
 
 @click.group(invoke_without_command=True,
@@ -34,8 +21,20 @@ if int(os.getenv("HAS_NAME_CHANGED")) == 0:
     show_default="auxiliary/test-config.env",
     help="environment file containing the configurations",
 )
+@click.option(
+    "--metrics-port",
+    type=int,
+    default=None,
+    help="Serve Prometheus metrics on http://127.0.0.1:PORT/",
+)
+@click.option(
+    "--metrics-file",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Write Prometheus metrics to this file (textfile collector), updated every 15 s",
+)
 @click.pass_context
-def main(ctx, env):
+def main(ctx, env, metrics_port, metrics_file):
     """User interface for snews_pt tools"""
     base = os.path.dirname(os.path.realpath(__file__))
     env_path = base + env
@@ -45,6 +44,31 @@ def main(ctx, env):
     ctx.obj["DETECTOR_NAME"] = os.getenv("DETECTOR_NAME")
     ctx.obj["USER_PASS"] = os.getenv("ADMIN_PASS", "NO_AUTH")
 
+    if int(os.getenv("HAS_NAME_CHANGED", 1)) == 0:
+        warning_text = click.style(
+            'You are using default detector name "TEST"\n'
+            "Please change this by snews_pt.snews_pt_utils.set_name()",
+            fg="red",
+        )
+        warnings.warn(warning_text, UserWarning)
+
+    if metrics_port is None and metrics_file is None:
+        return
+    from .core import metrics
+
+    metrics.enable()
+    if metrics_port is not None:
+        server = metrics.start_http_server(metrics_port)
+        ctx.call_on_close(server.shutdown)
+    if metrics_file is not None:
+        stop_writer = metrics.start_textfile_writer(metrics_file)
+
+        def _final_write():
+            stop_writer.set()
+            metrics.write_textfile(metrics_file)
+
+        ctx.call_on_close(_final_write)
+
 
 @main.command()
 @click.option(
@@ -67,18 +91,47 @@ def main(ctx, env):
     show_default="0",
     help="Verbosity level. 0: no output, 1: print simple feedback, 2: print message details.",
 )
+@click.option(
+    "--workers",
+    "-j",
+    default=4,
+    show_default="4",
+    help="Number of threads used to read and validate the json files.",
+)
+@click.option(
+    "--serializer",
+    type=click.Choice(["pickle", "json", "msgpack"]),
+    default="pickle",
+    show_default="pickle",
+    help="Wire format of the published messages",
+)
+@click.option(
+    "--outbox",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Directory of a persistent outbox, unsent messages are replayed on the next run",
+)
 @click.argument("file", nargs=-1)
 @click.pass_context
-def publish(ctx, file, firedrill, force, verbose):
+def publish(ctx, file, firedrill, force, verbose, workers, serializer, outbox):
     """Publish a message using snews_pub, multiple files are allowed
 
     $: snews_pt publish my_json_message.json
 
+    Directories and glob patterns are expanded to the json files they contain,
+    e.g. `snews_pt publish messages/` or `snews_pt publish "messages/*.json"`.
+    All files are published over a single connection and a summary is printed at the end.
+
     Notes
 
     The topics are read from the defaults i.e. from auxiliary/test-config.env
     If no file is given it can still submit dummy messages with default values
     """
+    import json
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    from .messages import Publisher, load_json_messages
 
     def _check_detector_name(json_detector_name, env_detector_name, force):
         """Check if detector name in json file matches the environment detector name.
@@ -108,35 +161,73 @@ def publish(ctx, file, firedrill, force, verbose):
         return env_detector_name
 
     if firedrill:
-        publisher = Publisher(kafka_topic=os.getenv("FIREDRILL_OBSERVATION_TOPIC"))
+        publisher = Publisher(kafka_topic=os.getenv("FIREDRILL_OBSERVATION_TOPIC"),
+                              serializer=serializer, outbox=outbox)
     else:
-        publisher = Publisher(kafka_topic=os.getenv("OBSERVATION_TOPIC"))
+        publisher = Publisher(kafka_topic=os.getenv("OBSERVATION_TOPIC"),
+                              serializer=serializer, outbox=outbox)
+
+    def _load(filename):
+        try:
+            return load_json_messages(filename), None
+        except FileNotFoundError:
+            return None, f"File not found: {filename}"
+        except json.JSONDecodeError as e:
+            return None, f"Invalid JSON in {filename}: {e}"
+        except Exception as e:
+            return None, f"An unexpected error occurred: {e}"
+
+    files = snews_pt_utils.collect_json_files(file)
+
+    # read and validate in parallel, publish in the given order
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        loaded = list(pool.map(_load, files))
+    t_parsed = time.perf_counter()
 
     env_detector_name = ctx.obj["DETECTOR_NAME"]
-    for filename in file:
-        if filename.endswith(".json"):
-            try:
-                with open(filename, "r", encoding="utf-8") as json_file:
-                    json_data = json.load(
-                        json_file
-                    )
-                    snews_messages = messages.create_messages(**json_data)
+    summary = []
+    n_sent = 0
+    with publisher:
+        for filename, (snews_messages, error) in zip(files, loaded):
+            if error is None:
+                try:
                     for message in snews_messages:
                         _detector_name = _check_detector_name(
                             message.detector_name, env_detector_name, force)
                         message.detector_name = _detector_name
                         publisher.add_message(message)
                     publisher.send(verbose=verbose)
-
-            except FileNotFoundError:
-                click.echo(f"Error: File not found: {filename}")
-            except json.JSONDecodeError as e:
-                click.echo(f"Error: Invalid JSON in {filename}: {e}")
-            except Exception as e:
-                click.echo(f"An unexpected error occurred: {e}")
-
-        else:
-            raise TypeError(f"Expected json file with .json format! Got {filename}")
+                    n_sent += len(snews_messages)
+                except Exception as e:
+                    publisher.message_queue.clear()
+                    error = f"Could not send {filename}: {e}"
+            if error is not None:
+                click.echo(f"Error: {error}")
+            summary.append((filename, error))
+    t_sent = time.perf_counter()
+
+    n_failed = sum(error is not None for _, error in summary)
+    if len(summary) > 1 or n_failed:
+        click.secho(
+            f"Published {len(summary) - n_failed}/{len(summary)} file(s)",
+            fg="red" if n_failed else "green", bold=True,
+        )
+        for filename, error in summary:
+            if error is None:
+                click.secho(f"  OK      {filename}", fg="green")
+            else:
+                click.secho(f"  FAILED  {filename}: {error}", fg="red")
+    if verbose >= 1 and files:
+        parse_time = t_parsed - t_start
+        send_time = t_sent - t_parsed
+        click.secho(
+            f"Parsed {len(files)} file(s) in {parse_time:.3f} s "
+            f"({len(files) / max(parse_time, 1e-9):.1f} files/s), "
+            f"sent {n_sent} message(s) in {send_time:.3f} s "
+            f"({n_sent / max(send_time, 1e-9):.1f} msg/s)",
+            fg="blue",
+        )
 
 
 @main.command()
@@ -169,19 +260,37 @@ def publish(ctx, file, firedrill, force, verbose):
     show_default="0",
     help="Verbosity level. 0: no output, 1: print simple feedback, 2: print message details.",
 )
+@click.option(
+    "--serializer",
+    type=click.Choice(["pickle", "json", "msgpack"]),
+    default="pickle",
+    show_default="pickle",
+    help="Wire format of the published messages",
+)
+@click.option(
+    "--outbox",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Directory of a persistent outbox, unsent messages are replayed on the next run",
+)
 @click.pass_context
-def heartbeat(ctx, status, time, firedrill, verbose):
+def heartbeat(ctx, status, time, firedrill, verbose, serializer, outbox):
     """Publish heartbeat message
 
     :param status: Status of the experiment ON/OFF.
     :param time: (optional) Machine time is appended as the time of execution
                  different time can be passed following the iso-format
     """
+    from snews import messages
+
+    from .messages import Publisher
 
     if firedrill:
-        publisher = Publisher(kafka_topic=os.getenv("FIREDRILL_OBSERVATION_TOPIC"))
+        publisher = Publisher(kafka_topic=os.getenv("FIREDRILL_OBSERVATION_TOPIC"),
+                              serializer=serializer, outbox=outbox)
     else:
-        publisher = Publisher(kafka_topic=os.getenv("OBSERVATION_TOPIC"))
+        publisher = Publisher(kafka_topic=os.getenv("OBSERVATION_TOPIC"),
+                              serializer=serializer, outbox=outbox)
 
     message = messages.HeartbeatMessage(
         detector_name=ctx.obj["DETECTOR_NAME"],
@@ -190,13 +299,194 @@ def heartbeat(ctx, status, time, firedrill, verbose):
         is_firedrill=firedrill,
     )
 
-    publisher.add_message(message)
-    publisher.send(verbose=verbose)
+    with publisher:
+        publisher.add_message(message)
+        publisher.send(verbose=verbose)
+
+
+@main.command()
+@click.option(
+    "--firedrill/--no-firedrill",
+    default=True,
+    show_default="True",
+    help="Whether to use firedrill brokers or default ones",
+)
+@click.option(
+    "--every",
+    "-e",
+    type=float,
+    default=60.0,
+    show_default="60",
+    help="Seconds between two heartbeats",
+)
+@click.option(
+    "--status-source",
+    "-s",
+    type=str,
+    default="ON",
+    show_default="ON",
+    help="ON, OFF, file:PATH, cmd:COMMAND or py:module:function",
+)
+@click.option(
+    "--count",
+    "-n",
+    type=int,
+    default=None,
+    help="Stop after this many heartbeats, run forever if not given",
+)
+@click.option(
+    "--verbose",
+    "-v",
+    default=0,
+    show_default="0",
+    help="Verbosity level. 0: no output, 1: print simple feedback, 2: print message details.",
+)
+@click.option(
+    "--serializer",
+    type=click.Choice(["pickle", "json", "msgpack"]),
+    default="pickle",
+    show_default="pickle",
+    help="Wire format of the published messages",
+)
+@click.pass_context
+def heartbeat_daemon(ctx, firedrill, every, status_source, count, verbose, serializer):
+    """Keep sending heartbeats every N seconds over one connection
+
+    $: snews_pt heartbeat-daemon --every 60 --status-source file:/path/to/status
+
+    The detector status is read before every beat from the status source.
+    Stops cleanly on SIGINT/SIGTERM.
+    """
+    import signal
+
+    from .heartbeat import HeartbeatDaemon
+    from .messages import Publisher
+
+    topic = os.getenv("FIREDRILL_OBSERVATION_TOPIC" if firedrill else "OBSERVATION_TOPIC")
+    # keep the producer open between beats however far apart they are
+    publisher = Publisher(kafka_topic=topic, serializer=serializer, idle_timeout=None,
+                          max_queue_size=100, queue_policy="drop-oldest-heartbeat")
+    daemon = HeartbeatDaemon(publisher, ctx.obj["DETECTOR_NAME"], every=every,
+                             status=status_source, is_firedrill=firedrill, verbose=verbose)
+
+    handlers = {sig: signal.signal(sig, daemon.stop) for sig in (signal.SIGINT, signal.SIGTERM)}
+    click.secho(f"Sending heartbeats to {topic} every {every} s", fg="green", bold=True)
+    try:
+        with publisher:
+            daemon.run(count=count)
+    finally:
+        for sig, handler in handlers.items():
+            signal.signal(sig, handler)
+    click.secho(f"Stopped after {daemon.sent} heartbeat(s), {daemon.failed} failed", fg="green")
 
 
 @main.command()
-@click.option("--plugin", "-p", type=str, default="None")
+@click.option(
+    "--plugin",
+    "-p",
+    type=str,
+    multiple=True,
+    help="Plugin file, module path or entry point name that handles each alert. "
+         "With several --topic, TOPIC=PLUGIN sets the plugin of a single topic",
+)
+@click.option(
+    "--topic",
+    "-t",
+    "topics",
+    multiple=True,
+    help="Subscribe to several topics at once: alert, firedrill, test or a kafka url. "
+         "Can be repeated, alerts are saved in a sub folder per topic",
+)
+@click.option(
+    "--plugin-workers",
+    type=int,
+    default=0,
+    show_default=True,
+    help="Run the plugin in this many worker processes, 0 runs it in the subscriber",
+)
+@click.option(
+    "--plugin-timeout",
+    type=float,
+    default=None,
+    help="Seconds a plugin worker may spend on one alert before it is restarted",
+)
 @click.option("--outputfolder", "-o", type=str, default="None")
+@click.option(
+    "--storage",
+    type=click.Choice(["json", "sqlite"]),
+    default="json",
+    show_default=True,
+    help="Save each alert to its own json file, or to an indexed sqlite database",
+)
+@click.option(
+    "--database",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="sqlite database for --storage sqlite, defaults to snews_alerts.sqlite in the output folder",
+)
+@click.option(
+    "--write-behind/--no-write-behind",
+    default=True,
+    show_default=True,
+    help="Write alert json files from a background thread",
+)
+@click.option(
+    "--fsync-window",
+    type=float,
+    default=0.05,
+    show_default=True,
+    help="Seconds within which written alert files are synced to disk together",
+)
+@click.option(
+    "--from",
+    "start_from",
+    default="checkpoint",
+    show_default=True,
+    help="Where to start reading: earliest, latest, checkpoint (resume after the last "
+         "processed alert) or a UTC time such as 2025-11-05T17:00:00",
+)
+@click.option(
+    "--checkpoint",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="File keeping the offsets of processed alerts, "
+         "defaults to .snews_pt_checkpoint.json in the output folder",
+)
+@click.option(
+    "--alert-type",
+    multiple=True,
+    help="Only handle alerts of this type, e.g. RETRACTION. Can be repeated",
+)
+@click.option(
+    "--detector",
+    "detectors",
+    multiple=True,
+    help="Only handle alerts involving this detector. Can be repeated (any of them)",
+)
+@click.option(
+    "--test-alerts/--no-test-alerts",
+    "test_alerts",
+    default=None,
+    help="Only handle alerts flagged as test, or only those that are not (default: both)",
+)
+@click.option(
+    "--display/--no-display",
+    default=True,
+    show_default=True,
+    help="Show the alerts in the terminal, turn off on headless servers",
+)
+@click.option(
+    "--dedup/--no-dedup",
+    default=True,
+    show_default=True,
+    help="Skip alerts that were already processed, e.g. when they are redelivered",
+)
+@click.option(
+    "--dedup-index",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Also remember processed alerts in this file, so duplicates are recognized after a restart",
+)
 @click.option(
     "--firedrill/--no-firedrill",
     default=True,
@@ -210,25 +500,58 @@ def heartbeat(ctx, status, time, firedrill, verbose):
     help="If True subscribe to test topic",
 )
 @click.pass_context
-def subscribe(ctx, plugin, outputfolder, firedrill, test):
+def subscribe(ctx, plugin, topics, plugin_workers, plugin_timeout, outputfolder, storage,
+              database, write_behind, fsync_window, start_from, checkpoint, alert_type, detectors,
+              test_alerts, display, dedup, dedup_index, firedrill, test):
     """Subscribe to Alert topic
 
-    Optionally, `plugin` script can be passed
-    The message content as a single dictionary will be passed to
-    this script as a positional argument.
-    dictionary follows the snews_alert message schema
+    Optionally, a `plugin` can be passed. It is imported once and its
+    `handle(alert)` function is called with every alert dictionary,
+    which follows the snews_alert message schema.
+    Optional `setup()` and `teardown()` functions are called once at start and exit.
+    Scripts without a `handle` function are run for every alert
+    with the saved json file as a positional argument.
+    With `--plugin-workers`, the plugin runs in separate worker processes
+    so a slow or crashing plugin does not hold up the subscription.
+    Several topics can be watched by one subscriber with repeated `--topic`.
 
     """
-    sub = Subscriber(ctx.obj["env"], firedrill_mode=firedrill)
+    from .core.checkpoint import parse_start
+    from .snews_sub import Subscriber
+
+    try:
+        start_from = parse_start(start_from)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--from")
+    outputfolder = None if outputfolder == "None" else outputfolder
+    if checkpoint is None:
+        folder = outputfolder or os.path.join(os.getcwd(), os.getenv("ALERT_OUTPUT"))
+        checkpoint = os.path.join(folder, ".snews_pt_checkpoint.json")
+    sub = Subscriber(ctx.obj["env"], firedrill_mode=firedrill, storage=storage, database=database,
+                     write_behind=write_behind, fsync_window=fsync_window, checkpoint=checkpoint,
+                     dedup=(dedup_index or True) if dedup else False)
+    plugins = {}
+    for spec in plugin:
+        label, sep, target = spec.partition("=")
+        if sep and topics and label.strip() in topics:
+            plugins[label.strip()] = target
+        elif spec != "None":
+            plugins[None] = spec
+    for spec in plugins.values():
+        print(f"Redirecting output to {spec}")
+    filters = dict(alert_type=alert_type, detectors=detectors, is_test=test_alerts)
     try:
-        if plugin != "None":
-            print(f"Redirecting output to {plugin}")
-            for saved_json in sub.subscribe_and_redirect_alert(
-                outputfolder=outputfolder, is_test=test
-            ):
-                os.system(f"python {plugin} {saved_json}")
+        if topics:
+            if None in plugins:
+                default = plugins.pop(None)
+                plugins = {label: plugins.get(label, default) for label in topics}
+            sub.subscribe_topics(topics, outputfolder=outputfolder, plugin=plugins,
+                                 plugin_workers=plugin_workers, plugin_timeout=plugin_timeout,
+                                 start_at=start_from, filters=filters, display=display)
         else:
-            sub.subscribe(outputfolder=outputfolder, is_test=test)
+            sub.subscribe(outputfolder=outputfolder, is_test=test, plugin=plugins.get(None),
+                          plugin_workers=plugin_workers, plugin_timeout=plugin_timeout,
+                          start_at=start_from, filters=filters, display=display)
     except KeyboardInterrupt:
         pass
 
@@ -241,6 +564,7 @@ def message_schema(ctx, requested_tier):
 
     If 'all' is passed, displays everything.
     """
+    from snews import messages
 
     valid_tiers = [
         m.replace("Message", "") for m in messages.__all__ if m.endswith("Message")
@@ -296,6 +620,8 @@ def run_scenarios(firedrill, test):
     # base = os.path.dirname(os.path.realpath(__file__))
     # path = os.path.join(base, 'auxiliary/try_scenarios.py')
     # os.system(f'python3 {path} {firedrill} {test}')
+    from .auxiliary.try_scenarios import try_scenarios
+
     try_scenarios(fd_mode=firedrill, is_test=test)
 
 
@@ -324,16 +650,21 @@ def set_name(name):
     help="Whether to use firedrill brokers or default ones",
 )
 @click.option(
-    "--start_at", "-s", type=str, default="LATEST", help="either LATEST or EARLIEST"
+    "--start_at", "-s", type=str, default="LATEST",
+    help="LATEST, an ISO time (UTC) or EARLIEST (a minute before sending) to look for the confirmation from",
+)
+@click.option(
+    "--patience", "-p", type=float, default=8,
+    help="Seconds to wait at most for the confirmation",
 )
-@click.option("--patience", "-p", type=int, default=8)
 @click.pass_context
 def test_connection(ctx, firedrill, start_at, patience):
     """Test the connection to the server
 
-    It should prompt your whether the coincidence script is running in the server
-    :param start_at: `str` Where to start looking for the confirmation LATEST or EARLIEST
-    :param patience: `int` seconds to wait before the check
+    It should prompt your whether the coincidence script is running in the server,
+    and how long the round trip took
+    :param start_at: `str` Where to start looking for the confirmation LATEST, EARLIEST or a time
+    :param patience: `float` seconds to wait at most for the confirmation
         Sometime, it takes time for server to respond, increase patience
     """
     from .remote_commands import test_connection
@@ -346,6 +677,59 @@ def test_connection(ctx, firedrill, start_at, patience):
     )
 
 
+@main.command()
+@click.option(
+    "--firedrill/--no-firedrill",
+    default=True,
+    show_default="True",
+    help="Whether to use firedrill brokers or default ones",
+)
+@click.option("--count", "-n", type=click.IntRange(min=1), default=10, show_default=True,
+              help="Number of probes")
+@click.option("--rate", "-r", type=click.FloatRange(min=0, min_open=True), default=1.0,
+              show_default=True, help="Probes per second")
+@click.option("--patience", "-p", type=float, default=8, show_default=True,
+              help="Seconds to wait for confirmations after the last probe")
+@click.option("--csv", "csv_file", type=click.Path(dir_okay=False), default=None,
+              help="Write the round-trip time of every probe to this CSV file")
+@click.pass_context
+def probe(ctx, firedrill, count, rate, patience, csv_file):
+    """Measure the round-trip time to the server with repeated connection tests
+
+    Prints the min/p50/p90/p99/max round-trip time and the fraction of probes
+    that were not confirmed
+    """
+    import csv
+
+    from .remote_commands import probe, probe_stats
+
+    click.secho(f"> Sending {count} probes at {rate:g}/s", fg="blue", bold=True)
+    rows = probe(count=count, rate=rate, detector_name=ctx.obj["DETECTOR_NAME"],
+                 firedrill=firedrill, patience=patience)
+    stats = probe_stats(rows)
+
+    if stats["received"]:
+        click.echo(
+            "> round trip [ms]  "
+            + "  ".join(f"{name} {stats[f'{name}_ms']:.1f}"
+                        for name in ("min", "p50", "p90", "p99", "max"))
+        )
+    click.secho(
+        f"> {stats['received']}/{stats['sent']} confirmed, loss {stats['loss']:.1%}",
+        fg="green" if stats["loss"] == 0 else "red",
+        bold=True,
+    )
+    if csv_file:
+        with open(csv_file, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["probe", "sent_time_utc", "rtt_ms"])
+            for row in rows:
+                rtt = row["rtt_s"]
+                writer.writerow([row["probe"], row["sent_time_utc"],
+                                 "" if rtt is None else f"{rtt * 1000:.3f}"])
+        click.secho(f"> Results written to {csv_file}", fg="green")
+
+
 @main.command()
 @click.option(
     "--firedrill/--no-firedrill",
@@ -433,5 +817,95 @@ def get_feedback(ctx, firedrill):
     get_feedback(detector_name=ctx.obj["DETECTOR_NAME"], firedrill=firedrill)
 
 
+@main.group()
+def alerts():
+    """Search alerts saved with `snews_pt subscribe --storage sqlite`"""
+
+
+def _alert_database(ctx, database):
+    if database is not None:
+        return database
+    from .snews_sub import Subscriber
+
+    sub = Subscriber(ctx.obj["env"])
+    return os.path.join(sub.default_output, Subscriber.DATABASE_NAME)
+
+
+@alerts.command()
+@click.option("--database", "-d", type=click.Path(dir_okay=False), default=None,
+              help="sqlite database, defaults to the one in the default output folder")
+@click.option("--type", "-t", "alert_type", multiple=True,
+              help="Alert type, e.g. INITIAL, UPDATE or RETRACTION. Can be repeated")
+@click.option("--detector", multiple=True,
+              help="Only alerts involving this detector. Can be repeated, all must be involved")
+@click.option("--since", default=None, help="UTC time (ISO format), inclusive")
+@click.option("--until", default=None, help="UTC time (ISO format), exclusive")
+@click.option("--test/--no-test", "is_test", default=None,
+              help="Only test, or only non-test alerts (default: both)")
+@click.option("--time-field", type=click.Choice(["sent", "neutrino", "received"]),
+              default="sent", show_default=True,
+              help="Time that --since/--until and the ordering refer to")
+@click.option("--limit", "-n", type=int, default=None, help="Maximum number of alerts")
+@click.option("--count", "count_only", is_flag=True, help="Only print the number of matches")
+@click.option("--json", "as_json", is_flag=True, help="Print the alerts as JSON")
+@click.pass_context
+def query(ctx, database, alert_type, detector, since, until, is_test, time_field, limit,
+          count_only, as_json):
+    """Query stored alerts using the database indexes
+
+    \b
+    e.g. all retractions involving JUNO since November 1st
+        snews_pt alerts query -t RETRACTION --detector JUNO --since 2025-11-01
+    """
+    import json
+
+    from .core.alert_store import AlertStore
+    from .snews_sub import display
+
+    database = _alert_database(ctx, database)
+    if not os.path.isfile(database):
+        raise click.ClickException(f"No alert database at {database}")
+    criteria = dict(alert_type=alert_type or None, detector=detector or None, since=since,
+                    until=until, is_test=is_test, time_field=time_field)
+    with AlertStore(database) as store:
+        try:
+            if count_only:
+                click.echo(store.count(**criteria))
+                return
+            found = store.query(limit=limit, **criteria)
+        except ValueError as e:
+            raise click.BadParameter(str(e))
+
+    if as_json:
+        click.echo(json.dumps(found, indent=4))
+        return
+    for message in found:
+        display(message)
+    click.secho(f"{len(found)} alert(s) found", fg="green")
+
+
+@alerts.command(name="import")
+@click.argument("paths", nargs=-1, required=True)
+@click.option("--database", "-d", type=click.Path(dir_okay=False), default=None,
+              help="sqlite database, defaults to the one in the default output folder")
+@click.pass_context
+def import_alerts(ctx, paths, database):
+    """Add alerts saved as json files (folders or globs) to the database"""
+    import json
+
+    from .core.alert_store import AlertStore
+
+    files = snews_pt_utils.collect_json_files(paths)
+    database = _alert_database(ctx, database)
+    os.makedirs(os.path.dirname(os.path.abspath(database)), exist_ok=True)
+    with AlertStore(database) as store:
+        found = []
+        for file in files:
+            with open(file) as f:
+                found.append(json.load(f))
+        store.add_many(found)
+    click.secho(f"Imported {len(found)} alert(s) into {database}", fg="green")
+
+
 if __name__ == "__main__":
     main()
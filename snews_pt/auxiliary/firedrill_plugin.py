@@ -8,9 +8,13 @@ logging.basicConfig(
     handlers=[logging.StreamHandler(sys.stdout)],
 )
 
-data = json.load(open(sys.argv[1]))
 
-logging.info("Reading alert data and running the firedrill plugin script")
-logging.info("Here is the alert dictionary I received:")
-for k, v in data.items():
-    logging.info(f"{k:20s} : {v}")
\ No newline at end of file
+def handle(data):
+    logging.info("Reading alert data and running the firedrill plugin script")
+    logging.info("Here is the alert dictionary I received:")
+    for k, v in data.items():
+        logging.info(f"{k:20s} : {v}")
+
+
+if __name__ == "__main__":
+    handle(json.load(open(sys.argv[1])))
@@ -9,7 +9,7 @@ import inquirer
 from snews.models.messages import CoincidenceTierMessage
 
 from snews_pt.messages import Publisher
-from snews_pt.remote_commands import reset_cache
+from snews_pt.remote_commands import RemoteSession
 
 
 def try_scenarios(fd_mode: bool = False, is_test: bool = False):
@@ -30,6 +30,10 @@ def try_scenarios(fd_mode: bool = False, is_test: bool = False):
         coincidence_scenarios = json.load(json_file)
 
     scenarios_labels = list(coincidence_scenarios.keys())
+    # a single publisher keeps its connection open across scenarios
+    pub = Publisher(kafka_topic=topic, auth=True)
+    # cache resets go to the same topic, through the same producer
+    session = RemoteSession(firedrill=fd_mode, pool=pub.pool)
 
     try:
         questions = [
@@ -52,12 +56,11 @@ def try_scenarios(fd_mode: bool = False, is_test: bool = False):
                         click.secho("Terminating.")
                         sys.exit()
                     elif scenario == "restart cache":
-                        reset_cache(firedrill=fd_mode, is_test=is_test)
+                        session.reset_cache(is_test=is_test)
                         print("> Cache cleaned\n")
                     else:
                         click.secho(f"\n>>> Testing {scenario}", fg="yellow", bold=True)
 
-                        pub = Publisher(kafka_topic=topic, auth=True)
                         for evt in coincidence_scenarios[
                             scenario
                         ]:  # send one by one and sleep in between
@@ -78,10 +81,13 @@ def try_scenarios(fd_mode: bool = False, is_test: bool = False):
                         )
 
                         # clear cache after each scenario
-                        reset_cache(firedrill=fd_mode, is_test=is_test)
+                        session.reset_cache(is_test=is_test)
                         print("> Cache cleaned\n")
 
             except KeyboardInterrupt:
                 break
     except Exception as e:
         print("Something went wrong\n", e, "\nTry manually submitting messages :/")
+    finally:
+        session.close()
+        pub.close()
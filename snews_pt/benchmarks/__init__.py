@@ -0,0 +1,5 @@
+"""
+Offline micro-benchmarks for snews_pt
+
+Run them as modules, e.g. ``python -m snews_pt.benchmarks.serializers``.
+"""
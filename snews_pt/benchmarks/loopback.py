@@ -0,0 +1,157 @@
+"""
+In-memory stand-in for `hop.Stream`
+
+Written messages are packed exactly like hop does before handing them to
+Kafka, kept per topic in memory, and unpacked again when the topic is read.
+This exercises the serialization on both ends without a broker.
+
+    with loopback() as broker:
+        ...  # Publisher / Subscriber code
+        broker.topics["kafka://host/topic"]
+"""
+
+import importlib
+from contextlib import contextmanager
+
+from hop.io import Deserializer, Producer
+
+
+class _Record:
+    """Mimics the parts of a confluent_kafka.Message that hop reads."""
+
+    def __init__(self, payload, headers):
+        self._payload = payload
+        self._headers = headers
+
+    def value(self):
+        return self._payload
+
+    def headers(self):
+        return self._headers
+
+
+class LoopbackBroker:
+    """Holds the topics of the loopback streams."""
+
+    def __init__(self):
+        self.topics = {}
+
+    def publish(self, topic, message):
+        """Append `message` to `topic` as if a producer had written it."""
+        payload, headers = Producer.pack(message)
+        self.topics.setdefault(topic, []).append(_Record(payload, headers))
+
+    def consumer(self, url, until_eos=False):
+        """The consumer returned by ``Stream.open(url, "r")``."""
+        return LoopbackConsumer(self, url)
+
+    def stream_class(self):
+        broker = self
+
+        class LoopbackStream:
+            def __init__(self, auth=True, start_at=None, until_eos=False):
+                self.auth = auth
+                self.until_eos = until_eos
+
+            def open(self, url, mode="r", **kwargs):
+                if mode == "w":
+                    return LoopbackProducer(broker, url)
+                return broker.consumer(url, until_eos=self.until_eos)
+
+        return LoopbackStream
+
+
+class LoopbackProducer:
+    def __init__(self, broker, topic):
+        self.broker = broker
+        self.topic = topic
+
+    def write(self, message, headers=None, **kwargs):
+        self.broker.publish(self.topic, message)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LoopbackMetadata:
+    """The `hop.io.Metadata` fields of a loopback record."""
+
+    def __init__(self, topic, partition, offset):
+        self.topic = topic
+        self.partition = partition
+        self.offset = offset
+        self.timestamp = 0
+        self.key = None
+        self.headers = None
+
+
+class LoopbackConsumer:
+    """Reads everything in the topics once, then stops like ``until_eos=True``.
+
+    Several topics of a broker can be read at once, ``kafka://host/topic1,topic2``.
+    """
+
+    def __init__(self, broker, topic):
+        self.broker = broker
+        self.topic = topic
+        host, _, names = topic.rpartition("/")
+        self._host = host
+        self._names = names.split(",")
+
+    def read(self, metadata=False, **kwargs):
+        for name in self._names:
+            records = list(self.broker.topics.get(f"{self._host}/{name}", []))
+            for offset, record in enumerate(records):
+                message = Deserializer.deserialize(record)
+                yield (message, LoopbackMetadata(name, 0, offset)) if metadata else message
+
+    def stop(self):
+        pass
+
+    def __iter__(self):
+        return self.read()
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# modules that open hop streams
+PATCHED_MODULES = [
+    "snews_pt.core.connections",
+    "snews_pt.remote_commands",
+    "snews_pt.snews_sub",
+]
+
+
+@contextmanager
+def loopback(broker=None):
+    """Swap `hop.Stream` for an in-memory loopback in every snews_pt module using it.
+
+    Yields `broker`, a new :class:`LoopbackBroker` if not given.
+    """
+    broker = LoopbackBroker() if broker is None else broker
+    stream = broker.stream_class()
+    modules = [importlib.import_module(name) for name in PATCHED_MODULES]
+    originals = [module.Stream for module in modules]
+    for module in modules:
+        module.Stream = stream
+    try:
+        yield broker
+    finally:
+        for module, original in zip(modules, originals):
+            module.Stream = original
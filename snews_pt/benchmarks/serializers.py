@@ -0,0 +1,87 @@
+"""
+Compare the wire serializers on every message tier
+
+Reports the mean encode time and the payload size of each serializer for one
+message of each tier in `snews.models.messages`. Serializers whose optional
+dependency is missing are skipped.
+
+    $: python -m snews_pt.benchmarks.serializers --number 2000
+"""
+
+import timeit
+from datetime import UTC, datetime
+
+import click
+from snews.models import messages
+
+from ..serializers import SERIALIZERS
+
+
+def example_messages():
+    """One representative message per tier."""
+    now = datetime.now(UTC)
+    common = dict(detector_name="XENONnT", machine_time_utc=now, is_test=True)
+    return {
+        "Heartbeat": messages.HeartbeatMessage(detector_status="ON", **common),
+        "Retraction": messages.RetractionMessage(retract_latest_n=1, **common),
+        "CoincidenceTier": messages.CoincidenceTierMessage(
+            neutrino_time_utc=now, p_val=0.07, **common
+        ),
+        "SignificanceTier": messages.SignificanceTierMessage(
+            p_values=[0.4, 0.5, 0.01, 0.2] * 25, t_bin_width_sec=0.8, **common
+        ),
+        "TimingTier": messages.TimingTierMessage(
+            neutrino_time_utc=now, timing_series=list(range(0, 100_000, 100)), **common
+        ),
+    }
+
+
+def run(number=1000):
+    """Benchmark all available serializers.
+
+    Parameters
+    ----------
+    number : int
+        Encodings per serializer and tier
+
+    Returns
+    -------
+    list of dict
+        One row per (tier, serializer) with the mean encode time in microseconds and
+        the payload size in bytes.
+    """
+    serializers = {}
+    for name, cls in SERIALIZERS.items():
+        try:
+            serializers[name] = cls()
+        except ImportError as e:
+            click.secho(f"Skipping {name}: {e}", fg="yellow")
+
+    results = []
+    for tier, message in example_messages().items():
+        for name, serializer in serializers.items():
+            seconds = timeit.timeit(lambda: serializer.encode(message), number=number)
+            results.append({
+                "tier": tier,
+                "serializer": name,
+                "encode_us": 1e6 * seconds / number,
+                "bytes": len(serializer.encode(message)),
+            })
+    return results
+
+
+@click.command()
+@click.option("--number", "-n", default=1000, show_default=True,
+              help="Encodings per serializer and tier")
+def main(number):
+    """Print encode time and payload size per tier and serializer"""
+    results = run(number)
+    click.secho(f"{'tier':<18s}{'serializer':<12s}{'encode [us]':>12s}{'bytes':>10s}",
+                bold=True)
+    for row in results:
+        click.echo(f"{row['tier']:<18s}{row['serializer']:<12s}"
+                   f"{row['encode_us']:>12.1f}{row['bytes']:>10d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Offline throughput and latency benchmarks
+
+Runs the publish and subscribe code paths against the in-memory loopback
+stream, so no broker or credentials are needed. For every case the number of
+operations per second and latency percentiles are reported. Results can be
+stored as JSON and compared with an earlier run to spot regressions.
+
+    $: python -m snews_pt.benchmarks.throughput -n 2000 -o after.json --compare before.json
+"""
+
+import contextlib
+import json
+import os
+import platform
+import tempfile
+import time
+from datetime import UTC, datetime
+from importlib.metadata import PackageNotFoundError, version
+
+import click
+import numpy as np
+from snews.models import messages
+
+from ..messages import Publisher
+from ..snews_sub import Subscriber
+from .loopback import loopback
+from .serializers import example_messages
+
+
+def summarize(latencies):
+    """Throughput and latency percentiles of a list of per-operation durations in seconds."""
+    lat = np.asarray(latencies)
+    total = float(lat.sum())
+    p50, p90, p99 = np.percentile(lat, [50, 90, 99]) * 1e6
+    return {
+        "n": int(lat.size),
+        "total_s": total,
+        "ops_per_s": lat.size / total if total > 0 else float("inf"),
+        "p50_us": float(p50),
+        "p90_us": float(p90),
+        "p99_us": float(p99),
+        "max_us": float(lat.max() * 1e6),
+    }
+
+
+def example_alert(i=0):
+    """An alert as published by the SNEWS coincidence server."""
+    now = datetime.now(UTC).isoformat()
+    return {
+        "_id": f"SNEWS_Coincidence_ALERT-UPDATE_{now}_{i}",
+        "alert_type": "INITIAL",
+        "server_tag": "benchmark",
+        "False Alarm Prob": "0.0%",
+        "detector_names": ["XENONnT", "JUNO", "Super-K"],
+        "sent_time_utc": now,
+        "p_values": [0.07, 0.01, 0.05],
+        "neutrino_times": [now, now, now],
+        "p_val_avg": 0.043,
+        "sub list number": 0,
+        "is_test": True,
+        "is_firedrill": True,
+    }
+
+
+def bench_publish(message, n, serializer="pickle"):
+    """`Publisher.add_message` + `send` of a single message, `n` times."""
+    latencies = []
+    with loopback():
+        with Publisher("kafka://loopback/observations", auth=False,
+                       serializer=serializer) as publisher:
+            for _ in range(n):
+                t0 = time.perf_counter()
+                publisher.add_message(message)
+                publisher.send()
+                latencies.append(time.perf_counter() - t0)
+    return summarize(latencies)
+
+
+def bench_create_messages(message, n):
+    """`messages.create_messages` from the fields of `message`."""
+    fields = message.model_dump()
+    latencies = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        messages.create_messages(**fields)
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies)
+
+
+def bench_subscribe_save(n):
+    """`Subscriber.subscribe_and_redirect_alert` saving `n` alerts write-behind, without display."""
+    latencies = []
+    with loopback() as broker, tempfile.TemporaryDirectory() as outputfolder:
+        subscriber = Subscriber(firedrill_mode=False, write_behind=True)
+        for i in range(n):
+            broker.publish(subscriber.alert_topic, example_alert(i))
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            alerts = subscriber.subscribe_and_redirect_alert(
+                outputfolder=outputfolder, auth=False, _display=False
+            )
+            t0 = time.perf_counter()
+            for _ in alerts:
+                t1 = time.perf_counter()
+                latencies.append(t1 - t0)
+                t0 = t1
+    return summarize(latencies)
+
+
+def run(n=1000, serializer="pickle"):
+    """Run every benchmark, returning a JSON-serializable dict."""
+    try:
+        snews_pt_version = version("snews_pt")
+    except PackageNotFoundError:
+        snews_pt_version = "unknown"
+
+    results = {}
+    for tier, message in example_messages().items():
+        results[f"publish.{tier}"] = bench_publish(message, n, serializer)
+        results[f"create_messages.{tier}"] = bench_create_messages(message, n)
+    results["subscribe.save"] = bench_subscribe_save(n)
+
+    return {
+        "snews_pt_version": snews_pt_version,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "timestamp": datetime.now(UTC).isoformat(),
+        "n": n,
+        "serializer": serializer,
+        "results": results,
+    }
+
+
+def compare(baseline, current):
+    """Ratio of current to baseline throughput for the cases present in both runs."""
+    ratios = {}
+    for name, result in current["results"].items():
+        if name in baseline["results"]:
+            ratios[name] = result["ops_per_s"] / baseline["results"][name]["ops_per_s"]
+    return ratios
+
+
+@click.command()
+@click.option("--number", "-n", default=1000, show_default=True,
+              help="Operations per benchmark")
+@click.option("--serializer", default="pickle", show_default=True,
+              type=click.Choice(["pickle", "json", "msgpack"]))
+@click.option("--output", "-o", type=click.Path(dir_okay=False), default=None,
+              help="Store the results in this JSON file")
+@click.option("--compare", "baseline", type=click.Path(exists=True, dir_okay=False),
+              default=None, help="JSON results of an earlier run to compare against")
+def main(number, serializer, output, baseline):
+    """Measure publisher and subscriber throughput against a loopback stream"""
+    report = run(number, serializer)
+    ratios = compare(json.load(open(baseline)), report) if baseline else {}
+
+    click.secho(f"{'benchmark':<34s}{'ops/s':>12s}{'p50 [us]':>11s}{'p90 [us]':>11s}"
+                f"{'p99 [us]':>11s}" + (f"{'vs base':>9s}" if ratios else ""), bold=True)
+    for name, r in report["results"].items():
+        line = (f"{name:<34s}{r['ops_per_s']:>12.1f}{r['p50_us']:>11.1f}"
+                f"{r['p90_us']:>11.1f}{r['p99_us']:>11.1f}")
+        if name in ratios:
+            ratio = ratios[name]
+            line += click.style(f"{ratio:>8.2f}x", fg="red" if ratio < 0.9 else "green")
+        click.echo(line)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=4)
+        click.secho(f"Results written to {output}", fg="green")
+
+
+if __name__ == "__main__":
+    main()
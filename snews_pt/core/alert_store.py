@@ -0,0 +1,232 @@
+"""
+Indexed SQLite storage for received alerts.
+
+An alternative to one JSON file per alert. Every alert is kept as JSON in a
+single database file, next to the fields it is usually searched by, which are
+indexed: alert type, detector names, sent and neutrino times and the test flag.
+The database runs in WAL mode, so it can be queried while a subscriber writes.
+
+    with AlertStore("alerts.sqlite") as store:
+        store.add(alert)
+        store.query(alert_type="RETRACTION", detector="JUNO", since="2025-11-01")
+"""
+
+import json
+import sqlite3
+import threading
+from datetime import UTC, datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY,
+    alert_id TEXT,
+    alert_type TEXT,
+    server_tag TEXT,
+    is_test INTEGER,
+    is_firedrill INTEGER,
+    sent_time_utc TEXT,
+    neutrino_time_utc TEXT,
+    received_time_utc TEXT NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS alert_detectors (
+    detector TEXT NOT NULL,
+    alert INTEGER NOT NULL REFERENCES alerts(id) ON DELETE CASCADE,
+    PRIMARY KEY (detector, alert)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS alerts_type_sent ON alerts(alert_type, sent_time_utc);
+CREATE INDEX IF NOT EXISTS alerts_sent ON alerts(sent_time_utc);
+CREATE INDEX IF NOT EXISTS alerts_neutrino ON alerts(neutrino_time_utc);
+CREATE INDEX IF NOT EXISTS alerts_test_sent ON alerts(is_test, sent_time_utc);
+CREATE INDEX IF NOT EXISTS alerts_alert_id ON alerts(alert_id);
+"""
+
+TIME_FIELDS = {"sent": "sent_time_utc", "neutrino": "neutrino_time_utc",
+               "received": "received_time_utc"}
+
+
+def normalize_time(value):
+    """UTC time as a fixed-width ISO string that sorts chronologically, None if unparsable.
+
+    Accepts datetimes and ISO strings, including a trailing "Z" and nanosecond precision.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        text = value.strip()
+        if text.endswith("Z"):
+            text = text[:-1] + "+00:00"
+        date, sep, rest = text.partition(".")
+        if sep:
+            # datetime parses at most microseconds, drop any further digits
+            digits = len(rest) - len(rest.lstrip("0123456789"))
+            rest = rest[:min(digits, 6)] + rest[digits:]
+            text = f"{date}.{rest}"
+        try:
+            value = datetime.fromisoformat(text)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(UTC).replace(tzinfo=None)
+    return value.strftime("%Y-%m-%dT%H:%M:%S.%f")
+
+
+def _flag(value):
+    return None if value is None else int(bool(value))
+
+
+class AlertStore:
+    """Alerts in an embedded SQLite database.
+
+    Parameters
+    ----------
+    path : str
+        Database file, created if missing.
+    timeout : float
+        Seconds to wait for a lock held by another connection.
+
+    """
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(SCHEMA)
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM alerts").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def add(self, message, received_time=None):
+        """Store an alert message.
+
+        Parameters
+        ----------
+        message : dict
+            The alert as received.
+        received_time : datetime, optional
+            When it was received, defaults to now.
+
+        Returns
+        -------
+        int
+            Row id of the stored alert.
+        """
+        return self.add_many([message], received_time)[0]
+
+    def add_many(self, messages, received_time=None):
+        """Store several alerts in one transaction, returning their row ids."""
+        received = normalize_time(received_time or datetime.now(UTC))
+        ids = []
+        with self._lock, self._db:
+            for message in messages:
+                neutrino_times = [t for t in map(normalize_time, message.get("neutrino_times") or [])
+                                  if t is not None]
+                cursor = self._db.execute(
+                    "INSERT INTO alerts (alert_id, alert_type, server_tag, is_test, is_firedrill,"
+                    " sent_time_utc, neutrino_time_utc, received_time_utc, message)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        message.get("_id"),
+                        message.get("alert_type"),
+                        message.get("server_tag"),
+                        _flag(message.get("is_test")),
+                        _flag(message.get("is_firedrill")),
+                        normalize_time(message.get("sent_time_utc")),
+                        min(neutrino_times, default=None),
+                        received,
+                        json.dumps(message, default=str),
+                    ),
+                )
+                detectors = set(message.get("detector_names") or [])
+                self._db.executemany(
+                    "INSERT INTO alert_detectors (detector, alert) VALUES (?, ?)",
+                    [(str(d), cursor.lastrowid) for d in detectors],
+                )
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def _where(self, alert_type=None, detector=None, since=None, until=None, is_test=None,
+               time_field="sent"):
+        if time_field not in TIME_FIELDS:
+            raise ValueError(f"Unknown time field {time_field!r}, choose from {list(TIME_FIELDS)}")
+        column = TIME_FIELDS[time_field]
+        clauses, params = [], []
+        if alert_type is not None:
+            types = [alert_type] if isinstance(alert_type, str) else list(alert_type)
+            clauses.append(f"alert_type IN ({', '.join('?' * len(types))})")
+            params.extend(types)
+        detectors = [detector] if isinstance(detector, str) else list(detector or [])
+        for name in detectors:
+            clauses.append("id IN (SELECT alert FROM alert_detectors WHERE detector = ?)")
+            params.append(name)
+        for bound, op in ((since, ">="), (until, "<")):
+            if bound is not None:
+                value = normalize_time(bound)
+                if value is None:
+                    raise ValueError(f"Cannot parse time {bound!r}")
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+        if is_test is not None:
+            clauses.append("is_test = ?")
+            params.append(int(bool(is_test)))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params, column
+
+    def query(self, alert_type=None, detector=None, since=None, until=None, is_test=None,
+              time_field="sent", limit=None, newest_first=True):
+        """Find stored alerts.
+
+        Parameters
+        ----------
+        alert_type : str or list of str, optional
+            e.g. "INITIAL", "UPDATE" or "RETRACTION".
+        detector : str or list of str, optional
+            Only alerts involving all of these detectors.
+        since, until : str or datetime, optional
+            Time range, `since` inclusive and `until` exclusive, in UTC.
+        is_test : bool, optional
+            Only test or only non-test alerts.
+        time_field : str
+            Time the range applies to and the results are ordered by,
+            "sent", "neutrino" (earliest neutrino time) or "received".
+        limit : int, optional
+            Maximum number of alerts.
+        newest_first : bool
+            Order of the results.
+
+        Returns
+        -------
+        list of dict
+            The alert messages.
+        """
+        where, params, column = self._where(alert_type, detector, since, until, is_test,
+                                            time_field)
+        sql = f"SELECT message FROM alerts{where} ORDER BY {column} {'DESC' if newest_first else 'ASC'}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [json.loads(row["message"]) for row in rows]
+
+    def count(self, **criteria):
+        """Number of alerts matching the :meth:`query` criteria."""
+        where, params, _ = self._where(**criteria)
+        with self._lock:
+            return self._db.execute(f"SELECT COUNT(*) FROM alerts{where}", params).fetchone()[0]
@@ -0,0 +1,198 @@
+"""
+Write-behind writer for saved alert files.
+
+The consumer thread only encodes the alert and hands it over;
+a writer thread does the disk I/O. Files are written as soon as they arrive,
+so other programs can read them almost immediately, while the fsyncs that make
+them durable are grouped: all files written within `fsync_window` seconds of
+the first one are synced together, followed by their folders. Closing the
+writer writes and syncs everything still queued. A file that could not be
+written or synced is reported by :meth:`AlertWriter.wait`.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+
+from .logging import getLogger
+
+log = getLogger(__name__)
+
+
+def encode(message):
+    """JSON encoding of an alert, formatted like :func:`snews_pt.snews_sub.save_message`."""
+    return json.dumps(message, indent=4, sort_keys=True, default=str).encode("utf-8")
+
+
+class AlertWriter:
+    """Write alert files from a background thread, grouping their fsyncs.
+
+    Parameters
+    ----------
+    fsync_window : float
+        Seconds to collect written files before syncing them together.
+    fsync : bool
+        Sync files and folders to disk, or leave that to the operating system.
+    max_batch : int
+        Sync early once this many files are waiting.
+
+    """
+
+    def __init__(self, fsync_window=0.05, fsync=True, max_batch=256):
+        self.fsync_window = fsync_window
+        self.fsync = fsync
+        self.max_batch = max_batch
+        self.errors = 0
+
+        self._queue = queue.Queue()
+        self._cond = threading.Condition()
+        self._submitted = 0
+        self._written = 0
+        self._synced = 0
+        self._pending = {}
+        self._failed = set()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="snews_pt-alert-writer",
+                                        daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, file, message):
+        """Queue `message` to be written to `file`, returning `file` right away.
+
+        The message is encoded before returning, later changes to it are not saved.
+        """
+        if self._closed:
+            raise RuntimeError("The alert writer is closed")
+        data = encode(message)
+        with self._cond:
+            self._submitted += 1
+            seq = self._submitted
+            self._pending[file] = seq
+        self._queue.put((seq, file, data))
+        return file
+
+    def wait(self, file=None, durable=False, timeout=None):
+        """Block until `file` (default: everything queued so far) is written.
+
+        Waiting for a file that failed returns as soon as it was attempted.
+
+        Parameters
+        ----------
+        file : str, optional
+            File returned by :meth:`write`.
+        durable : bool
+            Also wait for the fsync.
+        timeout : float, optional
+            Seconds to wait at most.
+
+        Returns
+        -------
+        bool
+            False if the timeout expired first, or `file` could not be written
+            (or synced, if `durable`).
+        """
+        with self._cond:
+            seq = self._pending.get(file, 0) if file is not None else self._submitted
+            done = (lambda: self._synced >= seq) if durable else (lambda: self._written >= seq)
+            return self._cond.wait_for(done, timeout) and file not in self._failed
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far is written and synced."""
+        return self.wait(durable=True, timeout=timeout)
+
+    def close(self):
+        """Write and sync all queued alerts, then stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [self._write_one(*item)]
+            deadline = time.monotonic() + self.fsync_window
+            while len(batch) < self.max_batch:
+                # after the window, still take whatever is already queued
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        item = self._queue.get(timeout=remaining)
+                    else:
+                        item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(self._write_one(*item))
+            self._sync(batch)
+
+    def _write_one(self, seq, file, data):
+        fd = None
+        try:
+            fd = os.open(file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+        except OSError as e:
+            log.error(f"could not write alert file {file}: {e}")
+            if fd is not None:
+                os.close(fd)
+            fd = None
+            with self._cond:
+                self.errors += 1
+                self._failed.add(file)
+        if fd is not None and not self.fsync:
+            os.close(fd)
+            fd = None
+        with self._cond:
+            self._written = seq
+            self._cond.notify_all()
+        return seq, file, fd
+
+    def _sync(self, batch):
+        folders = set()
+        for _, file, fd in batch:
+            if fd is None:
+                continue
+            try:
+                os.fsync(fd)
+                folders.add(os.path.dirname(os.path.abspath(file)))
+            except OSError as e:
+                log.error(f"could not sync alert file {file}: {e}")
+                with self._cond:
+                    self.errors += 1
+                    self._failed.add(file)
+            finally:
+                os.close(fd)
+        # new directory entries are only durable once their folder is synced
+        for folder in folders:
+            try:
+                dir_fd = os.open(folder, os.O_RDONLY)
+            except OSError:
+                continue  # folders cannot be opened on every platform
+            try:
+                os.fsync(dir_fd)
+            except OSError:
+                pass
+            finally:
+                os.close(dir_fd)
+        with self._cond:
+            self._synced = batch[-1][0]
+            for _, file, _ in batch:
+                if self._pending.get(file) is not None and self._pending[file] <= self._synced:
+                    del self._pending[file]
+            self._cond.notify_all()
@@ -0,0 +1,203 @@
+"""
+Local checkpoint of the processed offsets, so a restarted subscriber resumes.
+
+hop subscribes by assigning every partition manually under a random consumer
+group, so offsets committed to Kafka cannot be used to resume. Instead the
+next offset to read is kept per topic and partition in a small JSON file,
+which is replaced atomically on every commit.
+
+Alerts can finish out of order, e.g. in a plugin pool, or fail. The offsets
+read are therefore tracked, and the checkpoint only advances over an unbroken
+run of processed offsets: it holds at the first one that was not processed,
+so that alert is read again after a restart. It only holds for `max_held`
+further messages, then the failed offset is logged and skipped, so that one
+failure neither stops the checkpoint nor grows the tracked offsets forever.
+
+    {"kafka://kafka.scimma.org/snews.alert-test": {"0": 1234}}
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import UTC, datetime
+from importlib.metadata import version
+
+from adc.consumer import LogicalOffset
+from confluent_kafka import TopicPartition
+
+from .logging import getLogger
+
+log = getLogger(__name__)
+
+START_POSITIONS = ("earliest", "latest", "checkpoint")
+# adc-streaming versions whose consumer internals _kafka_consumer relies on, [min, max)
+ADC_VERSIONS = ((2, 0), (3, 0))
+
+
+def parse_start(value):
+    """Start position from "earliest", "latest", "checkpoint" or an ISO timestamp (UTC).
+
+    Returns
+    -------
+    str or datetime
+    """
+    if value is None or isinstance(value, datetime):
+        return value
+    text = value.strip().lower()
+    if text in START_POSITIONS:
+        return text
+    try:
+        start = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"Start position must be one of {START_POSITIONS} or an ISO time, "
+                         f"got {value!r}")
+    return start if start.tzinfo else start.replace(tzinfo=UTC)
+
+
+class Checkpoint:
+    """Next offset to read per topic and partition, stored in a JSON file.
+
+    Parameters
+    ----------
+    path : str
+        Checkpoint file, created on the first commit.
+    max_held : int
+        Messages read past an unprocessed one before the checkpoint skips it.
+
+    """
+
+    def __init__(self, path, max_held=10000):
+        self.path = path
+        self.max_held = max_held
+        self._lock = threading.Lock()
+        self._offsets = {}
+        self._tracked = {}  # (topic, partition) -> {offset: processed}, in read order
+        if os.path.isfile(path):
+            with open(path) as f:
+                self._offsets = {topic: {int(p): o for p, o in partitions.items()}
+                                 for topic, partitions in json.load(f).items()}
+
+    def __bool__(self):
+        return bool(self._offsets)
+
+    def offsets(self, topic):
+        """{partition: next offset} of a topic url."""
+        return dict(self._offsets.get(topic, {}))
+
+    def track(self, topic, partition, offset):
+        """Record that the message at `offset` was read, the checkpoint cannot pass it
+        before it is committed."""
+        with self._lock:
+            tracked = self._tracked.setdefault((topic, partition), OrderedDict())
+            tracked[offset] = False
+            if len(tracked) <= self.max_held:
+                return
+            # processed offsets at the front are always dropped, so this one failed
+            skipped = tracked.popitem(last=False)[0]
+            log.warning(f"{topic}[{partition}] offset {skipped} was not processed within "
+                        f"{self.max_held} messages, the checkpoint moves past it")
+            next_offset = skipped + 1
+            while tracked and next(iter(tracked.values())):
+                next_offset = tracked.popitem(last=False)[0] + 1
+            self._advance(topic, partition, next_offset)
+
+    def commit(self, topic, partition, offset):
+        """Record that the message at `offset` was processed.
+
+        The checkpoint moves past it once every tracked message before it is
+        processed too. An untracked offset counts with everything before it.
+        """
+        with self._lock:
+            tracked = self._tracked.get((topic, partition))
+            if tracked and offset in tracked:
+                tracked[offset] = True
+                next_offset = None
+                while tracked and next(iter(tracked.values())):
+                    next_offset = tracked.popitem(last=False)[0] + 1
+                if next_offset is None:
+                    return
+            elif not tracked:
+                next_offset = offset + 1
+            else:
+                return
+            self._advance(topic, partition, next_offset)
+
+    def _advance(self, topic, partition, next_offset):
+        """Move the checkpoint forward to `next_offset`, called with the lock held."""
+        partitions = self._offsets.setdefault(topic, {})
+        if next_offset <= partitions.get(partition, -1):
+            return
+        partitions[partition] = next_offset
+        self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._offsets, f)
+            # the new content must be on disk before it replaces the old file
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+def _kafka_consumer(consumer):
+    """The confluent_kafka.Consumer wrapped by an open :class:`hop.io.Consumer`.
+
+    hop and adc can only move every partition to the same logical offset or
+    time, resuming needs an offset per partition. This is the one place that
+    reaches into their internals, for the adc versions known to have them.
+    """
+    adc_version = tuple(int(part) for part in version("adc-streaming").split(".")[:2])
+    kafka = getattr(getattr(consumer, "_consumer", None), "_consumer", None)
+    if not ADC_VERSIONS[0] <= adc_version < ADC_VERSIONS[1] or not hasattr(kafka, "assign"):
+        raise RuntimeError(f"Resuming from a checkpoint is not supported with adc-streaming "
+                           f"{version('adc-streaming')}, use another start position")
+    return kafka
+
+
+def position(consumer, start, checkpoint=None, broker=None):
+    """Move an open :class:`hop.io.Consumer` to the start position.
+
+    Parameters
+    ----------
+    consumer : hop.io.Consumer
+        Consumer returned by ``Stream.open(url, "r")``.
+    start : str or datetime
+        See :func:`parse_start`. None keeps the stream default.
+    checkpoint : Checkpoint, optional
+        Offsets for ``start="checkpoint"``. Partitions without a checkpoint keep
+        the stream default.
+    broker : str
+        ``kafka://host`` part of the topic urls, to look them up in the checkpoint.
+
+    Returns
+    -------
+    dict
+        Keyword arguments for ``consumer.read``.
+    """
+    if start is None:
+        return {}
+    if start == "earliest":
+        return {"start_at": LogicalOffset.EARLIEST}
+    if start == "latest":
+        return {"start_at": LogicalOffset.LATEST}
+    if isinstance(start, datetime):
+        return {"start_at": start}
+    if not checkpoint:
+        log.info("no checkpoint yet, starting at the stream default")
+        return {}
+
+    # every partition is assigned when the stream is opened
+    kafka = _kafka_consumer(consumer)
+    assignment = []
+    for tp in kafka.assignment():
+        offset = checkpoint.offsets(f"{broker}/{tp.topic}").get(tp.partition)
+        if offset is None:
+            assignment.append(tp)
+        else:
+            log.info(f"resuming {tp.topic}[{tp.partition}] at offset {offset}")
+            assignment.append(TopicPartition(tp.topic, tp.partition, offset))
+    kafka.assign(assignment)
+    return {}
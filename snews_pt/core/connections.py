@@ -0,0 +1,137 @@
+"""
+Long-lived hop producers shared between sends.
+
+Opening a hop stream loads credentials and starts a Kafka producer, which
+dominates the cost of sending a single small message. The pool below keeps
+one producer per topic open and hands it back on every request. While
+producers are open, a daemon thread closes the ones left idle.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from hop import Stream
+
+from .logging import getLogger
+
+log = getLogger(__name__)
+
+
+class ConnectionPool:
+    """Pool of open hop producers, keyed by topic.
+
+    Parameters
+    ----------
+    auth : bool or hop.auth.Auth
+        Passed to :class:`hop.Stream`. Credentials are only loaded once per pool.
+    idle_timeout : float
+        Seconds after which an unused producer is closed, checked every
+        ``idle_timeout / 2`` seconds. ``None`` keeps them forever.
+    max_size : int
+        Maximum number of topics kept open, the least recently used is closed first.
+
+    """
+
+    def __init__(self, auth=True, idle_timeout=300.0, max_size=4):
+        self.auth = auth
+        self.idle_timeout = idle_timeout
+        self.max_size = max_size
+
+        self._stream = None
+        self._producers = OrderedDict()  # topic -> [producer, last_used]
+        self._lock = threading.RLock()
+        self._reaper = None
+        self._stop_reaper = threading.Event()
+
+    def __len__(self):
+        return len(self._producers)
+
+    def __contains__(self, topic):
+        return topic in self._producers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get(self, topic):
+        """Return an open producer for `topic`, connecting if needed."""
+        with self._lock:
+            now = time.monotonic()
+            self._evict_idle(now)
+            entry = self._producers.get(topic)
+            if entry is None:
+                if self._stream is None:
+                    self._stream = Stream(until_eos=True, auth=self.auth)
+                log.debug(f"opening producer for {topic}")
+                entry = [self._stream.open(topic, "w"), now]
+                self._producers[topic] = entry
+                while len(self._producers) > self.max_size:
+                    old_topic, _ = next(iter(self._producers.items()))
+                    self._discard(old_topic)
+                self._start_reaper()
+            else:
+                entry[1] = now
+            self._producers.move_to_end(topic)
+            return entry[0]
+
+    def invalidate(self, topic):
+        """Close and forget the producer of `topic`, e.g. after a failed write.
+        The next :meth:`get` reconnects.
+        """
+        with self._lock:
+            self._discard(topic)
+
+    def evict_idle(self):
+        """Close every producer that has not been used within `idle_timeout`."""
+        with self._lock:
+            self._evict_idle(time.monotonic())
+
+    def close(self):
+        """Flush and close all producers and stop closing idle ones."""
+        with self._lock:
+            self._stop_reaper.set()
+            reaper, self._reaper = self._reaper, None
+            for topic in list(self._producers):
+                self._discard(topic)
+        if reaper is not None and reaper is not threading.current_thread():
+            reaper.join()
+
+    def _start_reaper(self):
+        """Start the idle producer reaper unless it is running, called with the lock held."""
+        if self.idle_timeout is None or self._reaper is not None:
+            return
+        self._stop_reaper = threading.Event()
+        self._reaper = threading.Thread(target=self._reap, args=(self._stop_reaper,),
+                                        name="snews_pt-connection-reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap(self, stop):
+        while not stop.wait(max((self.idle_timeout or 0) / 2, 0.01)):
+            with self._lock:
+                if stop.is_set():
+                    return
+                self._evict_idle(time.monotonic())
+                # the next producer opened starts a new reaper
+                if not self._producers or self.idle_timeout is None:
+                    self._reaper = None
+                    return
+
+    def _evict_idle(self, now):
+        if self.idle_timeout is None:
+            return
+        for topic, (_, last_used) in list(self._producers.items()):
+            if now - last_used > self.idle_timeout:
+                log.debug(f"closing idle producer for {topic}")
+                self._discard(topic)
+
+    def _discard(self, topic):
+        entry = self._producers.pop(topic, None)
+        if entry is None:
+            return
+        try:
+            entry[0].close()
+        except Exception as e:
+            log.warning(f"error while closing producer for {topic}: {e}")
@@ -0,0 +1,147 @@
+"""
+Bounded LRU/TTL cache of the alerts already processed.
+
+Alerts are keyed on their ``_id``, or on a hash of their content if they have
+none. Keys are forgotten when they expire or when the cache is full (least
+recently seen first). With an index file the keys survive restarts: new keys
+are appended to it, and it is rewritten with only the live keys once it grows
+to twice the cache size.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from . import metrics
+from .logging import getLogger
+
+log = getLogger(__name__)
+
+# keys added by snews_pt itself, not part of the alert
+LOCAL_KEYS = ("_topic",)
+
+
+def alert_key(message):
+    """The `_id` of an alert, or a hash of its content when it has none."""
+    alert_id = message.get("_id")
+    if alert_id:
+        return str(alert_id)
+    content = {k: v for k, v in message.items() if k not in LOCAL_KEYS}
+    encoded = json.dumps(content, sort_keys=True, separators=(",", ":"), default=str)
+    return "sha256:" + hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class DedupCache:
+    """Remember processed alerts to recognize redelivered ones.
+
+    Parameters
+    ----------
+    maxsize : int
+        Number of alerts remembered.
+    ttl : float
+        Seconds an alert is remembered.
+    path : str, optional
+        Index file to keep the keys in across restarts.
+
+    """
+
+    def __init__(self, maxsize=10000, ttl=7 * 24 * 3600.0, path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+        self._index = None
+        self._index_lines = 0
+        if path is not None:
+            self._load()
+            self._index = open(path, "a")
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        expires = self._keys.get(key)
+        return expires is not None and expires > time.time()
+
+    @property
+    def stats(self):
+        """Hits, misses and the number of remembered alerts."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._keys)}
+
+    def seen(self, message):
+        """Whether the alert was processed before, counting a hit or a miss."""
+        key = alert_key(message)
+        with self._lock:
+            hit = key in self
+            if hit:
+                self._keys.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if metrics.enabled:
+            metrics.ALERT_DEDUP.labels("hit" if hit else "miss").inc()
+        return hit
+
+    def add(self, message):
+        """Remember the alert as processed."""
+        key = alert_key(message)
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._keys[key] = expires
+            self._keys.move_to_end(key)
+            while len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+            if self._index is None and self.path is not None:
+                # reopened after close()
+                self._index = open(self.path, "a")
+            if self._index is not None:
+                self._index.write(f"{expires:.3f}\t{key}\n")
+                self._index.flush()
+                self._index_lines += 1
+                if self._index_lines > 2 * self.maxsize:
+                    self._compact()
+
+    def close(self):
+        """Close the index file, a later :meth:`add` opens it again."""
+        with self._lock:
+            if self._index is not None:
+                self._index.close()
+                self._index = None
+
+    def _load(self):
+        if not os.path.isfile(self.path):
+            return
+        now = time.time()
+        with open(self.path) as f:
+            for line in f:
+                expires, _, key = line.rstrip("\n").partition("\t")
+                try:
+                    expires = float(expires)
+                except ValueError:
+                    continue  # a line cut short by a crash
+                if key and expires > now:
+                    self._keys[key] = expires
+                    self._keys.move_to_end(key)
+                self._index_lines += 1
+        while len(self._keys) > self.maxsize:
+            self._keys.popitem(last=False)
+        log.info(f"loaded {len(self._keys)} alert keys from {self.path}")
+
+    def _compact(self):
+        """Rewrite the index with only the live keys."""
+        now = time.time()
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            for key, expires in self._keys.items():
+                if expires > now:
+                    f.write(f"{expires:.3f}\t{key}\n")
+        self._index.close()
+        os.replace(tmp, self.path)
+        self._index = open(self.path, "a")
+        self._index_lines = len(self._keys)
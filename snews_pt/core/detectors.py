@@ -0,0 +1,228 @@
+"""
+Registry of the participating detectors.
+
+The detectors are read once from ``detector_properties.json`` and indexed by
+name, id and case-insensitive alias. The file is only read again once its
+modification time changes. Their coordinates, taken from the SNEWS world map
+shipped with the snews package, are kept in one NumPy array so distances to
+all detectors are computed at once.
+
+    detectors = registry()
+    detectors["superk"].id          # 1
+    detectors.within(36.4, 137.3, radius_km=100)
+"""
+
+import json
+import os
+import threading
+from collections import namedtuple
+from importlib import resources
+
+import numpy as np
+
+from .logging import getLogger
+
+log = getLogger(__name__)
+
+DEFAULT_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                            "auxiliary", "detector_properties.json")
+WORLD_MAP = "SNEWS World Map - Points.json"
+EARTH_RADIUS_KM = 6371.0
+
+Detector = namedtuple("Detector", ["name", "id", "location"])
+# everything read from one version of the detector file, replaced as a whole
+_Snapshot = namedtuple("_Snapshot", ["detectors", "by_name", "by_id", "by_alias",
+                                     "names", "ids", "coordinates"])
+
+# written to a missing detector file, by id
+DEFAULT_DETECTORS = (
+    "Super-K", "Hyper-K", "SNO+", "KamLAND", "LVD", "IceCube", "Borexino", "HALO-1kT",
+    "HALO", "NOvA", "KM3NeT", "Baksan", "JUNO", "LZ", "DUNE", "MicroBooNe", "SBND",
+    "DS-20K", "XENONnT", "PandaX-4T",
+)
+
+# names of the detectors on the SNEWS world map, where they differ
+WORLD_MAP_NAMES = {
+    "Super-K": "Super-Kamiokande",
+    "Hyper-K": "Hyper-Kamiokande",
+    "DS-20K": "DarkSide-20k",
+    "DUNE": "DUNE(Sanford Lab)",
+    "PandaX-4T": "PandaX",
+    # the supernova neutrino search runs on both, ARCA is the larger one
+    "KM3NeT": "Astroparticle Research with Cosmics in the Abyss",
+}
+
+
+def make_detector_file(path=DEFAULT_FILE, names=DEFAULT_DETECTORS):
+    """Write a detector file with `names`, numbered from 1."""
+    detectors = {name: [name, i, f"loc {name}"] for i, name in enumerate(names, start=1)}
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(detectors, f, indent=4)
+    os.replace(tmp, path)
+    log.info(f"wrote {len(detectors)} detectors to {path}")
+
+
+def load_world_map():
+    """Points of the SNEWS world map from the snews package, {name: {"lat", "lon", "aliases"...}}.
+
+    Empty if the snews package does not ship it.
+    """
+    try:
+        with resources.files("snews.data").joinpath(WORLD_MAP).open() as f:
+            return json.load(f)
+    except (ModuleNotFoundError, FileNotFoundError) as e:
+        log.warning(f"no detector coordinates: {e}")
+        return {}
+
+
+class DetectorRegistry:
+    """Detectors indexed by name, id and alias.
+
+    Parameters
+    ----------
+    path : str
+        Detector file, ``{name: [name, id, location]}``. Written with the
+        default detectors if missing.
+    world_map : dict, optional
+        Coordinates and aliases by detector, defaults to :func:`load_world_map`.
+
+    """
+
+    def __init__(self, path=DEFAULT_FILE, world_map=None):
+        self.path = path
+        self._world_map = world_map
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._snapshot = None
+        self._refresh()
+
+    def _refresh(self):
+        """The detectors, read again if the file changed since it was last read.
+
+        Returns
+        -------
+        _Snapshot
+            Never modified, so a caller sees one consistent version even if
+            the file is reloaded meanwhile.
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            make_detector_file(self.path)
+            mtime = os.stat(self.path).st_mtime_ns
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._snapshot = self._load()
+                    self._mtime = mtime
+        return self._snapshot
+
+    def _load(self):
+        with open(self.path) as f:
+            raw = json.load(f)
+        if self._world_map is None:
+            self._world_map = load_world_map()
+
+        detectors = [Detector(*values) for values in raw.values()]
+        by_name = {d.name: d for d in detectors}
+        by_id = {d.id: d for d in detectors}
+        by_alias = {d.name.lower(): d for d in detectors}
+        coordinates = np.full((len(detectors), 2), np.nan)
+        for i, detector in enumerate(detectors):
+            point = self._world_map.get(WORLD_MAP_NAMES.get(detector.name, detector.name))
+            aliases = []
+            if isinstance(detector.location, (list, tuple)) and len(detector.location) == 2:
+                coordinates[i] = detector.location
+            elif point is not None:
+                coordinates[i] = point["lat"], point["lon"]
+            if point is not None:
+                aliases.append(WORLD_MAP_NAMES.get(detector.name, detector.name))
+                aliases.extend((point.get("aliases") or "").split(","))
+            for alias in aliases:
+                # an alias never hides the name of another detector
+                by_alias.setdefault(alias.strip().lower(), detector)
+        by_alias.pop("", None)
+
+        ids = np.array([d.id for d in detectors])
+        ids.setflags(write=False)
+        coordinates.setflags(write=False)
+        log.debug(f"loaded {len(detectors)} detectors from {self.path}")
+        return _Snapshot(tuple(detectors), by_name, by_id, by_alias,
+                         tuple(d.name for d in detectors), ids, coordinates)
+
+    @property
+    def names(self):
+        """Detector names, in the order of the file."""
+        return self._refresh().names
+
+    @property
+    def ids(self):
+        """Detector ids as an array, in the order of `names`."""
+        return self._refresh().ids
+
+    @property
+    def coordinates(self):
+        """Latitudes and longitudes in degrees, shape ``(len(names), 2)``, NaN where unknown."""
+        return self._refresh().coordinates
+
+    def __len__(self):
+        return len(self._refresh().detectors)
+
+    def __iter__(self):
+        return iter(self._refresh().detectors)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        detector = self.get(key)
+        if detector is None:
+            raise KeyError(f"{key} is not a valid detector. \nChoose from {list(self.names)}")
+        return detector
+
+    def get(self, key, default=None):
+        """A detector by name, id or case-insensitive alias."""
+        snapshot = self._refresh()
+        if isinstance(key, (int, np.integer)):
+            return snapshot.by_id.get(int(key), default)
+        detector = snapshot.by_name.get(key)
+        if detector is None and isinstance(key, str):
+            detector = snapshot.by_alias.get(key.strip().lower())
+        return default if detector is None else detector
+
+    def as_dict(self):
+        """{name: Detector}, like :func:`snews_pt.snews_pt_utils.retrieve_detectors`."""
+        return dict(self._refresh().by_name)
+
+    def distances(self, lat, lon):
+        """Great circle distances in km from a point to every detector, in the order of `names`."""
+        return self._distances(self._refresh(), lat, lon)
+
+    @staticmethod
+    def _distances(snapshot, lat, lon):
+        lat1, lon1 = np.radians(lat), np.radians(lon)
+        lat2, lon2 = np.radians(snapshot.coordinates).T
+        a = (np.sin((lat2 - lat1) / 2) ** 2
+             + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+    def within(self, lat, lon, radius_km):
+        """Detectors within `radius_km` of a point, nearest first."""
+        snapshot = self._refresh()
+        distances = self._distances(snapshot, lat, lon)
+        inside = np.flatnonzero(distances <= radius_km)
+        return [snapshot.detectors[i] for i in inside[np.argsort(distances[inside])]]
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def registry(path=DEFAULT_FILE):
+    """The shared :class:`DetectorRegistry` of a detector file."""
+    path = os.path.abspath(path)
+    with _registries_lock:
+        if path not in _registries:
+            _registries[path] = DetectorRegistry(path)
+        return _registries[path]
@@ -0,0 +1,128 @@
+"""
+Bounded FIFO queue for outgoing messages.
+
+Backed by a deque, so adding and removing messages is O(1). When the queue is
+full the overflow policy decides what happens:
+
+- ``"raise"``: raise :class:`queue.Full`
+- ``"block"``: wait until a consumer makes room (optionally with a timeout)
+- ``"drop-oldest-heartbeat"``: discard the oldest queued heartbeat, raise if there is none
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+
+POLICIES = ("raise", "block", "drop-oldest-heartbeat")
+
+
+def _is_heartbeat(message):
+    return getattr(message, "tier", None) == "Heartbeat"
+
+
+class MessageQueue:
+    """Bounded message queue with depth, high-water mark and drop counters.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of queued messages, 0 or None for unbounded.
+    policy : str
+        Overflow policy, one of `POLICIES`.
+    block_timeout : float, optional
+        Seconds to wait with the "block" policy before raising :class:`queue.Full`.
+
+    """
+
+    def __init__(self, maxsize=10000, policy="raise", block_timeout=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy {policy!r}, choose from {POLICIES}")
+        self.maxsize = maxsize or 0
+        self.policy = policy
+        self.block_timeout = block_timeout
+
+        self.high_water = 0
+        self.dropped = 0
+        self._queue = deque()
+        self._not_full = threading.Condition(threading.Lock())
+
+    def __len__(self):
+        return len(self._queue)
+
+    def __iter__(self):
+        return iter(list(self._queue))
+
+    @property
+    def stats(self):
+        """Current depth, high-water mark and number of dropped messages."""
+        return {
+            "depth": len(self._queue),
+            "high_water": self.high_water,
+            "dropped": self.dropped,
+            "maxsize": self.maxsize,
+        }
+
+    def put(self, message):
+        """Append a message, applying the overflow policy if the queue is full.
+
+        Returns
+        -------
+        The message dropped to make room, or None.
+        """
+        with self._not_full:
+            dropped = None
+            if self._full():
+                if self.policy == "block":
+                    self._wait_for_room()
+                elif self.policy == "drop-oldest-heartbeat":
+                    dropped = self._drop_oldest_heartbeat()
+                else:
+                    raise queue.Full(f"message queue is full ({self.maxsize} messages)")
+            self._append(message)
+            return dropped
+
+    def force_put(self, message):
+        """Append a message ignoring `maxsize`, e.g. when replaying an outbox."""
+        with self._not_full:
+            self._append(message)
+
+    def get(self):
+        """Remove and return the oldest message, raise IndexError if empty."""
+        with self._not_full:
+            message = self._queue.popleft()
+            self._not_full.notify()
+            return message
+
+    def requeue(self, message):
+        """Put a message back at the front, e.g. after a failed send."""
+        with self._not_full:
+            self._queue.appendleft(message)
+
+    def clear(self):
+        with self._not_full:
+            self._queue.clear()
+            self._not_full.notify_all()
+
+    def _full(self):
+        return 0 < self.maxsize <= len(self._queue)
+
+    def _append(self, message):
+        self._queue.append(message)
+        self.high_water = max(self.high_water, len(self._queue))
+
+    def _wait_for_room(self):
+        deadline = None if self.block_timeout is None else time.monotonic() + self.block_timeout
+        while self._full():
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise queue.Full(f"message queue is still full after {self.block_timeout} s")
+            self._not_full.wait(remaining)
+
+    def _drop_oldest_heartbeat(self):
+        for i, queued in enumerate(self._queue):
+            if _is_heartbeat(queued):
+                del self._queue[i]
+                self.dropped += 1
+                return queued
+        raise queue.Full(f"message queue is full ({self.maxsize} messages) and holds no heartbeats")
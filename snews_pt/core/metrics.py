@@ -0,0 +1,250 @@
+"""
+Minimal Prometheus-style metrics for the publish and subscribe paths.
+
+Metrics are disabled by default. Instrumented code checks the module-level
+`enabled` flag before taking any timestamps, so the overhead of disabled
+metrics is a single attribute lookup. Call :func:`enable` and export with
+:func:`write_textfile` (node-exporter textfile collector) or
+:func:`start_http_server`.
+"""
+
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+enabled = False
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    """A label value escaped for the text exposition format."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    inner = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + inner + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """Return the child metric of the given label values."""
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        # labels() may add a child from another thread meanwhile
+        with self._lock:
+            children = sorted(self._children.items())
+        for values, child in children:
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._children = {}
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{_format_labels(labelnames, values)} {self.value:g}"]
+
+
+class _Buckets:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.sum += value
+
+    def render(self, name, labelnames, values):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, [('le', le)])} "
+                         f"{cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {total:g}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {cumulative}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1.0):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _Buckets(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+REGISTRY = []
+
+
+def _register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+# publishing
+MESSAGES_SENT = _register(Counter(
+    "snews_pt_messages_sent_total", "Messages written to Kafka", ["tier"]))
+BYTES_SENT = _register(Counter(
+    "snews_pt_bytes_sent_total", "Serialized payload bytes written to Kafka", ["tier"]))
+SERIALIZE_SECONDS = _register(Histogram(
+    "snews_pt_serialize_seconds", "Time spent serializing a message", ["serializer"]))
+WRITE_SECONDS = _register(Histogram(
+    "snews_pt_write_seconds", "Time spent handing a message to the producer"))
+QUEUE_DEPTH = _register(Gauge(
+    "snews_pt_queue_depth", "Messages waiting in the publisher queue", ["topic"]))
+
+# subscribing
+ALERTS_RECEIVED = _register(Counter(
+    "snews_pt_alerts_received_total", "Alerts received by the subscriber", ["alert_type"]))
+ALERT_SAVE_SECONDS = _register(Histogram(
+    "snews_pt_alert_save_seconds", "Time spent saving an alert"))
+ALERT_DISPLAY_SECONDS = _register(Histogram(
+    "snews_pt_alert_display_seconds", "Time spent rendering an alert"))
+ALERT_PLUGIN_SECONDS = _register(Histogram(
+    "snews_pt_alert_plugin_seconds", "Time spent running the plugin on an alert"))
+ALERT_DEDUP = _register(Counter(
+    "snews_pt_alert_dedup_total", "Duplicate alert lookups, by hit or miss", ["result"]))
+
+
+def enable():
+    """Start recording metrics."""
+    global enabled
+    enabled = True
+
+
+def disable():
+    """Stop recording metrics and forget the recorded values."""
+    global enabled
+    enabled = False
+    for metric in REGISTRY:
+        metric.reset()
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path):
+    """Atomically write the metrics to `path`, for the node-exporter textfile collector."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+
+def start_textfile_writer(path, interval=15.0):
+    """Rewrite the textfile every `interval` seconds from a daemon thread.
+
+    Returns
+    -------
+    threading.Event
+        Set it to stop the writer.
+    """
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            write_textfile(path)
+
+    threading.Thread(target=loop, name="snews_pt-metrics-textfile", daemon=True).start()
+    return stop
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_http_server(port, addr="127.0.0.1"):
+    """Serve the metrics on ``http://addr:port/`` from a daemon thread.
+
+    Returns
+    -------
+    http.server.ThreadingHTTPServer
+        Call ``shutdown()`` on it to stop serving.
+    """
+    server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="snews_pt-metrics-http",
+                     daemon=True).start()
+    return server
@@ -0,0 +1,207 @@
+"""
+Durable on-disk outbox for published messages.
+
+Messages are appended to memory-mapped segment files before they are sent and
+only marked as acknowledged once the broker accepted them. Whatever is still
+pending when the process dies is replayed the next time the outbox is opened.
+
+Each segment is a preallocated file holding back-to-back records::
+
+    magic (1B) | state (1B) | reserved (2B) | length (4B) | crc32 (4B) | payload
+
+The magic byte is written last, so a record torn by a crash is never replayed.
+Acknowledging flips the state byte in place. A segment is deleted once it is
+full (or left over from an earlier run) and all of its records are acknowledged.
+"""
+
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+from .logging import getLogger
+
+log = getLogger(__name__)
+
+_MAGIC = 0xA5
+_PENDING = 0
+_ACKED = 1
+_HEADER = struct.Struct("<BBHII")
+
+
+class _Segment:
+    """A single memory-mapped segment file."""
+
+    def __init__(self, path, size=None):
+        self.path = path
+        self.index = int(os.path.basename(path).split(".")[0])
+        exists = os.path.isfile(path)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if not exists:
+            os.ftruncate(self._fd, size)
+        self.size = os.fstat(self._fd).st_size
+        self.mm = mmap.mmap(self._fd, self.size)
+        self.write_pos = 0
+        self.pending = 0
+
+    def scan(self):
+        """Yield ``(offset, state, payload)`` of every complete record."""
+        pos = 0
+        while pos + _HEADER.size <= self.size:
+            magic, state, _, length, crc = _HEADER.unpack_from(self.mm, pos)
+            end = pos + _HEADER.size + length
+            if magic != _MAGIC or end > self.size:
+                break
+            payload = self.mm[pos + _HEADER.size:end]
+            if zlib.crc32(payload) != crc:
+                log.warning(f"corrupt record in {self.path} at {pos}, ignoring the rest")
+                break
+            yield pos, state, payload
+            pos = end
+        self.write_pos = pos
+
+    def fits(self, length):
+        return self.write_pos + _HEADER.size + length <= self.size
+
+    def append(self, payload):
+        pos = self.write_pos
+        start = pos + _HEADER.size
+        self.mm[start:start + len(payload)] = payload
+        # write the header with the magic byte last
+        _HEADER.pack_into(self.mm, pos, 0, _PENDING, 0, len(payload), zlib.crc32(payload))
+        self.mm[pos] = _MAGIC
+        self.write_pos = start + len(payload)
+        self.pending += 1
+        return pos
+
+    def ack(self, pos):
+        if self.mm[pos + 1] == _PENDING:
+            self.mm[pos + 1] = _ACKED
+            self.pending -= 1
+
+    def flush(self):
+        self.mm.flush()
+
+    def close(self):
+        self.mm.close()
+        os.close(self._fd)
+
+    def remove(self):
+        self.close()
+        os.remove(self.path)
+
+
+class Outbox:
+    """Append-only, segmented log of messages waiting to be delivered.
+
+    Parameters
+    ----------
+    path : str
+        Directory holding the segment files, created if missing.
+    segment_size : int
+        Size in bytes of each preallocated segment. Larger records get a segment of their own.
+    sync : bool
+        If True, ``msync`` after every append and acknowledgement. Without it the data
+        survives a crash of the process but not necessarily of the machine.
+
+    """
+
+    def __init__(self, path, segment_size=1 << 20, sync=False):
+        self.path = path
+        self.segment_size = segment_size
+        self.sync = sync
+
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._segments = {}
+        self._replay = []
+
+        for name in sorted(os.listdir(path)):
+            if not name.endswith(".seg"):
+                continue
+            if os.path.getsize(os.path.join(path, name)) == 0:
+                os.remove(os.path.join(path, name))
+                continue
+            segment = _Segment(os.path.join(path, name))
+            for pos, state, payload in segment.scan():
+                if state == _PENDING:
+                    segment.pending += 1
+                    self._replay.append(((segment.index, pos), payload))
+            if segment.pending == 0:
+                segment.remove()
+            else:
+                self._segments[segment.index] = segment
+
+        # never append to a segment from an earlier run
+        last = max(self._segments, default=-1)
+        self._active = self._new_segment(last + 1, segment_size)
+
+    def __len__(self):
+        return sum(s.pending for s in self._segments.values())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def pending(self):
+        """Records left unacknowledged by an earlier run, as ``(record_id, payload)``."""
+        replay, self._replay = self._replay, []
+        return replay
+
+    def append(self, payload: bytes):
+        """Store `payload` and return its record id."""
+        with self._lock:
+            if not self._active.fits(len(payload)):
+                self._rotate(len(payload))
+            segment = self._active
+            pos = segment.append(payload)
+            if self.sync:
+                segment.flush()
+            return (segment.index, pos)
+
+    def ack(self, record_id):
+        """Mark a record as delivered, deleting its segment once nothing in it is pending."""
+        index, pos = record_id
+        with self._lock:
+            segment = self._segments.get(index)
+            if segment is None:
+                return
+            segment.ack(pos)
+            if self.sync:
+                segment.flush()
+            if segment.pending == 0 and segment is not self._active:
+                del self._segments[index]
+                segment.remove()
+
+    def flush(self):
+        """Write all mapped pages to disk."""
+        with self._lock:
+            for segment in self._segments.values():
+                segment.flush()
+
+    def close(self):
+        """Close all segments, deleting those with nothing pending."""
+        with self._lock:
+            for segment in self._segments.values():
+                if segment.pending == 0:
+                    segment.remove()
+                else:
+                    segment.flush()
+                    segment.close()
+            self._segments = {}
+
+    def _new_segment(self, index, size):
+        segment = _Segment(os.path.join(self.path, f"{index:010d}.seg"), size)
+        self._segments[index] = segment
+        return segment
+
+    def _rotate(self, length):
+        old = self._active
+        size = max(self.segment_size, _HEADER.size + length)
+        self._active = self._new_segment(old.index + 1, size)
+        if old.pending == 0:
+            del self._segments[old.index]
+            old.remove()
@@ -0,0 +1,158 @@
+"""
+Long-running heartbeat sender
+
+Sends a HeartbeatMessage every N seconds over a single open connection.
+Beats are scheduled on the monotonic clock relative to the start time, so the
+period does not drift with the time spent sending. If a beat takes longer
+than the period, the missed slots are skipped instead of sent in a burst.
+
+The detector status is read from a status source before every beat:
+
+- ``ON`` / ``OFF``: a constant status
+- ``file:PATH``: the content of a file
+- ``cmd:COMMAND``: the output of a shell command
+- ``py:module:function``: the return value of a python callable
+"""
+
+import importlib
+import subprocess
+import threading
+import time
+from datetime import UTC, datetime
+
+import click
+from snews.models import messages
+
+from .core.logging import getLogger
+
+log = getLogger(__name__)
+
+
+def _normalize_status(value):
+    if isinstance(value, bool):
+        return "ON" if value else "OFF"
+    status = str(value).strip().upper()
+    if status not in ("ON", "OFF"):
+        raise ValueError(f"Detector status must be either ON or OFF, got {value!r}")
+    return status
+
+
+def status_source(spec):
+    """Build a callable returning the current detector status from a source description.
+
+    Parameters
+    ----------
+    spec : str or callable
+        ``"ON"``, ``"OFF"``, ``"file:PATH"``, ``"cmd:COMMAND"``, ``"py:module:function"``
+        or any callable returning a status.
+
+    Returns
+    -------
+    callable
+        Returns "ON" or "OFF" when called.
+    """
+    if callable(spec):
+        return lambda: _normalize_status(spec())
+
+    kind, _, target = spec.partition(":")
+    if not target:
+        status = _normalize_status(spec)
+        return lambda: status
+    if kind == "file":
+        def read_file():
+            with open(target) as f:
+                return _normalize_status(f.read())
+        return read_file
+    if kind == "cmd":
+        def run_command():
+            result = subprocess.run(target, shell=True, capture_output=True, text=True,
+                                    timeout=30, check=True)
+            return _normalize_status(result.stdout)
+        return run_command
+    if kind == "py":
+        module, _, name = target.rpartition(":")
+        function = getattr(importlib.import_module(module), name)
+        return lambda: _normalize_status(function())
+    raise ValueError(f"Unknown status source {spec!r}")
+
+
+class HeartbeatDaemon:
+    """Publish heartbeats at a fixed period until stopped.
+
+    Parameters
+    ----------
+    publisher : snews_pt.messages.Publisher
+        Publisher whose connection is reused for every beat.
+    detector_name : str
+        Name of the detector sending the heartbeats.
+    every : float
+        Period in seconds.
+    status : str or callable
+        Status source, see :func:`status_source`.
+    is_firedrill : bool
+        Flag the heartbeats as firedrill messages.
+    verbose : int
+        Verbosity passed to the publisher.
+
+    """
+
+    def __init__(self, publisher, detector_name, every=60.0, status="ON",
+                 is_firedrill=False, verbose=0):
+        if every <= 0:
+            raise ValueError("The heartbeat period must be positive")
+        self.publisher = publisher
+        self.detector_name = detector_name
+        self.every = every
+        self.status = status_source(status)
+        self.is_firedrill = is_firedrill
+        self.verbose = verbose
+
+        self.sent = 0
+        self.failed = 0
+        self._stop = threading.Event()
+
+    def stop(self, *args):
+        """Ask the daemon to stop after the current beat, usable as a signal handler."""
+        self._stop.set()
+
+    def beat(self):
+        """Read the status and send a single heartbeat. Errors are logged, not raised."""
+        try:
+            status = self.status()
+        except Exception as e:
+            log.error(f"could not read the detector status, skipping heartbeat: {e}")
+            click.secho(f"Could not read the detector status: {e}", fg="red")
+            self.failed += 1
+            return False
+
+        message = messages.HeartbeatMessage(
+            detector_name=self.detector_name,
+            machine_time_utc=datetime.now(UTC),
+            detector_status=status,
+            is_firedrill=self.is_firedrill,
+        )
+        try:
+            self.publisher.add_message(message)
+            self.publisher.send(verbose=self.verbose)
+        except Exception as e:
+            log.error(f"could not send heartbeat: {e}")
+            click.secho(f"Could not send heartbeat: {e}", fg="red")
+            self.failed += 1
+            return False
+        self.sent += 1
+        return True
+
+    def run(self, count=None):
+        """Send heartbeats until :meth:`stop` is called or `count` beats were attempted."""
+        self._stop.clear()
+        start = time.monotonic()
+        slot = 0
+        while not self._stop.is_set():
+            self.beat()
+            if count is not None and self.sent + self.failed >= count:
+                break
+            now = time.monotonic()
+            # next slot on the start-anchored grid, skipping those already missed
+            slot = max(slot + 1, int((now - start) // self.every) + 1)
+            if self._stop.wait(start + slot * self.every - now):
+                break
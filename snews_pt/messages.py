@@ -1,23 +1,99 @@
+import asyncio
 import json
 import pickle
+import queue
+import time
 from datetime import UTC, datetime
 from typing import Union
 
 import click
-from hop import Stream
-from hop.models import Blob
 from snews.models import messages
 from snews.models.timing import PrecisionTimestamp
 
+from .core import metrics
+from .core.connections import ConnectionPool
+from .core.logging import getLogger
+from .core.message_queue import MessageQueue
+from .core.outbox import Outbox
+from .serializers import get_serializer
+
+log = getLogger(__name__)
+
 
 class Publisher:
-    def __init__(self, kafka_topic, auth=True):
+    """Queue SNEWS messages and publish them to a Kafka topic.
+
+    The producer is opened on the first send and kept open, so repeated sends
+    reuse the same connection. Use the publisher as a context manager, or call
+    :meth:`close`, to tear it down.
+
+    Parameters
+    ----------
+    kafka_topic : str
+        Topic to publish to.
+    auth : bool or hop.auth.Auth
+        Authentication passed to :class:`hop.Stream`.
+    pool : snews_pt.core.connections.ConnectionPool, optional
+        Share producers with other publishers. If not given, the publisher owns its own pool.
+    idle_timeout : float
+        Seconds after which an unused connection of the owned pool is closed.
+    serializer : str or snews_pt.serializers.Serializer
+        Wire format, "pickle" (default), "json" or "msgpack".
+    outbox : str or snews_pt.core.outbox.Outbox, optional
+        Directory of a persistent outbox. Queued messages are stored there until the
+        broker accepted them, and messages left over by a previous run are queued again.
+        An outbox opened from a directory is closed with the publisher, and opened
+        again by the next :meth:`add_message`.
+    max_queue_size : int
+        Maximum number of queued messages, 0 for unbounded.
+    queue_policy : str
+        What to do when the queue is full: "raise" (:class:`queue.Full`), "block" or
+        "drop-oldest-heartbeat". See :mod:`snews_pt.core.message_queue`.
+    block_timeout : float or None
+        Seconds :meth:`add_message` waits for room with the "block" policy before raising
+        :class:`queue.Full`. Only another thread calling :meth:`send` makes room, so
+        None (wait forever) deadlocks a publisher used from a single thread.
+
+    """
+
+    def __init__(self, kafka_topic, auth=True, pool=None, idle_timeout=300.0,
+                 serializer="pickle", outbox=None, max_queue_size=10000,
+                 queue_policy="raise", block_timeout=30.0):
         self.kafka_topic = kafka_topic
         self.auth = auth
+        self.serializer = get_serializer(serializer)
+
+        self.message_queue = MessageQueue(max_queue_size, queue_policy, block_timeout)
 
-        self.message_queue = []
+        self._owns_pool = pool is None
+        self.pool = pool or ConnectionPool(auth=auth, idle_timeout=idle_timeout)
 
-        pass
+        self._owns_outbox = isinstance(outbox, str)
+        self._outbox_path = outbox if self._owns_outbox else None
+        self.outbox = None if self._owns_outbox else outbox
+        self._outbox_ids = {}  # message uuid -> outbox record id
+        self._open_outbox()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Close the connection(s) and the outbox owned by this publisher.
+
+        The publisher can still be used, a later send reconnects and a later
+        :meth:`add_message` opens the outbox again.
+        """
+        if self._owns_pool:
+            self.pool.close()
+        if self._owns_outbox:
+            if self.outbox is not None:
+                self.outbox.close()
+                self.outbox = None
+        elif self.outbox is not None:
+            self.outbox.flush()
 
     def add_message(self, message: Union[dict, messages.MessageBase],
                     verbose: int = 0) -> None:
@@ -34,7 +110,13 @@ class Publisher:
         msg_props = message if type(message) is dict else message.model_dump()
 
         for snews_message in messages.create_messages(**msg_props):
-            self.message_queue.insert(0, snews_message)
+            dropped = self.message_queue.put(snews_message)
+            self._persist(snews_message)
+            if dropped is not None:
+                log.warning(f"queue full, dropped heartbeat {dropped.id}")
+                self._ack([dropped])
+            if metrics.enabled:
+                metrics.QUEUE_DEPTH.labels(self.kafka_topic).set(len(self.message_queue))
 
             if verbose >= 1:
                 click.secho(f"Added message to queue", fg="green", bold=True)
@@ -55,13 +137,19 @@ class Publisher:
         verbose: `int`
             verbosity level. 0: no output, 1: print simple feedback, 2: print message details.
         """
-        stream = Stream(until_eos=True, auth=self.auth)
-        with stream.open(self.kafka_topic, "w") as conn:
+        self._open_outbox()
+        sent = []
+        try:
             while len(self.message_queue) > 0:
-                message = self.message_queue.pop()
-                message.sent_time_utc = str(PrecisionTimestamp())
-                conn.write(Blob(pickle.dumps(message)))
-                
+                message = self.message_queue.get()
+                try:
+                    self._deliver(message)
+                except Exception:
+                    # keep the message for the next attempt
+                    self.message_queue.requeue(message)
+                    raise
+                sent.append(message)
+
                 if verbose >= 1:
                     click.secho(f"Sent message to {self.kafka_topic}", fg="green", bold=True)
                     if verbose >= 2:
@@ -70,7 +158,257 @@ class Publisher:
                         for key, value in message_data.items():
                             click.secho(f"  {key}: {value}", fg="cyan")
                         click.secho('--------------------------------', fg="blue", bold=True)
-                
+        finally:
+            # what was written before a failure is delivered, do not replay it
+            if sent:
+                self._flush()
+                self._ack(sent)
+        if metrics.enabled:
+            metrics.QUEUE_DEPTH.labels(self.kafka_topic).set(len(self.message_queue))
+
+    def queue_stats(self) -> dict:
+        """Depth, high-water mark and drop count of the message queue."""
+        return self.message_queue.stats
+
+    def _open_outbox(self):
+        """Open the owned outbox if it is closed, queueing the messages left in it."""
+        if self._owns_outbox and self.outbox is None:
+            self.outbox = Outbox(self._outbox_path)
+        if self.outbox is None:
+            return
+        replayed = 0
+        for record_id, payload in self.outbox.pending():
+            message = pickle.loads(payload)
+            # still queued from before the outbox was closed
+            if message.uuid not in self._outbox_ids:
+                self.message_queue.force_put(message)
+                replayed += 1
+            self._outbox_ids[message.uuid] = record_id
+        if replayed:
+            log.info(f"replaying {replayed} message(s) from {self.outbox.path}")
+
+    def _persist(self, message):
+        """Store a queued message in the outbox, if there is one."""
+        self._open_outbox()
+        if self.outbox is not None:
+            self._outbox_ids[message.uuid] = self.outbox.append(pickle.dumps(message))
+
+    def _ack(self, sent):
+        """Drop delivered messages from the outbox."""
+        if self.outbox is not None:
+            for message in sent:
+                record_id = self._outbox_ids.pop(message.uuid, None)
+                if record_id is not None:
+                    self.outbox.ack(record_id)
+
+    def _deliver(self, message):
+        """Write a single message, reconnecting once if the pooled producer fails."""
+        message.sent_time_utc = str(PrecisionTimestamp())
+        if metrics.enabled:
+            t0 = time.perf_counter()
+        payload = self.serializer.encode(message)
+        blob = self.serializer.wrap(payload)
+        if metrics.enabled:
+            t1 = time.perf_counter()
+        try:
+            self.pool.get(self.kafka_topic).write(blob)
+        except Exception as e:
+            log.warning(f"write to {self.kafka_topic} failed ({e}), reconnecting")
+            self.pool.invalidate(self.kafka_topic)
+            self.pool.get(self.kafka_topic).write(blob)
+        if metrics.enabled:
+            tier = getattr(message.tier, "value", message.tier)
+            metrics.SERIALIZE_SECONDS.labels(self.serializer.name).observe(t1 - t0)
+            metrics.WRITE_SECONDS.observe(time.perf_counter() - t1)
+            metrics.MESSAGES_SENT.labels(tier).inc()
+            metrics.BYTES_SENT.labels(tier).inc(len(payload))
+
+    def _flush(self):
+        """Wait until the queued writes are delivered to the broker."""
+        if self.kafka_topic in self.pool:
+            self.pool.get(self.kafka_topic).flush()
+
+
+
+def load_json_messages(filename):
+    """Read a json file and build the SNEWS messages it describes.
+
+    Parameters
+    ----------
+    filename : str
+        Path to a json file holding the message fields.
+
+    Returns
+    -------
+    list of snews.messages.MessageBase
+
+    """
+    with open(filename, "r", encoding="utf-8") as json_file:
+        json_data = json.load(json_file)
+    return messages.create_messages(**json_data)
+
+
+class AsyncPublisher:
+    """asyncio counterpart of :class:`Publisher`.
+
+    Messages are queued without blocking the event loop and sent by a background
+    task once `max_batch` messages are waiting or `flush_interval` seconds have
+    passed. The blocking Kafka writes run in a worker thread.
+
+    Parameters
+    ----------
+    kafka_topic : str
+        Topic to publish to.
+    auth : bool or hop.auth.Auth
+        Authentication passed to :class:`hop.Stream`.
+    max_batch : int
+        Number of queued messages that triggers an immediate flush.
+    flush_interval : float
+        Maximum number of seconds a message waits in the queue.
+    serializer : str or snews_pt.serializers.Serializer
+        Wire format, "pickle" (default), "json" or "msgpack".
+    outbox : str or snews_pt.core.outbox.Outbox, optional
+        Persistent outbox, see :class:`Publisher`. Replayed messages are sent on the first flush.
+    max_queue_size : int
+        Maximum number of messages waiting for a flush, 0 for unbounded.
+    queue_policy : str
+        What to do when the queue is full: "raise" (:class:`queue.Full`) or
+        "drop-oldest-heartbeat", whose future then raises :class:`queue.Full`. "block"
+        is not supported, it would block the event loop that runs the flushes.
+
+    Examples
+    --------
+    >>> async with AsyncPublisher(topic) as pub:
+    ...     results = await pub.add_message(heartbeat)
+    ...     sent = await asyncio.gather(*results)
+
+    """
+
+    def __init__(self, kafka_topic, auth=True, max_batch=100, flush_interval=1.0,
+                 serializer="pickle", outbox=None, max_queue_size=10000,
+                 queue_policy="raise"):
+        if queue_policy == "block":
+            raise ValueError("AsyncPublisher does not support the 'block' queue policy")
+        self.kafka_topic = kafka_topic
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+
+        self._publisher = Publisher(kafka_topic, auth=auth, serializer=serializer,
+                                    outbox=outbox)
+        self._pending = MessageQueue(max_queue_size, queue_policy)
+        self._futures = {}  # message uuid -> future
+        self._wakeup = asyncio.Event()
+        self._send_lock = asyncio.Lock()
+        self._task = None
+        self._closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def add_message(self, message: Union[dict, messages.MessageBase],
+                          verbose: int = 0) -> list:
+        """Queue a message for sending.
+
+        Parameters
+        ----------
+        message: `dict` or snews.messages.MessageBase
+            observation message.
+        verbose: `int`
+            verbosity level. 0: no output, 1: print simple feedback.
+
+        Returns
+        -------
+        list of asyncio.Future
+            One future per SNEWS message built from `message`. Each resolves to the sent
+            message, or raises the error that prevented its delivery.
+        """
+        if self._closed:
+            raise RuntimeError("AsyncPublisher is closed")
+
+        msg_props = message if type(message) is dict else message.model_dump()
+        loop = asyncio.get_running_loop()
+        futures = []
+        for snews_message in messages.create_messages(**msg_props):
+            dropped = self._pending.put(snews_message)
+            self._publisher._persist(snews_message)
+            if dropped is not None:
+                log.warning(f"queue full, dropped heartbeat {dropped.id}")
+                self._publisher._ack([dropped])
+                dropped_future = self._futures.pop(dropped.uuid)
+                if not dropped_future.done():
+                    dropped_future.set_exception(queue.Full(f"dropped heartbeat {dropped.id}"))
+            future = loop.create_future()
+            self._futures[snews_message.uuid] = future
+            futures.append(future)
+            if verbose >= 1:
+                click.secho("Added message to queue", fg="green", bold=True)
+
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+        return futures
+
+    async def flush(self) -> None:
+        """Send everything that is queued and wait for the delivery results."""
+        async with self._send_lock:
+            loop = asyncio.get_running_loop()
+            if len(self._publisher.message_queue) > 0:
+                # messages replayed from the outbox
+                await loop.run_in_executor(None, self._publisher.send)
+            batch = [self._pending.get() for _ in range(len(self._pending))]
+            if not batch:
+                return
+            results = await loop.run_in_executor(None, self._send_batch, batch)
+        for message, result in zip(batch, results):
+            future = self._futures.pop(message.uuid)
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def aclose(self) -> None:
+        """Flush the queue, stop the background task and close the connection."""
+        self._closed = True
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        await asyncio.get_running_loop().run_in_executor(None, self._publisher.close)
+
+    async def _run(self):
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                log.error(f"background flush to {self.kafka_topic} failed: {e}")
+
+    def _send_batch(self, batch):
+        """Blocking part of :meth:`flush`, runs in an executor thread."""
+        results = []
+        for message in batch:
+            try:
+                self._publisher._deliver(message)
+                results.append(message)
+            except Exception as e:
+                results.append(e)
+        try:
+            self._publisher._flush()
+        except Exception as e:
+            return [e if not isinstance(r, Exception) else r for r in results]
+        self._publisher._ack([r for r in results if not isinstance(r, Exception)])
+        return results
 
 
 def test():
@@ -0,0 +1,435 @@
+"""
+Composable alert processing pipeline
+
+A pipeline reads alerts from a source and passes each of them through a list
+of stages. A stage can change the alert, or return None to drop it, so the
+stages after it never see it. The subscriber builds its pipeline from
+
+    Filter -> Dedup -> Store -> Render -> PluginSink -> Callback
+
+and any of them can be left out or replaced, e.g. no `Render` on a headless
+server, or a `Filter` that only lets retractions through.
+
+Stages normally run one after the other in the thread reading the source. A
+stage with a `queue_size` starts a new segment: it and the stages after it run
+in their own thread, fed through a bounded queue of that size. Expensive sinks
+can so run concurrently while the source keeps consuming, until the queue is
+full.
+
+    pipeline = Pipeline(source, [Filter(alert_type="RETRACTION"), Store(save, "alerts/"),
+                                 PluginSink(plugin, queue_size=100)])
+    for alert in pipeline:
+        ...
+"""
+
+import queue
+import threading
+import time
+
+from . import snews_pt_utils
+from .core import metrics
+from .core.logging import getLogger
+from .plugins import PluginPool, run_plugin
+
+log = getLogger(__name__)
+
+TEST_CONNECTION_ID = "0_test-connection"
+
+
+class Alert:
+    """An alert travelling through the pipeline.
+
+    Parameters
+    ----------
+    message : dict
+        The alert content.
+    topic : str, optional
+        Url of the topic it was read from.
+    metadata : hop.io.Metadata, optional
+        Kafka metadata (partition, offset...) of the message.
+
+    Attributes
+    ----------
+    file : str or None
+        Where the alert was saved, set by :class:`Store`.
+    ok : bool
+        False once a plugin failed on it.
+    """
+
+    __slots__ = ("message", "topic", "metadata", "file", "ok", "_held")
+
+    def __init__(self, message, topic=None, metadata=None):
+        self.message = message
+        self.topic = topic
+        self.metadata = metadata
+        self.file = None
+        self.ok = True
+        self._held = None  # callbacks waiting for release()
+
+    def __repr__(self):
+        return f"<Alert {self.message.get('_id')} from {self.topic}>"
+
+    def hold(self):
+        """Defer :meth:`when_done` until :meth:`release`, e.g. while a plugin pool handles it."""
+        with _hold_lock:
+            if self._held is None:
+                self._held = []
+
+    def release(self, ok=True):
+        """Mark a held alert as handled, `ok` if it succeeded, and run the deferred callbacks."""
+        with _hold_lock:
+            self.ok = self.ok and ok
+            callbacks, self._held = self._held or [], None
+        for function in callbacks:
+            function(self)
+
+    def when_done(self, function):
+        """Call `function` with the alert once it is handled, right away unless it is held."""
+        with _hold_lock:
+            if self._held is not None:
+                self._held.append(function)
+                return
+        function(self)
+
+
+_hold_lock = threading.Lock()
+
+
+class Stage:
+    """Base class of the pipeline stages.
+
+    Parameters
+    ----------
+    queue_size : int
+        If not 0, run this stage and the ones after it in a separate thread,
+        behind a queue of this many alerts.
+    """
+
+    def __init__(self, queue_size=0):
+        self.queue_size = queue_size
+
+    @property
+    def name(self):
+        return type(self).__name__
+
+    def open(self):
+        """Called once before the first alert."""
+
+    def process(self, alert):
+        """Handle an :class:`Alert`, return it to pass it on or None to drop it."""
+        return alert
+
+    def close(self):
+        """Called once after the last alert."""
+
+
+class Filter(Stage):
+    """Drop alerts not matching all criteria, compiled once into a list of checks.
+
+    Parameters
+    ----------
+    alert_type : str or iterable of str, optional
+        Accepted alert types, e.g. "RETRACTION" (case insensitive).
+    detectors : str or iterable of str, optional
+        Accept alerts involving at least one of these detectors.
+    is_test : bool, optional
+        Accept only test, or only non-test alerts.
+    predicate : callable or list of callables, optional
+        Further checks, called with the alert message, returning True to accept it.
+    skip_test_connection : bool
+        Drop the messages sent by `snews_pt test-connection`.
+    """
+
+    def __init__(self, alert_type=None, detectors=None, is_test=None, predicate=None,
+                 skip_test_connection=True, queue_size=0):
+        super().__init__(queue_size)
+        checks = []
+        if skip_test_connection:
+            checks.append(lambda m: m.get("_id") != TEST_CONNECTION_ID)
+        if alert_type:
+            types = frozenset(t.upper() for t in _as_set(alert_type))
+            checks.append(lambda m: str(m.get("alert_type", "")).upper() in types)
+        if detectors:
+            wanted = frozenset(_as_set(detectors))
+            checks.append(lambda m: not wanted.isdisjoint(m.get("detector_names") or ()))
+        if is_test is not None:
+            is_test = bool(is_test)
+            checks.append(lambda m: bool(m.get("is_test")) is is_test)
+        if callable(predicate):
+            checks.append(predicate)
+        elif predicate:
+            checks.extend(predicate)
+        self._checks = tuple(checks)
+
+    def process(self, alert):
+        message = alert.message
+        for check in self._checks:
+            if not check(message):
+                return None
+        return alert
+
+
+def _as_set(value):
+    return {value} if isinstance(value, str) else set(value)
+
+
+class Dedup(Stage):
+    """Drop alerts a :class:`snews_pt.core.dedup.DedupCache` has seen.
+
+    Parameters
+    ----------
+    cache : DedupCache
+    remember : bool
+        Add alerts to the cache right away. Otherwise a later stage (usually a
+        :class:`Callback`) adds them once they were handled successfully.
+    """
+
+    def __init__(self, cache, remember=False, queue_size=0):
+        super().__init__(queue_size)
+        self.cache = cache
+        self.remember = remember
+
+    def process(self, alert):
+        if self.cache.seen(alert.message):
+            log.info(f"skipping duplicate alert {alert.message.get('_id')}")
+            return None
+        if self.remember:
+            self.cache.add(alert.message)
+        return alert
+
+
+class Store(Stage):
+    """Save alerts, setting `alert.file`.
+
+    Parameters
+    ----------
+    save : callable
+        ``save(message, folder, need_file)``, e.g. :meth:`Subscriber.save`, returns the file.
+    folder : str or callable
+        Output folder, or a function of the :class:`Alert` returning it.
+    need_file : bool
+        Passed on to `save`, whether a file is needed even if stored elsewhere.
+    """
+
+    def __init__(self, save, folder, need_file=False, queue_size=0):
+        super().__init__(queue_size)
+        self.save = save
+        self.folder = folder if callable(folder) else (lambda alert: folder)
+        self.need_file = need_file
+
+    def process(self, alert):
+        if metrics.enabled:
+            t0 = time.perf_counter()
+        alert.file = self.save(alert.message, self.folder(alert), self.need_file)
+        if metrics.enabled:
+            metrics.ALERT_SAVE_SECONDS.observe(time.perf_counter() - t0)
+        return alert
+
+
+class Render(Stage):
+    """Show alerts in the terminal.
+
+    Parameters
+    ----------
+    display : callable, optional
+        Called with the alert message, defaults to :func:`snews_pt.snews_sub.display`.
+    gif : bool
+        Show the alert animation first.
+    """
+
+    def __init__(self, display=None, gif=True, queue_size=0):
+        super().__init__(queue_size)
+        self.display = display
+        self.gif = gif
+
+    def open(self):
+        if self.display is None:
+            from .snews_sub import display
+
+            self.display = display
+
+    def process(self, alert):
+        if metrics.enabled:
+            t0 = time.perf_counter()
+        if self.gif:
+            snews_pt_utils.display_gif()
+        self.display(alert.message)
+        if metrics.enabled:
+            metrics.ALERT_DISPLAY_SECONDS.observe(time.perf_counter() - t0)
+        return alert
+
+
+class PluginSink(Stage):
+    """Hand alerts to plugins. Failures are reported and mark the alert as not ok.
+
+    An alert queued for a :class:`snews_pt.plugins.PluginPool` is held until a
+    worker handled it, see :meth:`Alert.hold`. One the pool had to drop fails.
+
+    Parameters
+    ----------
+    plugin : Plugin, PluginPool or dict
+        A loaded plugin, or a dictionary of them by topic url.
+    wait_for_file : callable, optional
+        Called with `alert.file` before a plugin that reads the saved file,
+        returns False if it could not be saved.
+    """
+
+    def __init__(self, plugin, wait_for_file=None, queue_size=0):
+        super().__init__(queue_size)
+        self.plugins = plugin if isinstance(plugin, dict) else None
+        self.plugin = None if isinstance(plugin, dict) else plugin
+        self.wait_for_file = wait_for_file
+
+    def process(self, alert):
+        plugin = self.plugin if self.plugins is None else self.plugins.get(alert.topic)
+        if plugin is None:
+            return alert
+        if plugin.needs_file and self.wait_for_file is not None:
+            if not self.wait_for_file(alert.file):
+                log.error(f"{alert!r} was not saved, not running plugin {plugin.name}")
+                alert.ok = False
+                return alert
+        if isinstance(plugin, PluginPool):
+            # a pool records the time spent in its workers itself
+            alert.hold()
+            if not run_plugin(plugin, alert.message, alert.file, callback=alert.release):
+                alert.release(False)
+            return alert
+        t0 = time.perf_counter()
+        alert.ok = run_plugin(plugin, alert.message, alert.file) and alert.ok
+        if metrics.enabled:
+            metrics.ALERT_PLUGIN_SECONDS.observe(time.perf_counter() - t0)
+        return alert
+
+
+class Callback(Stage):
+    """Call a function with every alert once it is handled, e.g. to commit it.
+
+    For an alert held by a plugin pool that is when a worker is done with it,
+    in a thread of the pool.
+    """
+
+    def __init__(self, function, queue_size=0):
+        super().__init__(queue_size)
+        self.function = function
+
+    @property
+    def name(self):
+        return getattr(self.function, "__qualname__", "Callback")
+
+    def process(self, alert):
+        alert.when_done(self.function)
+        return alert
+
+
+_DONE = object()
+
+
+class Pipeline:
+    """Pass the alerts of a source through stages.
+
+    Parameters
+    ----------
+    source : iterable of Alert
+        e.g. :meth:`snews_pt.snews_sub.Subscriber.source`.
+    stages : list of Stage
+    on_drop : callable, optional
+        Called with every alert a stage dropped on purpose, e.g. a filtered one. Not
+        called for an alert dropped because a stage raised.
+
+    Iterating over the pipeline runs it and yields the alerts that made it
+    through every stage; :meth:`run` runs it to the end.
+    """
+
+    def __init__(self, source, stages=(), on_drop=None):
+        self.source = source
+        self.stages = list(stages)
+        self.on_drop = on_drop
+        self.processed = 0
+
+    def _segments(self):
+        segments = [[]]
+        for stage in self.stages:
+            if stage.queue_size:
+                segments.append([stage])
+            else:
+                segments[-1].append(stage)
+        return segments
+
+    def _through(self, stages, alert):
+        for stage in stages:
+            try:
+                result = stage.process(alert)
+            except Exception:
+                log.exception(f"stage {stage.name} failed on {alert!r}, dropping it")
+                return None
+            if result is None:
+                if self.on_drop is not None:
+                    self.on_drop(alert)
+                return None
+            alert = result
+        return alert
+
+    def _worker(self, stages, inbox, outbox):
+        while True:
+            alert = inbox.get()
+            if alert is _DONE:
+                outbox.put(_DONE)
+                return
+            alert = self._through(stages, alert)
+            if alert is not None:
+                outbox.put(alert)
+
+    def __iter__(self):
+        segments = self._segments()
+        # the caller drains the results, so only the queues between stages are bounded
+        results = queue.Queue()
+        inboxes = [queue.Queue(maxsize=segment[0].queue_size) for segment in segments[1:]]
+        threads = [
+            threading.Thread(target=self._worker, daemon=True,
+                             name=f"snews_pt-pipeline-{segment[0].name}",
+                             args=(segment, inbox, inboxes[i + 1] if i + 1 < len(inboxes)
+                                   else results))
+            for i, (segment, inbox) in enumerate(zip(segments[1:], inboxes))
+        ]
+
+        opened = []
+        try:
+            for stage in self.stages:
+                stage.open()
+                opened.append(stage)
+            for thread in threads:
+                thread.start()
+
+            for alert in self.source:
+                alert = self._through(segments[0], alert)
+                if alert is None:
+                    continue
+                if not inboxes:
+                    self.processed += 1
+                    yield alert
+                    continue
+                inboxes[0].put(alert)
+                while not results.empty():
+                    self.processed += 1
+                    yield results.get()
+
+            if inboxes:
+                inboxes[0].put(_DONE)
+                while (alert := results.get()) is not _DONE:
+                    self.processed += 1
+                    yield alert
+        finally:
+            if threads and any(thread.is_alive() for thread in threads):
+                # let the running stages finish what is already queued
+                inboxes[0].put(_DONE)
+                for thread in threads:
+                    thread.join()
+            for stage in reversed(opened):
+                stage.close()
+
+    def run(self):
+        """Run the pipeline until the source is exhausted, return the number of alerts processed."""
+        for _ in self:
+            pass
+        return self.processed
@@ -0,0 +1,484 @@
+"""
+Alert plugins
+
+A plugin is imported once and called in-process for every alert. It provides
+a ``handle(alert)`` callable receiving the alert dictionary, and optionally
+``setup()`` and ``teardown()`` hooks to keep expensive state warm between alerts.
+
+Plugins are found by
+
+- file path, e.g. ``my_plugin.py``
+- module path, e.g. ``my_package.my_plugin`` or ``my_package.my_plugin:MyPlugin``
+- entry point name in the ``snews_pt.plugins`` group
+
+The object found can be a module, a class (instantiated once) or a plain callable.
+Scripts without a ``handle`` function are treated as legacy plugins, run as
+``python script.py <saved_alert.json>`` for every alert.
+
+:class:`PluginPool` runs a plugin in long-lived worker processes instead, so a
+slow, hung or crashing plugin cannot stop the subscriber.
+"""
+
+import ast
+import importlib
+import importlib.util
+import inspect
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from importlib.metadata import entry_points
+
+import click
+
+from .core import metrics
+from .core.logging import getLogger
+
+log = getLogger(__name__)
+
+ENTRY_POINT_GROUP = "snews_pt.plugins"
+
+
+class Plugin:
+    """A loaded alert plugin.
+
+    Parameters
+    ----------
+    handle : callable
+        Called with the alert dictionary.
+    setup, teardown : callable, optional
+        Called once before the first and after the last alert.
+    name : str
+        Name used in log messages.
+
+    """
+
+    needs_file = False
+
+    def __init__(self, handle, setup=None, teardown=None, name=None):
+        self.handle = handle
+        self._setup = setup
+        self._teardown = teardown
+        self.name = name or getattr(handle, "__qualname__", repr(handle))
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.name}>"
+
+    def __enter__(self):
+        self.setup()
+        return self
+
+    def __exit__(self, *exc):
+        self.teardown()
+
+    def setup(self):
+        if self._setup is not None:
+            self._setup()
+
+    def teardown(self):
+        if self._teardown is not None:
+            self._teardown()
+
+    def __call__(self, alert, file=None):
+        """Pass an alert to the plugin. `file` is where the alert was saved, if anywhere."""
+        return self.handle(alert)
+
+
+class ScriptPlugin(Plugin):
+    """Legacy plugin, a script run in a new interpreter with the saved alert file as argument."""
+
+    needs_file = True
+
+    def __init__(self, path):
+        super().__init__(handle=None, name=path)
+        self.path = path
+
+    def __call__(self, alert, file=None):
+        if file is not None:
+            subprocess.run([sys.executable, self.path, file], check=True)
+            return
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump(alert, f)
+        try:
+            subprocess.run([sys.executable, self.path, f.name], check=True)
+        finally:
+            os.remove(f.name)
+
+
+def _defines_handle(path):
+    """Whether the script at `path` defines a top-level `handle`, checked without running it"""
+    with open(path) as f:
+        tree = ast.parse(f.read(), filename=path)
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            if node.name == "handle":
+                return True
+        elif isinstance(node, ast.Assign):
+            if any(isinstance(t, ast.Name) and t.id == "handle" for t in node.targets):
+                return True
+    return False
+
+
+def _import_file(path):
+    name = "snews_pt_plugin_" + os.path.splitext(os.path.basename(path))[0].replace("-", "_")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _import_object(target):
+    module_name, _, attr = target.partition(":")
+    obj = importlib.import_module(module_name)
+    for part in filter(None, attr.split(".")):
+        obj = getattr(obj, part)
+    return obj
+
+
+def plugin_from_object(obj, name=None):
+    """Wrap a module, class, instance or callable into a :class:`Plugin`."""
+    if isinstance(obj, Plugin):
+        return obj
+    if inspect.isclass(obj):
+        obj = obj()
+    handle = getattr(obj, "handle", None)
+    if handle is None:
+        if inspect.ismodule(obj) or not callable(obj):
+            raise TypeError(f"Plugin {name or obj!r} has no `handle(alert)` callable")
+        handle = obj
+    return Plugin(
+        handle,
+        setup=getattr(obj, "setup", None),
+        teardown=getattr(obj, "teardown", None),
+        name=name,
+    )
+
+
+def load_plugin(spec):
+    """Find and import a plugin.
+
+    Parameters
+    ----------
+    spec : str or object
+        File path, module path (``module`` or ``module:attribute``), entry point name,
+        or an already imported plugin object.
+
+    Returns
+    -------
+    Plugin
+    """
+    if not isinstance(spec, str):
+        return plugin_from_object(spec)
+
+    spec = spec.strip()
+    if spec.endswith(".py") or os.path.isfile(spec):
+        if not os.path.isfile(spec):
+            raise FileNotFoundError(f"Plugin file not found: {spec}")
+        if not _defines_handle(spec):
+            log.warning(f"{spec} has no handle(alert), running it as a script for every alert")
+            return ScriptPlugin(spec)
+        return plugin_from_object(_import_file(spec), name=spec)
+
+    for ep in entry_points(group=ENTRY_POINT_GROUP):
+        if ep.name == spec:
+            return plugin_from_object(ep.load(), name=spec)
+
+    return plugin_from_object(_import_object(spec), name=spec)
+
+
+def run_plugin(plugin, message, file=None, **kwargs):
+    """Hand an alert to a plugin, reporting instead of raising its errors
+
+    Further keyword arguments are passed on to the plugin, e.g. the `callback`
+    of a :class:`PluginPool`.
+
+    Returns
+    -------
+    bool
+        Whether the plugin succeeded, or for a pool whether the alert was queued
+    """
+    try:
+        plugin(message, file, **kwargs)
+    except Exception as e:
+        log.exception(f"plugin {plugin.name} failed on alert {message.get('_id')}")
+        click.secho(f"Plugin {plugin.name} failed: {e}", fg="red")
+        return False
+    return True
+
+
+def _worker_main(spec, conn):
+    """Worker process loop, load the plugin once and handle alerts sent over `conn`."""
+    # Ctrl+C reaches the whole process group, let the parent decide when to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        plugin = load_plugin(spec)
+        plugin.setup()
+    except Exception as e:
+        conn.send(("error", f"could not load plugin {spec!r}: {e!r}"))
+        return
+    conn.send(("ready", None))
+    try:
+        while True:
+            try:
+                item = conn.recv()
+            except EOFError:
+                break
+            if item is None:
+                break
+            alert, file = item
+            try:
+                plugin(alert, file)
+                conn.send(("ok", None))
+            except Exception as e:
+                conn.send(("error", repr(e)))
+    finally:
+        plugin.teardown()
+
+
+class _Worker:
+    """A worker process and the parent end of its pipe."""
+
+    def __init__(self, spec, context, startup_timeout):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(spec, child_conn),
+                                       name="snews_pt-plugin-worker", daemon=True)
+        self.process.start()
+        child_conn.close()
+        if not self.conn.poll(startup_timeout):
+            self.kill()
+            self.conn.close()
+            raise RuntimeError(f"plugin worker did not start within {startup_timeout} s")
+        status, error = self.conn.recv()
+        if status != "ready":
+            self.process.join()
+            self.conn.close()
+            raise RuntimeError(error)
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def stop(self, timeout=5.0):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.kill()
+        self.conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+
+
+class PluginPool:
+    """Run a plugin in a pool of long-lived worker processes.
+
+    Every worker imports the plugin once and then receives alerts over a pipe.
+    Alerts are put on a bounded dispatch queue and :meth:`submit` never waits for a
+    plugin, so the subscriber keeps consuming while the plugins catch up. A worker
+    that exceeds the timeout is killed, a worker that crashes is restarted for the
+    next alert.
+
+    Parameters
+    ----------
+    spec : str
+        Plugin specification, see :func:`load_plugin`. Imported in every worker,
+        so objects must be picklable.
+    workers : int
+        Number of worker processes, i.e. alerts handled concurrently.
+    timeout : float, optional
+        Seconds a plugin may spend on a single alert, None for no limit.
+    max_pending : int
+        Size of the dispatch queue. Alerts arriving when it is full are dropped
+        (they are still saved by the subscriber) and counted in `stats`. Calling
+        the pool then raises :class:`queue.Full`.
+    startup_timeout : float
+        Seconds a worker may take to import and set up the plugin.
+
+    """
+
+    # the workers may run a legacy script that reads the saved file
+    needs_file = True
+
+    def __init__(self, spec, workers=2, timeout=None, max_pending=100, startup_timeout=60.0):
+        if workers < 1:
+            raise ValueError("A plugin pool needs at least one worker")
+        self.spec = spec
+        self.name = spec if isinstance(spec, str) else getattr(spec, "__name__", repr(spec))
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        # spawn, forking a process that runs dispatcher threads is not safe
+        self._context = multiprocessing.get_context("spawn")
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self.stats = {"submitted": 0, "done": 0, "failed": 0, "timeouts": 0,
+                      "crashes": 0, "dropped": 0}
+        self._closed = False
+
+        # start every worker up front so a broken plugin fails here, not on the first alert
+        self._workers = []
+        try:
+            for _ in range(workers):
+                self._workers.append(self._start_worker())
+        except BaseException:
+            for worker in self._workers:
+                worker.stop()
+            raise
+        self._threads = [
+            threading.Thread(target=self._dispatch, args=(i,), daemon=True,
+                             name=f"snews_pt-plugin-dispatch-{i}")
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __repr__(self):
+        return f"<PluginPool {self.name} workers={len(self._workers)}>"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _start_worker(self):
+        return _Worker(self.spec, self._context, self.startup_timeout)
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    @property
+    def pending(self):
+        """Number of alerts waiting for a worker."""
+        return self._queue.qsize()
+
+    def submit(self, alert, file=None, callback=None):
+        """Queue an alert for the plugin without waiting.
+
+        Parameters
+        ----------
+        alert : dict
+        file : str, optional
+            Where the alert was saved.
+        callback : callable, optional
+            Called from a dispatch thread with True once a worker handled the alert,
+            or with False if the plugin failed, timed out or crashed on it, or it was
+            discarded by ``close(wait=False)``. Not called for a dropped alert.
+
+        Returns
+        -------
+        bool
+            False if the dispatch queue was full and the alert was dropped.
+        """
+        if self._closed:
+            raise RuntimeError("The plugin pool is closed")
+        try:
+            self._queue.put_nowait((alert, file, callback))
+        except queue.Full:
+            self._count("dropped")
+            log.warning(f"plugin queue full, {self.name} skips alert {alert.get('_id')}")
+            return False
+        self._count("submitted")
+        return True
+
+    def __call__(self, alert, file=None, callback=None):
+        if not self.submit(alert, file, callback):
+            raise queue.Full(f"plugin queue of {self.name} is full, dropped alert {alert.get('_id')}")
+
+    def setup(self):
+        """The workers set the plugin up themselves, kept for the :class:`Plugin` interface."""
+
+    def teardown(self):
+        self.close()
+
+    def _dispatch(self, i):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                alert, file, callback = item
+                ok = self._handle(i, (alert, file))
+                self._notify(callback, ok, alert)
+            finally:
+                self._queue.task_done()
+
+    @staticmethod
+    def _notify(callback, ok, alert):
+        if callback is None:
+            return
+        try:
+            callback(ok)
+        except Exception:
+            log.exception(f"plugin pool callback failed on alert {alert.get('_id')}")
+
+    def _handle(self, i, item):
+        worker = self._workers[i]
+        if worker is None or not worker.is_alive():
+            try:
+                worker = self._workers[i] = self._start_worker()
+            except Exception as e:
+                self._workers[i] = None
+                self._count("failed")
+                log.error(f"could not restart plugin worker {i}: {e}")
+                return False
+
+        t0 = time.perf_counter()
+        try:
+            worker.conn.send(item)
+            if not worker.conn.poll(self.timeout):
+                self._count("timeouts")
+                log.error(f"plugin {self.name} timed out after {self.timeout} s "
+                          f"on alert {item[0].get('_id')}, restarting worker {i}")
+                worker.kill()
+                return False
+            status, error = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            self._count("crashes")
+            log.error(f"plugin worker {i} died on alert {item[0].get('_id')}: {e!r}")
+            worker.kill()
+            return False
+        finally:
+            if metrics.enabled:
+                metrics.ALERT_PLUGIN_SECONDS.observe(time.perf_counter() - t0)
+
+        if status == "ok":
+            self._count("done")
+            return True
+        self._count("failed")
+        log.error(f"plugin {self.name} failed on alert {item[0].get('_id')}: {error}")
+        return False
+
+    def join(self):
+        """Wait until every queued alert has been handled."""
+        self._queue.join()
+
+    def close(self, wait=True):
+        """Stop the workers, after the queued alerts are handled if `wait`."""
+        if self._closed:
+            return
+        self._closed = True
+        if not wait:
+            while True:
+                try:
+                    alert, _, callback = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                self._notify(callback, False, alert)
+                self._queue.task_done()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        for worker in self._workers:
+            if worker is not None:
+                worker.stop()
@@ -1,256 +1,632 @@
 """
 Easy handle remote commands
 
+A :class:`RemoteSession` keeps one authenticated producer per topic, and a
+consumer of the connection-testing topic, open across commands. The module
+level functions use a default session created on first use.
+
+    with RemoteSession(firedrill=True) as session:
+        session.test_connection()
+        session.reset_cache()
 
 Melih Kara, kara@kit.edu
 """
 
+import atexit
+import json
 import os
+import threading
 import time
-from datetime import UTC, datetime
+import uuid
+from concurrent.futures import Future, wait
+from datetime import UTC, datetime, timedelta
 
 import click
+import numpy as np
 from hop import Stream
 from hop.io import StartPosition
 from hop.models import JSONBlob
 from snews.models import messages
 
+from .core.checkpoint import parse_start
+from .core.connections import ConnectionPool
+from .core.logging import getLogger
 
-def test_connection(detector_name=None, firedrill=True, start_at="LATEST", patience=8):
-    """test the server connection
-    It should prompt your whether the
-    coincidence script is running in the server
+log = getLogger(__name__)
+
+CONNECTION_TEST_TOPIC = "kafka://kafka.scimma.org/snews.connection-testing"
+# how often the confirmation consumer checks its deadline
+POLL_INTERVAL = timedelta(seconds=0.25)
+# how far before sending test_connection(start_at="EARLIEST"), or starting the reply
+# listener, the confirmations are looked for
+LOOKBACK = timedelta(seconds=60)
+
+
+def _content(read):
+    """Content of a message as a dict, None if it is not JSON."""
+    content = read.content
+    if isinstance(content, (str, bytes)):
+        try:
+            content = json.loads(content)
+        except ValueError:
+            return None
+    return content
+
+
+def _reply_key(content):
+    """Identify a confirmation by the id and sent time of the message it confirms."""
+    if not isinstance(content, dict) or (content.get("meta") or {}).get("status") != "received":
+        return None
+    return content.get("id") or content.get("_id"), content.get("sent_time_utc")
+
+
+def wait_for(consumer, match, deadline, **read_kwargs):
+    """Read from `consumer` until `match` accepts a message or the deadline passes.
 
     Parameters
     ----------
-    start_at : str
-        Where hop starts looking for messages can either be  "LATEST" or "EARLIEST"
-    patience : int
-        Seconds to wait before the check
+    consumer : hop.io.Consumer
+        Consumer of a stream opened with ``until_eos=False``.
+    match : callable
+        Called with the content of every message, returns True for the one waited for.
+    deadline : float
+        `time.monotonic()` time to give up at.
 
     Returns
     -------
-        None
-
+    The matching message content, or None.
     """
-    detector_name = detector_name or os.getenv("DETECTOR_NAME")
-    if detector_name == "":
-        detector_name = "Test-Detector"
-    default_connection_topic = "kafka://kafka.scimma.org/snews.connection-testing"
-    connection_broker = os.getenv("CONNECTION_TEST_TOPIC", default_connection_topic)
-    stamp_time = datetime.now(UTC).isoformat()
-    message = {
-        "_id": "0_test-connection",
-        "detector_name": detector_name,
-        "sent_time_utc": stamp_time,
-        "status": "sending",
-        "meta": {},
-    }
+    timer = threading.Timer(max(deadline - time.monotonic(), 0), consumer.stop)
+    timer.daemon = True
+    timer.start()
+    try:
+        for read in consumer.read(batch_timeout=POLL_INTERVAL, **read_kwargs):
+            content = _content(read)
+            if content is not None and match(content):
+                return content
+            if time.monotonic() >= deadline:
+                break
+    finally:
+        timer.cancel()
+    return None
 
-    message = messages.DetectorMessageBase(
+
+def _connection_message(detector_name, probe=None):
+    """A test-connection message sent now, numbered with `probe` if given."""
+    meta = {"status": "sending"}
+    if probe is not None:
+        meta["probe"] = probe
+    return messages.DetectorMessageBase(
         id="0_test-connection",
         detector_name=detector_name,
         tier=messages.Tier.HEART_BEAT,
-        sent_time_utc=stamp_time,
-        meta={"status": "sending"},
+        sent_time_utc=datetime.now(UTC).isoformat(),
+        meta=meta,
     )
 
-    if firedrill:
-        topic = os.getenv("FIREDRILL_OBSERVATION_TOPIC")
-    else:
-        topic = os.getenv("OBSERVATION_TOPIC")
-
-    _start_at = StartPosition.LATEST if start_at == "LATEST" else StartPosition.EARLIEST
-    substream = Stream(until_eos=True, auth=True, start_at=_start_at)
-    pubstream = Stream(until_eos=True, auth=True)
-    click.secho(
-        f"\n> Testing your connection.\n> Sending to {topic}\n"
-        f"> Expecting from {connection_broker}. \n"
-        f"> Going to wait {patience} seconds before checking for confirmation...\n"
-    )
 
-    # start_time = datetime.utcnow()
-    confirmed = False
-    message_expected = message.model_copy()
-    message_expected.meta["status"] = "received"
-    message_expected = message_expected.model_dump()
-
-    with pubstream.open(topic, "w") as ps, substream.open(connection_broker, "r") as ss:
-        ps.write(JSONBlob(message.model_dump_json()))
-        # while (datetime.utcnow() - start_time) < timedelta(seconds=wait):
-        time.sleep(patience)
-        for read in ss:
-            read = read.content
-            if read == message_expected:
-                read_name = click.style(read["detector_name"], fg="green", bold=True)
-                read_time = click.style(read["sent_time_utc"], fg="green", bold=True)
-                click.echo(
-                    f"You ({read_name}) have a connection to the server at {read_time}"
-                )
-                confirmed = True
-                break
-            else:  # if there is no else: continue statement, it does not work
-                continue
-    if not confirmed:
-        click.secho(
-            f"\tWaited for {patience} sec and checked from {start_at},"
-            f" couldn't get a confirmation"
-            f"\n\tMaybe increase timeout and try again.",
-            fg="red",
-            bold=True,
-        )
-        return False
-    return True
+class RemoteSession:
+    """Send remote commands over connections kept open between them.
 
-
-def write_hb_logs(detector_name=None, admin_pass=None, firedrill=True):
-    """Ask server to print the heartbeat logs on the server as standard output
-    later admins can see them remotely. Requires admin password
+    Every command message carries a random ``meta["correlation_id"]``. Replies
+    of the server on the connection-testing topic echo it, and a background
+    listener hands them to the :class:`concurrent.futures.Future` returned by
+    :meth:`request`, so many commands can be in flight at once.
 
     Parameters
     ----------
-    detector_name : str
-        Name of the detector requesting the write operation
-    admin_pass : str
-        Simple password as a string
+    detector_name : str, optional
+        Default detector name of the commands, defaults to $DETECTOR_NAME.
+    admin_pass : str, optional
+        Default password of the commands requiring authorization, defaults to $ADMIN_PASS.
     firedrill : bool
-        Whether to use the firedrill broker
-
-    """
-    passw = admin_pass or os.getenv("ADMIN_PASS", "NO_AUTH")
-    detector_name = detector_name or os.getenv("DETECTOR_NAME")
-    message = {
-        "_id": "0_display-heartbeats",
-        "pass": passw,
-        "detector_name": detector_name,
-        "meta": {},
-    }
-    topic = (
-        os.getenv("FIREDRILL_OBSERVATION_TOPIC")
-        if firedrill
-        else os.getenv("OBSERVATION_TOPIC")
-    )
-    pubstream = Stream(until_eos=True, auth=True)
-
-    with pubstream.open(topic, "w") as ps:
-        ps.write(message)
-    logslink = "> https://www.physics.purdue.edu/snews/logs/"
-    click.secho(
-        f"> Requested logs. If you have rights, go to remote Purdue server logs\n{logslink}\n",
-        fg="blue",
-        bold=True,
-    )
-
-
-def reset_cache(detector_name=None, admin_pass=None, firedrill=True, is_test=True):
-    """If authorized, drop the current cache at the server
-
-    Parameters
+        Default for whether to use the firedrill broker.
+    auth : bool or hop.auth.Auth
+        Authentication passed to :class:`hop.Stream`.
+    pool : snews_pt.core.connections.ConnectionPool, optional
+        Share producers, e.g. with a :class:`snews_pt.messages.Publisher` sending
+        to the same topic. If not given, the session owns its own pool.
+    replies : bool
+        Also wait for replies to the admin commands (``reset_cache``...), which
+        then return futures. The server has to echo their correlation id.
+    reply_timeout : float
+        Seconds after which an unanswered request fails with :class:`TimeoutError`.
+
+    Attributes
     ----------
-    detector_name : str
-        Name of the detector
-    admin_pass : str
-        Simple password as a string
-    firedrill : bool
-        Whether to use the firedrill broker
+    last_rtt : float or None
+        Round-trip time in seconds of the last :meth:`test_connection`, None if it
+        got no confirmation.
 
     """
-    passw = admin_pass or os.getenv("ADMIN_PASS", "NO_AUTH")
-    detector_name = detector_name or os.getenv("DETECTOR_NAME")
-    message = {
-        "_id": "0_hard-reset",
-        "pass": passw,
-        "detector_name": detector_name,
-        "is_test": is_test,
-        "meta": {},
-    }
 
-    topic = (
-        os.getenv("FIREDRILL_OBSERVATION_TOPIC")
-        if firedrill
-        else os.getenv("OBSERVATION_TOPIC")
-    )
-    pubstream = Stream(until_eos=True, auth=True)
+    def __init__(self, detector_name=None, admin_pass=None, firedrill=True, auth=True,
+                 pool=None, replies=False, reply_timeout=60.0):
+        self.detector_name = detector_name
+        self.admin_pass = admin_pass
+        self.firedrill = firedrill
+        self.auth = auth
+        self.replies = replies
+        self.reply_timeout = reply_timeout
+        self.last_rtt = None
+        self._owns_pool = pool is None
+        self.pool = pool or ConnectionPool(auth=auth)
+        self._consumer = None
+        self._consumer_lock = threading.Lock()
+        self._listener = None
+        self._pending = {}  # correlation id: (future, expiry)
+        # reentrant, done callbacks of the futures forget them while it is held
+        self._pending_lock = threading.RLock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Stop listening, fail pending requests and close the connections.
+
+        The producers are left open if the pool is shared.
+        """
+        with self._consumer_lock:
+            consumer, listener = self._consumer, self._listener
+            self._consumer = self._listener = None
+        if consumer is not None:
+            consumer.stop()
+            if listener is not None:
+                listener.join()
+            consumer.close()
+        self._fail_pending(ConnectionError("The remote session was closed"))
+        if self._owns_pool:
+            self.pool.close()
+
+    def _detector_name(self, detector_name=None):
+        return detector_name or self.detector_name or os.getenv("DETECTOR_NAME")
+
+    def _admin_pass(self, admin_pass=None):
+        return admin_pass or self.admin_pass or os.getenv("ADMIN_PASS", "NO_AUTH")
+
+    def topic(self, firedrill=None):
+        """The observation topic commands are sent to."""
+        firedrill = self.firedrill if firedrill is None else firedrill
+        if firedrill:
+            return os.getenv("FIREDRILL_OBSERVATION_TOPIC")
+        return os.getenv("OBSERVATION_TOPIC")
+
+    def send(self, message, firedrill=None):
+        """Write `message` to the observation topic with the pooled producer, without
+        waiting for a reply."""
+        if hasattr(message, "model_dump_json"):
+            message = JSONBlob(message.model_dump_json())
+        topic = self.topic(firedrill)
+        try:
+            self.pool.get(topic).write(message)
+        except Exception:
+            # reconnect on the next command
+            self.pool.invalidate(topic)
+            raise
+
+    def request(self, message, firedrill=None):
+        """Send `message` and return a future of the server reply.
+
+        Parameters
+        ----------
+        message : dict or snews.models.messages.DetectorMessageBase
+            Command message, its ``meta["correlation_id"]`` is set.
+        firedrill : bool, optional
+            Whether to use the firedrill broker, defaults to the session setting.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Resolves to the reply content. Use ``future.result(timeout=...)``, or
+            ``await asyncio.wrap_future(future)`` in a coroutine.
+        """
+        meta = message.meta if hasattr(message, "meta") else message.setdefault("meta", {})
+        correlation_id = meta["correlation_id"] = uuid.uuid4().hex
+        future = Future()
+        future.correlation_id = correlation_id
+        now = time.monotonic()
+        with self._pending_lock:
+            self._expire(now)
+            self._pending[correlation_id] = (future, now + self.reply_timeout)
+        # forget requests the caller gave up on
+        future.add_done_callback(lambda f: self._forget(correlation_id))
+        try:
+            # the listener has to be reading before the reply can arrive
+            self._listen()
+            self.send(message, firedrill)
+        except Exception as e:
+            self._forget(correlation_id)
+            if future.set_running_or_notify_cancel():
+                future.set_exception(e)
+        return future
+
+    def _forget(self, correlation_id):
+        with self._pending_lock:
+            self._pending.pop(correlation_id, None)
+
+    def _expire(self, now):
+        for correlation_id, (future, expiry) in list(self._pending.items()):
+            if expiry < now:
+                del self._pending[correlation_id]
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(TimeoutError(f"no reply to request {correlation_id}"))
+
+    def _fail_pending(self, error):
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        for future, _ in pending.values():
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+    def _listen(self):
+        """Start the reply listener unless it is running."""
+        with self._consumer_lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            if self._consumer is None:
+                topic = os.getenv("CONNECTION_TEST_TOPIC", CONNECTION_TEST_TOPIC)
+                log.debug(f"listening for replies on {topic}")
+                stream = Stream(until_eos=False, auth=self.auth, start_at=StartPosition.LATEST)
+                self._consumer = stream.open(topic, "r")
+            # by time rather than LATEST, which is only looked up on the first fetch and
+            # could skip a reply arriving before it; unknown correlation ids are ignored
+            since = datetime.now(UTC) - LOOKBACK
+            self._listener = threading.Thread(target=self._receive, args=(self._consumer, since),
+                                              name="snews_pt-remote-replies", daemon=True)
+            self._listener.start()
+
+    def _receive(self, consumer, since):
+        try:
+            for read in consumer.read(batch_timeout=POLL_INTERVAL, start_at=since):
+                content = _content(read)
+                if not isinstance(content, dict):
+                    continue
+                correlation_id = (content.get("meta") or {}).get("correlation_id")
+                with self._pending_lock:
+                    self._expire(time.monotonic())
+                    future, _ = self._pending.pop(correlation_id, (None, None))
+                if future is not None and future.set_running_or_notify_cancel():
+                    future.set_result(content)
+        except Exception as e:
+            log.error(f"reply listener failed: {e}")
+            self._fail_pending(e)
+
+    def test_connection(self, detector_name=None, firedrill=None, start_at="LATEST", patience=8):
+        """test the server connection
+        It should prompt your whether the
+        coincidence script is running in the server
+
+        The reply listener is started before the test message is sent, and the
+        function returns as soon as the confirmation arrives.
+
+        Parameters
+        ----------
+        start_at : str or datetime
+            Where hop starts looking for the confirmation, "LATEST", a time (ISO
+            string or datetime) or "EARLIEST", `LOOKBACK` before sending
+        patience : float
+            Seconds to wait at most for the confirmation
+
+        Returns
+        -------
+        bool
+            Whether the confirmation arrived in time. Its round-trip time is kept
+            in `last_rtt`.
+
+        """
+        detector_name = self._detector_name(detector_name) or "Test-Detector"
+        topic = self.topic(firedrill)
+        connection_broker = os.getenv("CONNECTION_TEST_TOPIC", CONNECTION_TEST_TOPIC)
+        message = _connection_message(detector_name)
+        click.secho(
+            f"\n> Testing your connection.\n> Sending to {topic}\n"
+            f"> Expecting from {connection_broker}. \n"
+            f"> Going to wait up to {patience} seconds for the confirmation...\n"
+        )
 
-    with pubstream.open(topic, "w") as ps:
-        ps.write(message)
+        sent = time.perf_counter()
+        if isinstance(start_at, str) and start_at.upper() == "LATEST":
+            future = self.request(message, firedrill)
+            try:
+                read = future.result(timeout=patience)
+            except TimeoutError:
+                future.cancel()
+                read = None
+        else:
+            # the broker looks up the offsets from a time, instead of reading the whole topic
+            if isinstance(start_at, str) and start_at.upper() == "EARLIEST":
+                since = datetime.now(UTC) - LOOKBACK
+            else:
+                since = parse_start(start_at)
+                if not isinstance(since, datetime):
+                    raise ValueError(f"start_at must be LATEST, EARLIEST or a time, got {start_at!r}")
+            expected = (message.id, message.sent_time_utc)
+            substream = Stream(until_eos=False, auth=self.auth)
+            with substream.open(connection_broker, "r") as ss:
+                self.send(message, firedrill)
+                read = wait_for(ss, lambda content: _reply_key(content) == expected,
+                                time.monotonic() + patience, start_at=since)
+        rtt = time.perf_counter() - sent
+        self.last_rtt = None if read is None else rtt
+
+        if read is None:
+            click.secho(
+                f"\tWaited for {patience} sec and checked from {start_at},"
+                f" couldn't get a confirmation"
+                f"\n\tMaybe increase timeout and try again.",
+                fg="red",
+                bold=True,
+            )
+            return False
+        read_name = click.style(read["detector_name"], fg="green", bold=True)
+        read_time = click.style(read["sent_time_utc"], fg="green", bold=True)
+        click.echo(
+            f"You ({read_name}) have a connection to the server at {read_time}"
+            f" (round trip {rtt * 1000:.0f} ms)"
+        )
+        return True
+
+    def probe(self, count=10, rate=1.0, detector_name=None, firedrill=None, patience=8):
+        """Measure the round trip to the server with repeated connection tests
+
+        `count` test-connection requests are sent at `rate` per second over the
+        session producer, and the reply listener matches the confirmations to
+        them by their correlation id.
+
+        Parameters
+        ----------
+        count : int
+            Number of probes
+        rate : float
+            Probes per second
+        detector_name : str
+            Name of the detector sending them
+        firedrill : bool
+            Whether to use the firedrill broker
+        patience : float
+            Seconds to wait for confirmations after the last probe
+
+        Returns
+        -------
+        list of dict
+            Per probe its number, `sent_time_utc` and round-trip time `rtt_s`
+            in seconds, None if no confirmation arrived.
+
+        """
+        detector_name = self._detector_name(detector_name) or "Test-Detector"
+        rows, futures = [], []
+
+        def confirmed(row, sent):
+            def done(future):
+                if not future.cancelled() and future.exception() is None:
+                    row["rtt_s"] = time.perf_counter() - sent
+            return done
+
+        start = time.perf_counter()
+        for i in range(count):
+            # keep to the schedule even if a send was slow
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            message = _connection_message(detector_name, probe=i)
+            row = {"probe": i, "sent_time_utc": message.sent_time_utc, "rtt_s": None}
+            rows.append(row)
+            sent = time.perf_counter()
+            future = self.request(message, firedrill)
+            future.add_done_callback(confirmed(row, sent))
+            futures.append(future)
+        wait(futures, timeout=patience)
+        for future in futures:
+            future.cancel()
+        return rows
+
+    def _command(self, message, firedrill):
+        """Send an admin command, returning the future of its reply with `replies`."""
+        if self.replies:
+            return self.request(message, firedrill)
+        self.send(message, firedrill)
+        return None
+
+    def write_hb_logs(self, detector_name=None, admin_pass=None, firedrill=None):
+        """Ask server to print the heartbeat logs on the server as standard output
+        later admins can see them remotely. Requires admin password
+
+        Parameters
+        ----------
+        detector_name : str
+            Name of the detector requesting the write operation
+        admin_pass : str
+            Simple password as a string
+        firedrill : bool
+            Whether to use the firedrill broker
+
+        Returns
+        -------
+        concurrent.futures.Future or None
+            Future of the server reply if the session waits for `replies`.
+
+        """
+        message = {
+            "_id": "0_display-heartbeats",
+            "pass": self._admin_pass(admin_pass),
+            "detector_name": self._detector_name(detector_name),
+            "meta": {},
+        }
+        reply = self._command(message, firedrill)
+        logslink = "> https://www.physics.purdue.edu/snews/logs/"
+        click.secho(
+            f"> Requested logs. If you have rights, go to remote Purdue server logs\n{logslink}\n",
+            fg="blue",
+            bold=True,
+        )
+        return reply
+
+    def reset_cache(self, detector_name=None, admin_pass=None, firedrill=None, is_test=True):
+        """If authorized, drop the current cache at the server
+
+        Parameters
+        ----------
+        detector_name : str
+            Name of the detector
+        admin_pass : str
+            Simple password as a string
+        firedrill : bool
+            Whether to use the firedrill broker
+
+        Returns
+        -------
+        concurrent.futures.Future or None
+            Future of the server reply if the session waits for `replies`.
+
+        """
+        message = {
+            "_id": "0_hard-reset",
+            "pass": self._admin_pass(admin_pass),
+            "detector_name": self._detector_name(detector_name),
+            "is_test": is_test,
+            "meta": {},
+        }
+        reply = self._command(message, firedrill)
         click.secho(
             "> Requesting to Reset the cache. If you have rights, cache will be reset",
             fg="blue",
             bold=True,
         )
-
-
-def change_broker(brokername, detector_name=None, admin_pass=None, firedrill=True):
-    """If authorized, server changes the broker
-    === Not implemented yet ===
-    brokername : str
-        name of the broker to replace
-    detector_name : str
-        Name of the detector
-    admin_pass : str
-        Simple password as a string
-    firedrill : bool
-        Whether to use the firedrill broker
-
-    """
-    passw = admin_pass or os.getenv("ADMIN_PASS", "NO_AUTH")
-    detector_name = detector_name or os.getenv("DETECTOR_NAME")
-    message = {
-        "_id": "0_broker-change",
-        "pass": passw,
-        "detector_name": detector_name,
-        "new_broker": brokername,
-        "meta": {},
-    }
-
-    current_topic = (
-        os.getenv("FIREDRILL_OBSERVATION_TOPIC")
-        if firedrill
-        else os.getenv("OBSERVATION_TOPIC")
-    )
-    pubstream = Stream(until_eos=True, auth=True)
-
-    with pubstream.open(current_topic, "w") as ps:
-        ps.write(message)
+        return reply
+
+    def change_broker(self, brokername, detector_name=None, admin_pass=None, firedrill=None):
+        """If authorized, server changes the broker
+        === Not implemented yet ===
+        brokername : str
+            name of the broker to replace
+        detector_name : str
+            Name of the detector
+        admin_pass : str
+            Simple password as a string
+        firedrill : bool
+            Whether to use the firedrill broker
+
+        Returns
+        -------
+        concurrent.futures.Future or None
+            Future of the server reply if the session waits for `replies`.
+
+        """
+        message = {
+            "_id": "0_broker-change",
+            "pass": self._admin_pass(admin_pass),
+            "detector_name": self._detector_name(detector_name),
+            "new_broker": brokername,
+            "meta": {},
+        }
+        reply = self._command(message, firedrill)
         click.secho(
             "> Requesting to change the broker. If you have rights, broker will be changed",
             fg="blue",
             bold=True,
         )
+        return reply
+
+    def get_feedback(self, detector_name=None, email_address=None, firedrill=None):
+        """Get heartbeat feedback by email
+        For a given detector, if your email is registered
+        We are going to send that email address(es) an email with feedback from last 24hours.
+        multiple email addresses are allowed with a semicolon delimiter (;)
+
+        Parameters
+        ----------
+        detector_name : str
+            Name of your detector
+        email_address : str or list
+            Registered e-mail adress(es)
+        firedrill : bool
+            Whether to use firedrill broker or not
+
+        Returns
+        -------
+        concurrent.futures.Future or None
+            Future of the server reply if the session waits for `replies`.
+
+        """
+        detector_name = self._detector_name(detector_name)
+        email_address = email_address or input("\t> Your registered email address: ")
+        message = {
+            "_id": "0_Get-Feedback",
+            "email": email_address,
+            "detector_name": detector_name,
+            "meta": {},
+        }
+        reply = self._command(message, firedrill)
+        click.secho("Heartbeat Feedback is requested! Expect an email from us!")
+        return reply
+
+
+_default_session = None
+_default_lock = threading.Lock()
+
+
+def default_session():
+    """The :class:`RemoteSession` of the module level functions, created on first use."""
+    global _default_session
+    with _default_lock:
+        if _default_session is None:
+            _default_session = RemoteSession()
+        return _default_session
+
+
+@atexit.register
+def close_default_session():
+    """Close the default session, the next command opens a new one."""
+    global _default_session
+    with _default_lock:
+        session, _default_session = _default_session, None
+    if session is not None:
+        session.close()
 
 
-def get_feedback(detector_name=None, email_address=None, firedrill=True):
-    """Get heartbeat feedback by email
-    For a given detector, if your email is registered
-    We are going to send that email address(es) an email with feedback from last 24hours.
-    multiple email addresses are allowed with a semicolon delimiter (;)
+def test_connection(detector_name=None, firedrill=True, start_at="LATEST", patience=8):
+    """test the server connection, see :meth:`RemoteSession.test_connection`"""
+    return default_session().test_connection(detector_name, firedrill, start_at, patience)
 
-    Parameters
-    ----------
-    detector_name : str
-        Name of your detector
-    email_address : str or list
-        Registered e-mail adress(es)
-    firedrill : bool
-        Whether to use firedrill broker or not
 
-    """
-    detector_name = detector_name or os.getenv("DETECTOR_NAME")
-    email_address = email_address or input("\t> Your registered email address: ")
-    message = {
-        "_id": "0_Get-Feedback",
-        "email": email_address,
-        "detector_name": detector_name,
-        "meta": {},
+def probe(count=10, rate=1.0, detector_name=None, firedrill=True, patience=8):
+    """Measure the round trip to the server, see :meth:`RemoteSession.probe`"""
+    return default_session().probe(count, rate, detector_name, firedrill, patience)
+
+
+def probe_stats(rows):
+    """Loss rate and min/p50/p90/p99/max round-trip time in ms of :func:`probe` results."""
+    rtts = np.array([row["rtt_s"] for row in rows if row["rtt_s"] is not None]) * 1000
+    stats = {
+        "sent": len(rows),
+        "received": int(rtts.size),
+        "loss": 1 - rtts.size / len(rows) if rows else 0.0,
     }
-    topic = (
-        os.getenv("FIREDRILL_OBSERVATION_TOPIC")
-        if firedrill
-        else os.getenv("OBSERVATION_TOPIC")
-    )
-    pubstream = Stream(until_eos=True, auth=True)
-    with pubstream.open(topic, "w") as ps:
-        ps.write(message)
+    if rtts.size:
+        p50, p90, p99 = np.percentile(rtts, [50, 90, 99])
+        stats.update(min_ms=float(rtts.min()), p50_ms=float(p50), p90_ms=float(p90),
+                     p99_ms=float(p99), max_ms=float(rtts.max()))
+    return stats
+
+
+def write_hb_logs(detector_name=None, admin_pass=None, firedrill=True):
+    """Ask server to print the heartbeat logs, see :meth:`RemoteSession.write_hb_logs`"""
+    return default_session().write_hb_logs(detector_name, admin_pass, firedrill)
 
-    click.secho("Heartbeat Feedback is requested! Expect an email from us!")
+
+def reset_cache(detector_name=None, admin_pass=None, firedrill=True, is_test=True):
+    """If authorized, drop the current cache at the server, see :meth:`RemoteSession.reset_cache`"""
+    return default_session().reset_cache(detector_name, admin_pass, firedrill, is_test)
+
+
+def change_broker(brokername, detector_name=None, admin_pass=None, firedrill=True):
+    """If authorized, server changes the broker, see :meth:`RemoteSession.change_broker`"""
+    return default_session().change_broker(brokername, detector_name, admin_pass, firedrill)
+
+
+def get_feedback(detector_name=None, email_address=None, firedrill=True):
+    """Get heartbeat feedback by email, see :meth:`RemoteSession.get_feedback`"""
+    return default_session().get_feedback(detector_name, email_address, firedrill)
@@ -0,0 +1,99 @@
+"""
+Wire formats used by the Publisher
+
+Each serializer turns a snews message into bytes and wraps those bytes in the
+hop model that announces the right format to consumers.
+
+- ``pickle``: python pickle of the message object (default, requires the same model classes to read)
+- ``json``: compact JSON from ``model_dump_json``, delivered to hop consumers as a JSONBlob
+- ``msgpack``: MessagePack of the JSON-compatible dump, sent as a binary Blob (needs `msgpack`)
+"""
+
+import pickle
+
+from hop.models import Blob, JSONBlob
+
+
+class _EncodedJSONBlob(JSONBlob):
+    """JSONBlob whose content is already encoded, so it is not dumped a second time."""
+
+    def serialize(self):
+        return {"format": "json", "content": self.content}
+
+
+class Serializer:
+    """Base class of the wire serializers."""
+
+    name = None
+
+    def encode(self, message) -> bytes:
+        """Encode a snews message into bytes."""
+        raise NotImplementedError
+
+    def wrap(self, payload: bytes):
+        """Wrap encoded bytes into a hop message model."""
+        return Blob(payload)
+
+    def serialize(self, message):
+        """Encode and wrap `message`, ready for ``Producer.write``."""
+        return self.wrap(self.encode(message))
+
+
+class PickleSerializer(Serializer):
+    name = "pickle"
+
+    def encode(self, message) -> bytes:
+        return pickle.dumps(message)
+
+
+class JSONSerializer(Serializer):
+    name = "json"
+
+    def encode(self, message) -> bytes:
+        return message.model_dump_json().encode("utf-8")
+
+    def wrap(self, payload: bytes):
+        return _EncodedJSONBlob(payload)
+
+
+class MsgpackSerializer(Serializer):
+    name = "msgpack"
+
+    def __init__(self):
+        try:
+            import msgpack
+        except ImportError as e:
+            raise ImportError(
+                "The msgpack serializer requires the `msgpack` package, "
+                "install it with `pip install msgpack`"
+            ) from e
+        self._packb = msgpack.packb
+
+    def encode(self, message) -> bytes:
+        return self._packb(message.model_dump(mode="json"))
+
+
+SERIALIZERS = {
+    "pickle": PickleSerializer,
+    "json": JSONSerializer,
+    "msgpack": MsgpackSerializer,
+}
+
+
+def get_serializer(serializer="pickle"):
+    """Return a serializer instance from its name, or `serializer` itself if it already is one.
+
+    Parameters
+    ----------
+    serializer : str or Serializer
+        One of the keys of `SERIALIZERS`, or a Serializer instance
+
+    """
+    if isinstance(serializer, Serializer):
+        return serializer
+    try:
+        return SERIALIZERS[serializer]()
+    except KeyError:
+        raise ValueError(
+            f"Unknown serializer {serializer!r}, choose from {list(SERIALIZERS)}"
+        ) from None
@@ -2,9 +2,8 @@
 Utility tools for snews_pt
 """
 
-import json
+import glob
 import os
-from collections import namedtuple
 
 import click
 import dotenv
@@ -34,9 +33,42 @@ def set_env(env_path=None):
     load_dotenv(env)
 
 
+def collect_json_files(paths):
+    """Expand files, directories and glob patterns into a list of json files.
+
+    Directories contribute the ``*.json`` files they contain, patterns are
+    expanded with :func:`glob.glob`. The order of `paths` is preserved and
+    duplicates are dropped.
+
+    Parameters
+    ----------
+    paths : iterable of str
+        File names, directories or glob patterns
+
+    Returns
+    -------
+    list of str
+
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.json"))))
+        elif glob.has_magic(path):
+            files.extend(f for f in sorted(glob.glob(path)) if f.endswith(".json"))
+        elif path.endswith(".json"):
+            files.append(path)
+        else:
+            raise TypeError(f"Expected json file with .json format! Got {path}")
+    return list(dict.fromkeys(files))
+
+
 def retrieve_detectors(detectors_path=default_detector_file):
     """Retrieve the name-ID-location of the participating detectors.
 
+    The detectors are cached, see :class:`snews_pt.core.detectors.DetectorRegistry`
+    for lookups by id or alias and their coordinates.
+
     Parameters
     ----------
     detectors_path : str, optional
@@ -44,20 +76,13 @@ def retrieve_detectors(detectors_path=default_detector_file):
 
     Returns
     -------
-    None
+    dict
+        Detector namedtuples (name, id, location) by name
 
     """
-    if not os.path.isfile(detectors_path):
-        os.system(f"python {os.path.dirname(__file__)}/auxiliary/make_detector_file.py")
-
-    with open(detectors_path) as json_file:
-        detectors = json.load(json_file)
+    from .core.detectors import registry
 
-    # make a namedtuple
-    Detector = namedtuple("Detector", ["name", "id", "location"])
-    for k, v in detectors.items():
-        detectors[k] = Detector(v[0], v[1], v[2])
-    return detectors
+    return registry(detectors_path).as_dict()
 
 
 def isnotebook():
@@ -98,7 +123,9 @@ def set_name(detector_name="TEST", _return=False):
 
     envpath = os.path.join(os.path.dirname(__file__), "auxiliary/test-config.env")
     load_dotenv(envpath)
-    detectors = list(retrieve_detectors().keys())
+    from .core.detectors import registry
+
+    detectors = list(registry().names)
     if detector_name == "TEST":
         if int(os.getenv("HAS_NAME_CHANGED")) == 0:
             for i, d in enumerate(detectors):
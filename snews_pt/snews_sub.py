@@ -1,25 +1,67 @@
 import click
 import json
 import os
+import queue
+import threading
 from datetime import datetime
 
 from hop import Stream
 
 from . import snews_pt_utils
+from .core import metrics
+from .core.alert_store import AlertStore
+from .core.alert_writer import AlertWriter
+from .core.checkpoint import Checkpoint, parse_start, position
+from .core.dedup import DedupCache
+from .core.logging import getLogger
+from .pipeline import Alert, Callback, Dedup, Filter, Pipeline, PluginSink, Render, Store
+from .plugins import PluginPool, load_plugin
+
+log = getLogger(__name__)
+
+
+# next free index per (folder, date), so that naming a file does not probe every earlier one
+_next_index = {}
+_next_index_lock = threading.Lock()
+
+
+def _scan_next_index(outputfolder, date):
+    """Index following the highest existing `<i>-SNEWS_ALERT_<date>.json` in a folder"""
+    suffix = f"-SNEWS_ALERT_{date}.json"
+    highest = -1
+    with os.scandir(outputfolder) as entries:
+        for entry in entries:
+            prefix = entry.name[:-len(suffix)]
+            if entry.name.endswith(suffix) and prefix.isdigit():
+                highest = max(highest, int(prefix))
+    return highest + 1
 
 
 def make_file(outputfolder):
     """Get a proper json file name at a given folder
     It applies an increment to the file name at a given folder to avoid overwrite
 
+    The folder is scanned once per day and process, afterwards the next index is
+    taken from a cache. The file is created atomically (O_EXCL), so subscribers
+    sharing a folder never get the same name.
+
     """
     os.makedirs(outputfolder, exist_ok=True)
     date = datetime.utcnow().isoformat().split("T")[0]
-    file = os.path.join(outputfolder, f"0-SNEWS_ALERT_{date}.json")
-    while os.path.isfile(file):
-        i = int(file.split("/")[-1].split("-")[0])
-        file = os.path.join(outputfolder, f"{i + 1}-SNEWS_ALERT_{date}.json")
-    return file
+    key = (os.path.abspath(outputfolder), date)
+    with _next_index_lock:
+        i = _next_index.get(key)
+        if i is None:
+            i = _scan_next_index(outputfolder, date)
+        while True:
+            file = os.path.join(outputfolder, f"{i}-SNEWS_ALERT_{date}.json")
+            try:
+                os.close(os.open(file, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+            except FileExistsError:
+                i += 1
+                continue
+            _next_index[key] = i + 1
+            return file
 
 
 def save_message(message, outputfolder, return_file=False):
@@ -73,6 +115,19 @@ def display(message):
     click.secho("_".center(65, "_"), bg="bright_red")
 
 
+def open_plugin(plugin, workers=0, timeout=None):
+    """Load and set up a plugin, in a :class:`PluginPool` if `workers` is not 0"""
+    if plugin is None:
+        return None
+    if workers:
+        plugin = PluginPool(plugin, workers=workers, timeout=timeout)
+    else:
+        plugin = load_plugin(plugin)
+    log.info(f"redirecting alerts to plugin {plugin.name}")
+    plugin.setup()
+    return plugin
+
+
 class Subscriber:
     """Class to subscribe ALERT message stream
 
@@ -82,10 +137,35 @@ class Subscriber:
         path for the environment file. Use default settings if not given
     firedrill_mode : bool
         tell Subscriber to get messages from the firedrill hop broker, defaults to False
+    storage : str
+        "json" saves every alert to its own json file, "sqlite" adds them to an
+        indexed :class:`snews_pt.core.alert_store.AlertStore` database
+    database : str, optional
+        Path of the sqlite database, defaults to `DATABASE_NAME` in the output folder
+    write_behind : bool
+        Write json files from a background :class:`snews_pt.core.alert_writer.AlertWriter`
+        instead of on the consumer thread. A saved file may then still be queued when
+        :meth:`save` returns, see :meth:`wait_for_file`
+    fsync_window : float
+        Seconds within which the write-behind writer groups its fsyncs
+    checkpoint : str, optional
+        File to keep the offsets of processed alerts in, see
+        :class:`snews_pt.core.checkpoint.Checkpoint`. Needed to resume with
+        ``start_at="checkpoint"``
+    dedup : bool, str or DedupCache
+        Skip alerts that were already processed. True remembers them in memory,
+        a path also keeps them in that index file across restarts, see
+        :class:`snews_pt.core.dedup.DedupCache`. A cache created here is closed
+        with the subscriber
 
     """
 
-    def __init__(self, env_path=None, firedrill_mode=True):
+    DATABASE_NAME = "snews_alerts.sqlite"
+
+    def __init__(self, env_path=None, firedrill_mode=True, storage="json", database=None,
+                 write_behind=False, fsync_window=0.05, checkpoint=None, dedup=False):
+        if storage not in ("json", "sqlite"):
+            raise ValueError(f"Unknown storage {storage!r}, choose 'json' or 'sqlite'")
         snews_pt_utils.set_env(env_path)
         self.alert_topic = os.getenv("ALERT_TOPIC")
         self.connection_test_topic = os.getenv("CONNECTION_TEST_TOPIC")
@@ -94,8 +174,79 @@ class Subscriber:
 
         self.snews_time = datetime.utcnow().isoformat()
         self.default_output = os.path.join(os.getcwd(), os.getenv("ALERT_OUTPUT"))
+        self.storage = storage
+        self.database = database
+        self.write_behind = write_behind
+        self.fsync_window = fsync_window
+        self.checkpoint = Checkpoint(checkpoint) if checkpoint else None
+        self._owns_dedup = dedup is True or isinstance(dedup, str)
+        if dedup is True:
+            dedup = DedupCache()
+        elif isinstance(dedup, str):
+            dedup = DedupCache(path=dedup)
+        self.dedup = dedup if isinstance(dedup, DedupCache) else None
+        self._store = None
+        self._writer = None
+
+    def open_store(self, outputfolder=None):
+        """Open the sqlite alert database, if that is the storage in use"""
+        if self.storage == "sqlite" and self._store is None:
+            path = self.database
+            if path is None:
+                outputfolder = outputfolder or self.default_output
+                os.makedirs(outputfolder, exist_ok=True)
+                path = os.path.join(outputfolder, self.DATABASE_NAME)
+            self._store = AlertStore(path)
+        return self._store
+
+    def close(self):
+        """Close the alert database and write out all queued alert files"""
+        if self.dedup is not None and (self.dedup.hits or self.dedup.misses):
+            log.info(f"duplicate alerts: {self.dedup.stats}")
+        if self._owns_dedup:
+            self.dedup.close()
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def wait_for_file(self, file):
+        """Block until a file returned by :meth:`save` can be read
 
-    def subscribe(self, outputfolder=None, auth=True, is_test=False):
+        Returns
+        -------
+        bool
+            False if the write-behind writer could not write it
+        """
+        if self._writer is not None and file is not None:
+            return self._writer.wait(file)
+        return True
+
+    def save(self, message, outputfolder, need_file=False):
+        """Save an alert to the configured storage
+
+        Returns
+        -------
+        str or None
+            The json file, if one was written. With sqlite storage a file is only
+            written if `need_file`. With `write_behind` the file may still be
+            queued, see :meth:`wait_for_file`.
+        """
+        if self.storage == "sqlite":
+            self.open_store(outputfolder).add(message)
+            if not need_file:
+                return None
+        if not self.write_behind:
+            return save_message(message, outputfolder, return_file=True)
+        if self._writer is None:
+            self._writer = AlertWriter(fsync_window=self.fsync_window)
+        return self._writer.write(make_file(outputfolder), message)
+
+    def subscribe(self, outputfolder=None, auth=True, is_test=False, plugin=None,
+                  plugin_workers=0, plugin_timeout=None, start_at=None, filters=None,
+                  display=True, sink_queue_size=0):
         """Subscribe and listen to a given topic
 
         Parameters
@@ -106,10 +257,32 @@ class Subscriber:
             loading from :meth:`auth.load_auth <hop.auth.load_auth>` if set to
             True. To disable authentication, set to False.
         is_test: bool if True overwrites the subscribed topic with CONNECTION_TEST_TOPIC
+        plugin: str or plugin object, optional
+            Passed to :func:`snews_pt.plugins.load_plugin`. The plugin is loaded and set up
+            once, then every alert is handed to it after being saved and displayed.
+        plugin_workers: int
+            If 0, the plugin runs in this process and the next alert waits for it.
+            Otherwise it runs in a :class:`snews_pt.plugins.PluginPool` of that many workers.
+        plugin_timeout: float, optional
+            Seconds a pooled plugin may spend on one alert before its worker is killed.
+        start_at: str or datetime, optional
+            "earliest", "latest", "checkpoint" or a time (see
+            :func:`snews_pt.core.checkpoint.parse_start`), None for the stream default.
+            With a checkpoint file, every alert is committed once it is saved and
+            the plugin succeeded, in a pool once a worker handled it.
+        filters: dict, optional
+            Only handle matching alerts, keyword arguments of :class:`snews_pt.pipeline.Filter`
+            e.g. ``{"alert_type": "RETRACTION", "detectors": ["JUNO"]}``
+        display: bool
+            Show the alerts in the terminal
+        sink_queue_size: int
+            If not 0, display and run the plugin in a separate thread, behind a queue of
+            this many alerts, so that slow sinks do not hold up saving new alerts
 
         """
         outputfolder = outputfolder or self.default_output
         TOPIC = self.connection_test_topic if is_test else self.alert_topic
+        start = self._start(start_at)
 
         click.echo(
             "You are subscribing to "
@@ -118,25 +291,253 @@ class Subscriber:
             + click.style(f"{TOPIC}", bg="green")
         )
 
-        # Initiate hop_stream
-        stream = Stream(until_eos=False, auth=auth)
+        plugin = open_plugin(plugin, plugin_workers, plugin_timeout)
+        try:
+            stages = self.stages(outputfolder, plugin, filters=filters, display=display,
+                                 sink_queue_size=sink_queue_size)
+            Pipeline(self.source([TOPIC], auth=auth, start=start), stages,
+                     on_drop=self._skipped).run()
+        except KeyboardInterrupt:
+            click.secho("Done", fg="green")
+        finally:
+            if plugin is not None:
+                plugin.teardown()
+            self.close()
+
+    def stages(self, outputfolder, plugin=None, filters=None, display=True, sink_queue_size=0):
+        """The pipeline stages used by :meth:`subscribe`
+
+        filter -> skip duplicates -> save -> display -> plugin -> commit
+
+        Parameters
+        ----------
+        outputfolder: str or callable
+            Folder to save the alerts in, or a function of the
+            :class:`snews_pt.pipeline.Alert` returning it
+        plugin: Plugin, PluginPool or dict, optional
+            A loaded plugin, or loaded plugins by topic url
+        filters: dict, optional
+            Keyword arguments of :class:`snews_pt.pipeline.Filter`
+        display: bool
+            Include the terminal rendering
+        sink_queue_size: int
+            Run the stages after saving in their own thread, behind a queue this long
+
+        Returns
+        -------
+        list of :class:`snews_pt.pipeline.Stage`
+        """
+        stages = [Filter(**(filters or {}))]
+        if self.dedup is not None:
+            stages.append(Dedup(self.dedup))
+        plugins = plugin.values() if isinstance(plugin, dict) else [plugin] if plugin else []
+        # with sqlite storage, still write the file a plugin reads
+        stages.append(Store(self.save, outputfolder,
+                            need_file=any(p.needs_file for p in plugins)))
+        sinks = []
+        if display:
+            sinks.append(Render())
+        if plugin:
+            sinks.append(PluginSink(plugin, wait_for_file=self.wait_for_file))
+        sinks.append(Callback(self._done))
+        sinks[0].queue_size = sink_queue_size
+        return stages + sinks
+
+    def _done(self, alert):
+        """Commit an alert that was handled successfully"""
+        if not alert.ok:
+            return
+        if self.checkpoint is None and self.dedup is None:
+            return
+        # do not commit alerts still sitting in the writer queue, or lost by it
+        if not self.wait_for_file(alert.file):
+            log.error(f"{alert!r} was not saved to {alert.file}, it is not committed")
+            alert.ok = False
+            return
+        if self.checkpoint is not None and alert.metadata is not None:
+            self.checkpoint.commit(alert.topic, alert.metadata.partition, alert.metadata.offset)
+        if self.dedup is not None:
+            # a failed alert is processed again when it is redelivered
+            self.dedup.add(alert.message)
+
+    def _skipped(self, alert):
+        """Commit an alert that was filtered out or already processed"""
+        if self.checkpoint is not None and alert.metadata is not None:
+            self.checkpoint.commit(alert.topic, alert.metadata.partition, alert.metadata.offset)
+
+    def _start(self, start_at):
+        start = parse_start(start_at)
+        if start == "checkpoint" and self.checkpoint is None:
+            raise ValueError("Resuming from a checkpoint needs a Subscriber checkpoint file")
+        return start
+
+    def _read(self, consumer, broker, urls, start=None, tag=False, track=True):
+        """Alerts of an open consumer, `urls` maps the topic names it reads to their urls"""
+        kwargs = position(consumer, start, self.checkpoint, broker)
+        for message, metadata in consumer.read(metadata=True, **kwargs):
+            # Access message dictionary from JSONBlob
+            message = message.content
+            url = urls[metadata.topic]
+            if track and self.checkpoint is not None:
+                self.checkpoint.track(url, metadata.partition, metadata.offset)
+            if tag:
+                message["_topic"] = url
+            if metrics.enabled:
+                metrics.ALERTS_RECEIVED.labels(message.get("alert_type")).inc()
+            yield Alert(message, url, metadata)
 
+    def source(self, urls, auth=True, start=None, tag=False, track=True):
+        """Read alerts from topic urls, the source of a :class:`snews_pt.pipeline.Pipeline`
+
+        Topics on the same broker share a single consumer, several brokers are
+        read from one thread each.
+
+        Parameters
+        ----------
+        urls: list of str
+            Kafka urls of the topics
+        auth: A `bool` or :class:`Auth <hop.auth.Auth>` instance
+        start: str or datetime, optional
+            Start position, see :func:`snews_pt.core.checkpoint.parse_start`
+        tag: bool
+            Add the topic url to every alert message under the `_topic` key
+        track: bool
+            Track the offsets read in the checkpoint, for a pipeline that commits
+            every alert it handled
+
+        Yields
+        ------
+        :class:`snews_pt.pipeline.Alert`
+        """
+        start = parse_start(start)
+        # one consumer per broker: kafka://broker/topic1,topic2
+        brokers = {}
+        for url in urls:
+            broker, _, name = url.rpartition("/")
+            brokers.setdefault(broker, {})[name] = url
+
+        if len(brokers) == 1:
+            (broker, names), = brokers.items()
+            stream = Stream(until_eos=False, auth=auth)
+            with stream.open(f"{broker}/{','.join(names)}", "r") as s:
+                yield from self._read(s, broker, names, start, tag, track)
+            return
+
+        alerts = queue.Queue(maxsize=1000)
+        stop = threading.Event()
+
+        def consume(broker, names):
+            try:
+                stream = Stream(until_eos=False, auth=auth)
+                with stream.open(f"{broker}/{','.join(names)}", "r") as s:
+                    for alert in self._read(s, broker, names, start, tag, track):
+                        if stop.is_set():
+                            break
+                        alerts.put(alert)
+            except Exception as e:
+                log.exception(f"consumer for {broker} stopped")
+                alerts.put(e)
+            finally:
+                alerts.put(None)
+
+        threads = [
+            threading.Thread(target=consume, args=(broker, names), daemon=True,
+                             name=f"snews_pt-consumer-{broker}")
+            for broker, names in brokers.items()
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            running = len(threads)
+            while running:
+                alert = alerts.get()
+                if alert is None:
+                    running -= 1
+                elif isinstance(alert, Exception):
+                    click.secho(f"Consumer stopped: {alert}", fg="red")
+                else:
+                    yield alert
+        finally:
+            stop.set()
+
+    def topic_url(self, topic):
+        """Kafka url of a topic label ("alert", "firedrill", "test"), urls are returned as is"""
+        urls = {
+            "alert": os.getenv("ALERT_TOPIC"),
+            "firedrill": os.getenv("FIREDRILL_ALERT_TOPIC"),
+            "test": self.connection_test_topic,
+        }
+        if topic in urls:
+            return urls[topic]
+        if "://" in topic:
+            return topic
+        raise ValueError(f"Unknown topic {topic!r}, use one of {list(urls)} or a kafka:// url")
+
+    def subscribe_topics(self, topics=("alert", "firedrill"), outputfolder=None, auth=True,
+                         plugin=None, plugin_workers=0, plugin_timeout=None, start_at=None,
+                         filters=None, display=True, sink_queue_size=0):
+        """Subscribe to several alert topics at once
+
+        Topics on the same broker share a single consumer, each broker is read by its
+        own thread. Alerts are handled one at a time in the calling thread: every
+        alert is tagged with its source topic url under the `_topic` key, saved in a
+        sub folder named after its topic and handed to that topic's plugin.
+
+        Parameters
+        ----------
+        topics: list of str
+            Topic labels "alert", "firedrill" and "test", or kafka urls
+        outputfolder: str
+            Base folder, alerts go to `outputfolder/<topic>`. Defaults to the env file setting
+        auth: A `bool` or :class:`Auth <hop.auth.Auth>` instance
+        plugin: str, plugin object or dict, optional
+            A plugin for all topics, or a dictionary of plugins keyed by the
+            entries of `topics` (a label or a kafka url, as given)
+        plugin_workers: int
+            Worker processes per plugin, 0 runs the plugins in this process
+        plugin_timeout: float, optional
+            Seconds a pooled plugin may spend on one alert
+        start_at: str or datetime, optional
+            Where to start reading every topic, see :meth:`subscribe`
+        filters, display, sink_queue_size:
+            See :meth:`subscribe`
+
+        """
+        outputfolder = outputfolder or self.default_output
+        start = self._start(start_at)
+        routes = {}  # url -> sub folder
+        specs = {}  # url -> entry of topics
+        for topic in dict.fromkeys(topics):
+            url = self.topic_url(topic)
+            routes[url] = topic if "://" not in topic else url.rstrip("/").rsplit("/", 1)[-1]
+            specs[url] = topic
+
+        click.echo(
+            "You are subscribing to "
+            + click.style("ALERT", bg="red", bold=True)
+            + "".join("\nBroker:" + click.style(f"{url}", bg="green") for url in routes)
+        )
+
+        if not isinstance(plugin, dict):
+            plugin = {topic: plugin for topic in specs.values()}
+        plugins = {}
         try:
-            with stream.open(TOPIC, "r") as s:
-                for message in s:
-                    # Access message dictionary from JSOBlob
-                    message = message.content
-                    try:
-                        if message["_id"] == "0_test-connection":
-                            continue
-                    except KeyError:
-                        pass
-                    # Save and display
-                    save_message(message, outputfolder)
-                    snews_pt_utils.display_gif()
-                    display(message)
+            for url, topic in specs.items():
+                if plugin.get(topic) is not None:
+                    plugins[url] = open_plugin(plugin[topic], plugin_workers, plugin_timeout)
+            self.open_store(outputfolder)
+
+            stages = self.stages(lambda alert: os.path.join(outputfolder, routes[alert.topic]),
+                                 plugins, filters=filters, display=display,
+                                 sink_queue_size=sink_queue_size)
+            Pipeline(self.source(list(routes), auth=auth, start=start, tag=True), stages,
+                     on_drop=self._skipped).run()
         except KeyboardInterrupt:
             click.secho("Done", fg="green")
+        finally:
+            for p in plugins.values():
+                p.teardown()
+            self.close()
 
     def subscribe_and_redirect_alert(
             self, outputfolder=None, auth=True, _display=True, _return="file", is_test=False
@@ -151,26 +552,22 @@ class Subscriber:
             + click.style(f"{TOPIC}", bg="green")
         )
 
-        # Initiate hop_stream
-        stream = Stream(until_eos=False, auth=auth)
+        stages = [Filter()]
+        if self.dedup is not None:
+            stages.append(Dedup(self.dedup, remember=True))
+        # the caller may expect a file even when alerts go to the database
+        stages.append(Store(self.save, outputfolder, need_file=_return == "file"))
+        if _display:
+            stages.append(Render())
         try:
-            with stream.open(TOPIC, "r") as s:
-                for message in s:
-                    # Access message dictionary from JSONBlobg
-                    message = message.content
-                    try:
-                        if message["_id"] == "0_test-connection":
-                            continue
-                    except KeyError:
-                        pass
-                    # Save and display
-                    file = save_message(message, outputfolder, return_file=True)
-                    if _display:
-                        snews_pt_utils.display_gif()
-                        display(message)
-                    if _return == "message":
-                        yield message
-                    else:
-                        yield file
+            # nothing is committed here, the caller handles the alerts
+            for alert in Pipeline(self.source([TOPIC], auth=auth, track=False), stages):
+                if _return == "message":
+                    yield alert.message
+                else:
+                    self.wait_for_file(alert.file)
+                    yield alert.file
         except KeyboardInterrupt:
             click.secho("Done", fg="green")
+        finally:
+            self.close()
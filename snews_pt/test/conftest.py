@@ -0,0 +1,194 @@
+"""Shared fixtures for tests that should not touch a real Kafka broker."""
+
+import threading
+import time
+import types
+from datetime import datetime
+
+import pytest
+from adc.consumer import LogicalOffset
+from confluent_kafka import TopicPartition
+from hop.io import Deserializer, Producer
+
+from snews_pt.benchmarks.loopback import (
+    LoopbackBroker,
+    LoopbackConsumer,
+    LoopbackMetadata,
+    _Record,
+)
+from snews_pt.benchmarks.loopback import loopback as benchmark_loopback
+
+
+class FakeProducer:
+    """Stands in for :class:`hop.io.Producer`, recording written messages."""
+
+    def __init__(self, topic, fail_writes=0):
+        self.topic = topic
+        self.written = []
+        self.closed = False
+        self.flushed = 0
+        self.fail_writes = fail_writes
+
+    def write(self, message, headers=None, **kwargs):
+        if self.fail_writes > 0:
+            self.fail_writes -= 1
+            raise ConnectionError("broker went away")
+        self.written.append(message)
+
+    def flush(self):
+        self.flushed += 1
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FakeStream:
+    """Stands in for :class:`hop.Stream` in write mode."""
+
+    opened = []
+
+    def __init__(self, auth=True, start_at=None, until_eos=False):
+        self.auth = auth
+
+    def open(self, url, mode="r", **kwargs):
+        producer = FakeProducer(url)
+        FakeStream.opened.append(producer)
+        return producer
+
+
+@pytest.fixture
+def fake_stream(monkeypatch):
+    """Replace the hop Stream used for publishing and return the class."""
+    import snews_pt.core.connections
+
+    FakeStream.opened = []
+    monkeypatch.setattr(snews_pt.core.connections, "Stream", FakeStream)
+    return FakeStream
+
+
+@pytest.fixture
+def make_heartbeat():
+    """Return a factory of test heartbeat messages."""
+    from snews import messages
+
+    def make_heartbeat(detector_name="XENONnT", detector_status="ON"):
+        return messages.HeartbeatMessage(
+            detector_name=detector_name, detector_status=detector_status, is_test=True
+        )
+
+    return make_heartbeat
+
+
+class TimedRecord(_Record):
+    """A loopback record with the broker timestamp hop seeks by."""
+
+    def __init__(self, payload, headers, timestamp=None):
+        super().__init__(payload, headers)
+        self.timestamp_ms = int(time.time() * 1000) if timestamp is None else timestamp
+
+
+class FollowBroker(LoopbackBroker):
+    """Loopback broker with broker timestamps, publish hooks and consumers that follow.
+
+    With `follow`, consumers of streams opened with ``until_eos=False`` wait for
+    new messages once the topics are read, until they are stopped.
+    """
+
+    def __init__(self, follow=False):
+        super().__init__()
+        self.follow = follow
+        self._hooks = {}
+        self._cond = threading.Condition()
+
+    def publish(self, topic, message, timestamp=None):
+        """Append `message` to `topic`, `timestamp` in ms since the epoch defaults to now."""
+        payload, headers = Producer.pack(message)
+        record = TimedRecord(payload, headers, timestamp)
+        with self._cond:
+            self.topics.setdefault(topic, []).append(record)
+            self._cond.notify_all()
+        for hook in self._hooks.get(topic, ()):
+            hook(Deserializer.deserialize(record).content)
+
+    def on_publish(self, topic, hook):
+        """Call `hook` with the content of every message published to `topic`,
+        e.g. to play a server replying to it."""
+        self._hooks.setdefault(topic, []).append(hook)
+
+    def wait(self, timeout):
+        """Block until something is published or the timeout expires."""
+        with self._cond:
+            self._cond.wait(timeout)
+
+    def consumer(self, url, until_eos=False):
+        return FollowConsumer(self, url, follow=self.follow and not until_eos)
+
+
+class FakeKafkaConsumer:
+    """The partition assignment of the confluent consumer hop wraps, one partition per topic."""
+
+    def __init__(self, names):
+        self._assignment = [TopicPartition(name, 0) for name in names]
+
+    def assignment(self):
+        return list(self._assignment)
+
+    def assign(self, partitions):
+        self._assignment = list(partitions)
+
+
+class FollowConsumer(LoopbackConsumer):
+    """Loopback consumer honouring ``read(start_at=...)`` and offsets assigned to
+    the wrapped confluent consumer, like hop does."""
+
+    def __init__(self, broker, topic, follow=False):
+        super().__init__(broker, topic)
+        self.follow = follow
+        self._stopped = threading.Event()
+        self._consumer = types.SimpleNamespace(_consumer=FakeKafkaConsumer(self._names))
+
+    def _first_offset(self, tp, records, start_at):
+        if start_at is None:
+            return tp.offset if tp.offset >= 0 else 0
+        if isinstance(start_at, datetime):
+            ms = int(start_at.timestamp() * 1000)
+            return next((i for i, r in enumerate(records) if r.timestamp_ms >= ms), len(records))
+        return 0 if start_at == LogicalOffset.EARLIEST else len(records)
+
+    def read(self, metadata=False, start_at=None, **kwargs):
+        self._stopped.clear()
+        positions = {}
+        for tp in self._consumer._consumer.assignment():
+            records = self.broker.topics.get(f"{self._host}/{tp.topic}", [])
+            positions[tp.topic] = self._first_offset(tp, records, start_at)
+        while not self._stopped.is_set():
+            for name, first in positions.items():
+                records = list(self.broker.topics.get(f"{self._host}/{name}", []))
+                for offset in range(first, len(records)):
+                    if self._stopped.is_set():
+                        return
+                    message = Deserializer.deserialize(records[offset])
+                    positions[name] = offset + 1
+                    yield (message, LoopbackMetadata(name, 0, offset)) if metadata else message
+            if not self.follow:
+                return
+            self.broker.wait(0.05)
+
+    def stop(self):
+        self._stopped.set()
+
+
+@pytest.fixture
+def loopback():
+    """Return a context manager swapping hop.Stream for an in-memory :class:`FollowBroker`."""
+
+    def loopback(follow=False):
+        return benchmark_loopback(FollowBroker(follow))
+
+    return loopback
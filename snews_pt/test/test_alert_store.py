@@ -0,0 +1,99 @@
+"""Test the sqlite alert store and the `alerts` commands."""
+
+import json
+
+import pytest
+from click.testing import CliRunner
+
+from snews_pt.__main__ import main
+from snews_pt.core.alert_store import AlertStore, normalize_time
+from snews_pt.snews_sub import Subscriber
+
+
+def _alert(i, alert_type, detectors, sent, is_test=True):
+    return {
+        "_id": f"alert_{i}",
+        "alert_type": alert_type,
+        "server_tag": "test",
+        "detector_names": detectors,
+        "sent_time_utc": sent,
+        "neutrino_times": [sent.replace("12:00", "11:59")] * len(detectors),
+        "p_values": [0.1] * len(detectors),
+        "is_test": is_test,
+        "is_firedrill": True,
+    }
+
+
+ALERTS = [
+    _alert(0, "INITIAL", ["JUNO", "Super-K"], "2025-11-01T12:00:00.000000000Z"),
+    _alert(1, "RETRACTION", ["JUNO", "Super-K"], "2025-11-03T12:00:00.000000000Z"),
+    _alert(2, "RETRACTION", ["IceCube", "Super-K"], "2025-11-04T12:00:00+00:00"),
+    _alert(3, "RETRACTION", ["JUNO", "IceCube"], "2025-10-20T12:00:00", is_test=False),
+]
+
+
+def test_normalize_time():
+    assert normalize_time("2025-11-05T17:20:49.202042123Z") == "2025-11-05T17:20:49.202042"
+    assert normalize_time("2025-11-05T18:20:49+01:00") == "2025-11-05T17:20:49.000000"
+    assert normalize_time("2025-11-05") == "2025-11-05T00:00:00.000000"
+    assert normalize_time("yesterday") is None
+
+
+def test_query_uses_indexed_fields(tmp_path):
+    with AlertStore(str(tmp_path / "alerts.sqlite")) as store:
+        store.add_many(ALERTS)
+        assert len(store) == 4
+
+        found = store.query(alert_type="RETRACTION", detector="JUNO", since="2025-10-28")
+        assert [a["_id"] for a in found] == ["alert_1"]
+
+        assert store.count(detector=["JUNO", "IceCube"]) == 1
+        assert store.count(is_test=False) == 1
+        assert store.count(alert_type=["INITIAL", "RETRACTION"], until="2025-11-02") == 2
+        assert [a["_id"] for a in store.query(time_field="neutrino", limit=2,
+                                              newest_first=False)] == ["alert_3", "alert_0"]
+        with pytest.raises(ValueError):
+            store.query(since="last week")
+
+        # none of the filters needs a full table scan
+        for criteria in [dict(alert_type="RETRACTION", detector="JUNO"), dict(is_test=True),
+                         dict(since="2025-11-01", time_field="neutrino")]:
+            where, params, _ = store._where(**criteria)
+            plan = [row[-1] for row in store._db.execute(
+                f"EXPLAIN QUERY PLAN SELECT message FROM alerts{where}", params)]
+            assert not any(step.startswith("SCAN") for step in plan), plan
+
+
+def test_subscriber_sqlite_storage(tmp_path, loopback):
+    with loopback() as broker:
+        sub = Subscriber(firedrill_mode=False, storage="sqlite")
+        for alert in ALERTS:
+            broker.publish(sub.alert_topic, alert)
+        sub.subscribe(outputfolder=str(tmp_path), auth=False)
+
+    assert [p.name for p in tmp_path.iterdir() if p.suffix == ".json"] == []
+    with AlertStore(str(tmp_path / Subscriber.DATABASE_NAME)) as store:
+        assert store.count() == 4
+
+    with pytest.raises(ValueError):
+        Subscriber(storage="csv")
+
+
+def test_alerts_cli(tmp_path):
+    folder = tmp_path / "saved"
+    folder.mkdir()
+    for i, alert in enumerate(ALERTS):
+        (folder / f"{i}-SNEWS_ALERT.json").write_text(json.dumps(alert))
+    database = str(tmp_path / "alerts.sqlite")
+
+    runner = CliRunner()
+    result = runner.invoke(main, ["alerts", "import", str(folder), "-d", database])
+    assert result.exit_code == 0, result.output
+
+    result = runner.invoke(main, ["alerts", "query", "-d", database, "-t", "RETRACTION",
+                                  "--detector", "JUNO", "--json"])
+    assert result.exit_code == 0, result.output
+    assert [a["_id"] for a in json.loads(result.output)] == ["alert_1", "alert_3"]
+
+    result = runner.invoke(main, ["alerts", "query", "-d", database, "--no-test", "--count"])
+    assert result.output.strip() == "1"
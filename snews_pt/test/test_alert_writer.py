@@ -0,0 +1,65 @@
+"""Test the write-behind alert writer."""
+
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from snews_pt.core import alert_writer
+from snews_pt.core.alert_writer import AlertWriter
+
+
+def test_writes_json_and_groups_fsyncs(tmp_path, monkeypatch):
+    synced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(alert_writer.os, "fsync", lambda fd: synced.append(fd) or real_fsync(fd))
+
+    files = [str(tmp_path / f"{i}.json") for i in range(20)]
+    with AlertWriter(fsync_window=0.5) as writer:
+        for i, file in enumerate(files):
+            assert writer.write(file, {"_id": i, "detector_names": ["JUNO"]}) == file
+        assert writer.wait(files[-1], timeout=5)
+        # readable before the window closes
+        assert json.load(open(files[-1]))["_id"] == 19
+        assert writer.flush(timeout=5)
+
+    # the same formatting as files saved on the spot
+    assert open(files[0]).read() == json.dumps({"_id": 0, "detector_names": ["JUNO"]},
+                                               indent=4, sort_keys=True)
+    # one fsync per file plus one for the folder, all within the same window
+    assert len(synced) == len(files) + 1
+
+
+def test_close_makes_queued_alerts_durable(tmp_path, monkeypatch):
+    release = threading.Event()
+    real_open = os.open
+
+    def slow_open(*args, **kwargs):
+        release.wait(5)
+        return real_open(*args, **kwargs)
+
+    monkeypatch.setattr(alert_writer.os, "open", slow_open)
+    writer = AlertWriter(fsync_window=10)
+    for i in range(3):
+        writer.write(str(tmp_path / f"{i}.json"), {"_id": i})
+    assert not writer.wait(timeout=0.05)
+
+    release.set()
+    writer.close()  # does not wait for the window
+    assert sorted(os.listdir(tmp_path)) == ["0.json", "1.json", "2.json"]
+    with pytest.raises(RuntimeError):
+        writer.write(str(tmp_path / "3.json"), {})
+
+
+def test_write_errors_do_not_block_waiters(tmp_path):
+    with AlertWriter(fsync_window=0) as writer:
+        file = writer.write(str(tmp_path / "missing" / "0.json"), {})
+        ok = writer.write(str(tmp_path / "1.json"), {})
+        # reported as failed without waiting for the timeout
+        t0 = time.monotonic()
+        assert not writer.wait(file, durable=True, timeout=30)
+        assert time.monotonic() - t0 < 10
+        assert writer.wait(ok, durable=True, timeout=5)
+    assert writer.errors == 1
@@ -0,0 +1,62 @@
+"""Test the asyncio publisher against a fake stream."""
+
+import asyncio
+import queue
+
+import pytest
+
+from snews_pt.messages import AsyncPublisher
+
+
+def test_async_publisher_flushes_on_batch_size(fake_stream, make_heartbeat):
+    async def run():
+        async with AsyncPublisher("kafka://host/topic", auth=False,
+                                  max_batch=2, flush_interval=60) as pub:
+            futures = await pub.add_message(make_heartbeat())
+            futures += await pub.add_message(make_heartbeat())
+            sent = await asyncio.wait_for(asyncio.gather(*futures), timeout=5)
+            assert all(m.sent_time_utc is not None for m in sent)
+            return fake_stream.opened[0]
+
+    producer = asyncio.run(run())
+    assert len(producer.written) == 2
+    assert producer.closed
+
+
+def test_async_publisher_reports_failures(fake_stream, make_heartbeat):
+    async def run():
+        def broken(message):
+            raise ConnectionError("broker went away")
+
+        pub = AsyncPublisher("kafka://host/topic", auth=False, flush_interval=60)
+        pub._publisher._deliver = broken
+        (future,) = await pub.add_message(make_heartbeat())
+        await pub.flush()
+        await pub.aclose()
+        return future.exception()
+
+    assert isinstance(asyncio.run(run()), ConnectionError)
+
+
+def test_async_publisher_queue_is_bounded(fake_stream, make_heartbeat):
+    async def run():
+        pub = AsyncPublisher("kafka://host/topic", auth=False, flush_interval=60,
+                             max_queue_size=2, queue_policy="drop-oldest-heartbeat")
+        (first,) = await pub.add_message(make_heartbeat())
+        await pub.add_message(make_heartbeat())
+        await pub.add_message(make_heartbeat())
+        assert isinstance(first.exception(), queue.Full)
+        assert len(pub._pending) == 2
+        await pub.aclose()
+
+        pub = AsyncPublisher("kafka://host/topic", auth=False, flush_interval=60,
+                             max_queue_size=1)
+        await pub.add_message(make_heartbeat())
+        with pytest.raises(queue.Full):
+            await pub.add_message(make_heartbeat())
+        await pub.aclose()
+
+    asyncio.run(run())
+    assert len(fake_stream.opened[0].written) == 2
+    with pytest.raises(ValueError):
+        AsyncPublisher("kafka://host/topic", auth=False, queue_policy="block")
@@ -0,0 +1,22 @@
+"""Smoke test of the offline benchmarks."""
+
+import json
+
+from snews_pt.benchmarks import serializers, throughput
+
+
+def test_serializer_benchmark_covers_all_tiers():
+    results = serializers.run(number=2)
+    assert {r["tier"] for r in results} == set(serializers.example_messages())
+    assert all(r["bytes"] > 0 for r in results)
+
+
+def test_throughput_benchmark_roundtrip(tmp_path):
+    report = throughput.run(n=5)
+    assert report["results"]["subscribe.save"]["n"] == 5
+    assert report["results"]["publish.Heartbeat"]["ops_per_s"] > 0
+
+    path = tmp_path / "results.json"
+    path.write_text(json.dumps(report))
+    ratios = throughput.compare(json.loads(path.read_text()), report)
+    assert all(ratio == 1 for ratio in ratios.values())
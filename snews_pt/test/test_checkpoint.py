@@ -0,0 +1,159 @@
+"""Test resuming a subscriber from its offset checkpoint."""
+
+import json
+import os
+from datetime import UTC, datetime
+
+import pytest
+
+from snews_pt.benchmarks.throughput import example_alert
+from snews_pt.core import alert_writer
+from snews_pt.core.checkpoint import Checkpoint, parse_start
+from snews_pt.snews_sub import Subscriber
+
+
+def test_parse_start():
+    assert parse_start(" Earliest") == "earliest"
+    assert parse_start("2025-11-05T17:00:00") == datetime(2025, 11, 5, 17, tzinfo=UTC)
+    assert parse_start("2025-11-05T17:00:00Z") == datetime(2025, 11, 5, 17, tzinfo=UTC)
+    with pytest.raises(ValueError):
+        parse_start("yesterday")
+
+
+def test_checkpoint_commits_only_forward(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = Checkpoint(path)
+    assert not checkpoint
+    checkpoint.commit("kafka://host/topic", 0, 4)
+    checkpoint.commit("kafka://host/topic", 0, 2)
+    assert json.load(open(path)) == {"kafka://host/topic": {"0": 5}}
+    assert Checkpoint(path).offsets("kafka://host/topic") == {0: 5}
+
+
+def test_checkpoint_holds_at_the_first_unprocessed_offset(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"))
+    for offset in range(10, 14):
+        checkpoint.track("kafka://host/topic", 0, offset)
+    checkpoint.commit("kafka://host/topic", 0, 12)  # finished early
+    assert checkpoint.offsets("kafka://host/topic") == {}
+    checkpoint.commit("kafka://host/topic", 0, 10)
+    assert checkpoint.offsets("kafka://host/topic") == {0: 11}
+    # 11 failed, the later ones do not move the checkpoint past it
+    checkpoint.commit("kafka://host/topic", 0, 13)
+    assert checkpoint.offsets("kafka://host/topic") == {0: 11}
+
+
+def test_checkpoint_skips_a_failed_offset_after_max_held(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"), max_held=3)
+    checkpoint.track("kafka://host/topic", 0, 0)  # fails
+    for offset in (1, 2):
+        checkpoint.track("kafka://host/topic", 0, offset)
+        checkpoint.commit("kafka://host/topic", 0, offset)
+    assert checkpoint.offsets("kafka://host/topic") == {}
+
+    checkpoint.track("kafka://host/topic", 0, 3)
+    assert checkpoint.offsets("kafka://host/topic") == {0: 3}
+    assert list(checkpoint._tracked["kafka://host/topic", 0]) == [3]
+
+
+def test_redirect_generator_does_not_track_offsets(tmp_path, loopback):
+    with loopback() as broker:
+        sub = Subscriber(firedrill_mode=False, checkpoint=str(tmp_path / "checkpoint.json"))
+        for i in range(3):
+            broker.publish(sub.alert_topic, example_alert(i))
+        files = list(sub.subscribe_and_redirect_alert(outputfolder=str(tmp_path / "alerts"),
+                                                      auth=False, _display=False))
+    assert len(files) == 3
+    assert sub.checkpoint._tracked == {}
+
+
+def _subscribe(broker, tmp_path, start_at="checkpoint", plugin=None, filters=None):
+    received = []
+
+    def handle(alert):
+        received.append(alert["_id"])
+        if plugin:
+            plugin(alert)
+
+    sub = Subscriber(firedrill_mode=False, checkpoint=str(tmp_path / "checkpoint.json"))
+    sub.subscribe(outputfolder=str(tmp_path / "alerts"), auth=False, plugin=handle,
+                  start_at=start_at, filters=filters)
+    return sub, received
+
+
+def test_subscriber_resumes_after_last_processed_alert(tmp_path, loopback):
+    with loopback() as broker:
+        topic = Subscriber(firedrill_mode=False).alert_topic
+        for i in range(3):
+            broker.publish(topic, example_alert(i), timestamp=1000 * i)
+
+        def fail_on_last(alert):
+            if alert["_id"].endswith("_2"):
+                raise RuntimeError("plugin bug")
+
+        _, received = _subscribe(broker, tmp_path, plugin=fail_on_last)
+        assert len(received) == 3
+
+        broker.publish(topic, example_alert(3), timestamp=3000)
+        # the failed alert is not committed and comes again
+        sub, received = _subscribe(broker, tmp_path)
+        assert [r[-1] for r in received] == ["2", "3"]
+        assert sub.checkpoint.offsets(topic) == {0: 4}
+
+        assert _subscribe(broker, tmp_path)[1] == []
+        assert len(_subscribe(broker, tmp_path, start_at="earliest")[1]) == 4
+        assert _subscribe(broker, tmp_path, start_at="latest")[1] == []
+        since = datetime.fromtimestamp(2, UTC).isoformat()
+        assert len(_subscribe(broker, tmp_path, start_at=since)[1]) == 2
+
+    with pytest.raises(ValueError):
+        Subscriber(firedrill_mode=False).subscribe(start_at="checkpoint")
+
+
+def test_subscriber_resumes_at_a_failed_alert_in_the_middle(tmp_path, loopback):
+    with loopback() as broker:
+        topic = Subscriber(firedrill_mode=False).alert_topic
+        for i in range(4):
+            broker.publish(topic, example_alert(i))
+
+        def fail_on_second(alert):
+            if alert["_id"].endswith("_1"):
+                raise RuntimeError("plugin bug")
+
+        _, received = _subscribe(broker, tmp_path, plugin=fail_on_second)
+        assert len(received) == 4
+
+        sub, received = _subscribe(broker, tmp_path)
+        assert [r[-1] for r in received] == ["1", "2", "3"]
+        assert sub.checkpoint.offsets(topic) == {0: 4}
+
+
+def test_filtered_alerts_do_not_hold_the_checkpoint(tmp_path, loopback):
+    with loopback() as broker:
+        topic = Subscriber(firedrill_mode=False).alert_topic
+        for i in range(3):
+            broker.publish(topic, dict(example_alert(i), alert_type="UPDATE" if i == 1 else "INITIAL"))
+
+        sub, received = _subscribe(broker, tmp_path, filters={"alert_type": "INITIAL"})
+        assert [r[-1] for r in received] == ["0", "2"]
+        assert sub.checkpoint.offsets(topic) == {0: 3}
+
+
+def test_alerts_the_writer_could_not_save_are_not_committed(tmp_path, loopback, monkeypatch):
+    real_open = os.open
+
+    def failing_open(path, flags, *args):
+        if flags & os.O_TRUNC:  # the writer's write, not the name reservation
+            raise OSError(28, "No space left on device")
+        return real_open(path, flags, *args)
+
+    monkeypatch.setattr(alert_writer.os, "open", failing_open)
+    with loopback() as broker:
+        sub = Subscriber(firedrill_mode=False, checkpoint=str(tmp_path / "checkpoint.json"),
+                         write_behind=True, dedup=True)
+        for i in range(2):
+            broker.publish(sub.alert_topic, example_alert(i))
+        sub.subscribe(outputfolder=str(tmp_path / "alerts"), auth=False)
+
+    assert not os.path.exists(tmp_path / "checkpoint.json")
+    assert sub.dedup.stats["size"] == 0
@@ -0,0 +1,63 @@
+"""Test the pooled producers used by the Publisher."""
+
+import time
+
+from snews_pt.core.connections import ConnectionPool
+from snews_pt.messages import Publisher
+
+
+def test_pool_reuses_producer(fake_stream):
+    pool = ConnectionPool(auth=False)
+    assert pool.get("kafka://host/a") is pool.get("kafka://host/a")
+    assert len(fake_stream.opened) == 1
+
+
+def test_pool_evicts_idle_and_lru(fake_stream):
+    pool = ConnectionPool(auth=False, idle_timeout=0, max_size=1)
+    first = pool.get("kafka://host/a")
+    pool.evict_idle()
+    assert first.closed and len(pool) == 0
+
+    pool.idle_timeout = None
+    a = pool.get("kafka://host/a")
+    pool.get("kafka://host/b")
+    assert a.closed and "kafka://host/b" in pool
+
+
+def test_publisher_reuses_connection(fake_stream, make_heartbeat):
+    with Publisher("kafka://host/topic", auth=False) as publisher:
+        for _ in range(3):
+            publisher.add_message(make_heartbeat())
+            publisher.send()
+        producer = fake_stream.opened[0]
+        assert len(fake_stream.opened) == 1
+        assert len(producer.written) == 3
+    assert producer.closed
+
+
+def test_publisher_reconnects_on_failure(fake_stream, make_heartbeat):
+    publisher = Publisher("kafka://host/topic", auth=False)
+    publisher.pool.get("kafka://host/topic").fail_writes = 1
+    publisher.add_message(make_heartbeat())
+    publisher.send()
+
+    assert len(fake_stream.opened) == 2
+    assert fake_stream.opened[0].closed
+    assert len(fake_stream.opened[1].written) == 1
+    assert len(publisher.message_queue) == 0
+
+
+def test_pool_closes_idle_producers_in_the_background(fake_stream):
+    pool = ConnectionPool(auth=False, idle_timeout=0.05)
+    producer = pool.get("kafka://host/a")
+    deadline = time.monotonic() + 5
+    while len(pool) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert producer.closed and len(pool) == 0
+
+    # closing the pool stops the reaper of a new producer
+    pool.idle_timeout = 60
+    pool.get("kafka://host/a")
+    reaper = pool._reaper
+    pool.close()
+    assert not reaper.is_alive()
@@ -0,0 +1,63 @@
+"""Test skipping alerts that were already processed."""
+
+import time
+
+from snews_pt.benchmarks.throughput import example_alert
+from snews_pt.core import dedup
+from snews_pt.core.dedup import DedupCache, alert_key
+from snews_pt.snews_sub import Subscriber
+
+
+def test_alert_key():
+    assert alert_key({"_id": "a", "x": 1}) == "a"
+    no_id = {"alert_type": "INITIAL", "p_values": [0.1]}
+    assert alert_key(no_id).startswith("sha256:")
+    assert alert_key(no_id) == alert_key(dict(reversed(list(no_id.items())), _topic="t"))
+
+
+def test_lru_and_ttl(monkeypatch):
+    cache = DedupCache(maxsize=2, ttl=10)
+    a, b, c = {"_id": "a"}, {"_id": "b"}, {"_id": "c"}
+    for alert in (a, b):
+        assert not cache.seen(alert)
+        cache.add(alert)
+    assert cache.seen(a)  # a is now the most recent
+    cache.add(c)
+    assert not cache.seen(b) and cache.seen(a)
+    assert cache.stats == {"hits": 2, "misses": 3, "size": 2}
+
+    now = time.time()
+    monkeypatch.setattr(dedup.time, "time", lambda: now + 11)
+    assert not cache.seen(a)
+
+
+def test_index_survives_restart_and_compacts(tmp_path):
+    path = str(tmp_path / "seen")
+    cache = DedupCache(maxsize=3, path=path)
+    for i in range(10):
+        cache.add({"_id": str(i)})
+    cache.close()
+    assert len(open(path).read().splitlines()) <= 2 * 3 + 1
+
+    restarted = DedupCache(maxsize=3, path=path)
+    assert [restarted.seen({"_id": str(i)}) for i in range(10)] == [False] * 7 + [True] * 3
+    restarted.close()
+
+
+def test_subscriber_skips_redelivered_alerts(tmp_path, loopback):
+    received = []
+    with loopback() as broker:
+        sub = Subscriber(firedrill_mode=False, dedup=str(tmp_path / "index.txt"))
+        alerts = [example_alert(i) for i in range(3)]
+        for i in [0, 1, 0, 1, 2]:
+            broker.publish(sub.alert_topic, alerts[i])
+        sub.subscribe(outputfolder=str(tmp_path), auth=False, plugin=received.append)
+        # replaying the topic does not process anything again
+        sub.subscribe(outputfolder=str(tmp_path), auth=False, plugin=received.append)
+
+    assert len(received) == 3
+    assert len(list(tmp_path.glob("*.json"))) == 3
+    assert sub.dedup.stats == {"hits": 7, "misses": 3, "size": 3}
+    # closed with the subscriber, and reopened by the second subscription
+    assert sub.dedup._index is None
+    assert len((tmp_path / "index.txt").read_text().splitlines()) == 3
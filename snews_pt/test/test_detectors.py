@@ -0,0 +1,60 @@
+"""Test the detector registry."""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from snews_pt import snews_pt_utils
+from snews_pt.core.detectors import DEFAULT_DETECTORS, DetectorRegistry, registry
+
+WORLD_MAP = {
+    "Super-Kamiokande": {"lat": 36.4257, "lon": 137.3103, "aliases": "superk,Superk"},
+    "KamLAND": {"lat": 36.4225, "lon": 137.315, "aliases": None},
+    "IceCube": {"lat": -90.0, "lon": 0.0, "aliases": "IceCube Neutrino Observatory"},
+}
+
+
+def test_lookup_by_name_id_and_alias():
+    detectors = registry()
+    assert len(detectors) == len(DEFAULT_DETECTORS)
+    assert detectors["Super-K"] is detectors[1] is detectors["superk"] is detectors[" SUPER-k "]
+    assert detectors.get("arca").name == "KM3NeT"
+    assert detectors.get("halo-1kt").name == "HALO-1kT"
+    assert "XENONnT" in detectors and "Kamiokande-II" not in detectors
+    with pytest.raises(KeyError):
+        detectors["Kamiokande-II"]
+    assert snews_pt_utils.retrieve_detectors()["JUNO"] == detectors["JUNO"]
+
+
+def test_missing_file_is_made_and_changes_are_picked_up(tmp_path):
+    path = str(tmp_path / "detectors.json")
+    detectors = DetectorRegistry(path, world_map=WORLD_MAP)
+    assert detectors.names == DEFAULT_DETECTORS
+    assert detectors["KamLAND"].id == 4
+    coordinates = detectors.coordinates
+
+    with open(path, "w") as f:
+        json.dump({"KamLAND": ["KamLAND", 1, [36.0, 137.0]]}, f)
+    # the same mtime would keep the cached detectors
+    os.utime(path, ns=(1, 1))
+    assert detectors.names == ("KamLAND",)
+    assert detectors[1].name == "KamLAND" and "Super-K" not in detectors
+    assert detectors.coordinates.tolist() == [[36.0, 137.0]]
+    # a reload replaces the arrays handed out before instead of changing them
+    assert len(coordinates) == len(DEFAULT_DETECTORS)
+    with pytest.raises(ValueError):
+        detectors.coordinates[0] = 0.0
+
+
+def test_distances_to_all_detectors(tmp_path):
+    detectors = DetectorRegistry(str(tmp_path / "detectors.json"), world_map=WORLD_MAP)
+    coordinates = detectors.coordinates
+    assert coordinates.shape == (len(DEFAULT_DETECTORS), 2)
+    assert np.isfinite(coordinates).all(axis=1).sum() == 3
+
+    distances = detectors.distances(-89.0, 0.0)
+    assert distances[detectors.names.index("IceCube")] == pytest.approx(111.2, abs=0.1)
+    assert np.isnan(distances[detectors.names.index("JUNO")])
+    assert [d.name for d in detectors.within(36.42, 137.31, radius_km=5)] == ["KamLAND", "Super-K"]
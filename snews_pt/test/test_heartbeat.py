@@ -0,0 +1,64 @@
+"""Test the heartbeat daemon without a broker."""
+
+import threading
+
+import pytest
+from click.testing import CliRunner
+
+from snews_pt import messages
+from snews_pt.__main__ import main
+from snews_pt.core.connections import ConnectionPool
+from snews_pt.heartbeat import HeartbeatDaemon, status_source
+from snews_pt.messages import Publisher
+
+
+def test_status_sources(tmp_path):
+    status_file = tmp_path / "status"
+    status_file.write_text("on\n")
+    assert status_source("OFF")() == "OFF"
+    assert status_source(f"file:{status_file}")() == "ON"
+    assert status_source("cmd:echo off")() == "OFF"
+    assert status_source(lambda: True)() == "ON"
+    with pytest.raises(ValueError):
+        status_source("maybe")
+
+
+def test_daemon_sends_over_one_connection(fake_stream):
+    publisher = Publisher("kafka://host/topic", auth=False)
+    daemon = HeartbeatDaemon(publisher, "XENONnT", every=0.01)
+    daemon.run(count=3)
+
+    assert daemon.sent == 3
+    assert len(fake_stream.opened) == 1
+    assert len(fake_stream.opened[0].written) == 3
+
+
+def test_daemon_stops(fake_stream):
+    daemon = HeartbeatDaemon(Publisher("kafka://host/topic", auth=False), "XENONnT", every=60)
+    threading.Timer(0.05, daemon.stop).start()
+    daemon.run()
+    assert daemon.sent == 1
+
+
+def test_daemon_skips_unreadable_status(fake_stream, tmp_path):
+    daemon = HeartbeatDaemon(Publisher("kafka://host/topic", auth=False), "XENONnT",
+                             every=0.01, status=f"file:{tmp_path / 'missing'}")
+    daemon.run(count=2)
+    assert daemon.failed == 2 and daemon.sent == 0
+
+
+def test_heartbeat_daemon_command(fake_stream, monkeypatch):
+    pools = []
+
+    class RecordingPool(ConnectionPool):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            pools.append(self)
+
+    monkeypatch.setattr(messages, "ConnectionPool", RecordingPool)
+    result = CliRunner().invoke(main, ["heartbeat-daemon", "-e", "0.01", "-n", "2"])
+    assert result.exit_code == 0, result.output
+    assert "Stopped after 2 heartbeat(s)" in result.output
+    # the producer is never closed as idle between beats
+    assert [pool.idle_timeout for pool in pools] == [None]
+    assert len(fake_stream.opened) == 1
@@ -0,0 +1,69 @@
+"""Test the bounded message queue and its overflow policies."""
+
+import queue
+import threading
+from datetime import UTC, datetime
+
+import pytest
+from snews import messages
+
+from snews_pt.core.message_queue import MessageQueue
+from snews_pt.messages import Publisher
+
+
+def _coincidence():
+    return messages.CoincidenceTierMessage(
+        detector_name="XENONnT", neutrino_time_utc=datetime.now(UTC)
+    )
+
+
+def test_fifo_and_stats():
+    q = MessageQueue(maxsize=3)
+    for i in range(3):
+        q.put(i)
+    assert q.get() == 0
+    q.requeue(0)
+    assert list(q) == [0, 1, 2]
+    assert q.stats == {"depth": 3, "high_water": 3, "dropped": 0, "maxsize": 3}
+    with pytest.raises(queue.Full):
+        q.put(3)
+
+
+def test_drop_oldest_heartbeat(make_heartbeat):
+    q = MessageQueue(maxsize=2, policy="drop-oldest-heartbeat")
+    coincidence, heartbeat = _coincidence(), make_heartbeat()
+    q.put(coincidence)
+    q.put(heartbeat)
+    assert q.put(_coincidence()) is heartbeat
+    assert q.stats["dropped"] == 1
+    with pytest.raises(queue.Full):
+        q.put(_coincidence())
+
+
+def test_block_until_room():
+    q = MessageQueue(maxsize=1, policy="block", block_timeout=5)
+    q.put("first")
+    threading.Timer(0.05, q.get).start()
+    q.put("second")
+    assert list(q) == ["second"]
+
+    q.block_timeout = 0.01
+    with pytest.raises(queue.Full):
+        q.put("third")
+
+
+def test_publisher_queue_stats(make_heartbeat):
+    publisher = Publisher("kafka://host/topic", auth=False, max_queue_size=1,
+                          queue_policy="drop-oldest-heartbeat")
+    publisher.add_message(make_heartbeat())
+    publisher.add_message(make_heartbeat())
+    assert publisher.queue_stats()["dropped"] == 1
+    assert len(publisher.message_queue) == 1
+
+
+def test_single_threaded_publisher_does_not_block_forever(make_heartbeat):
+    publisher = Publisher("kafka://host/topic", auth=False, max_queue_size=1,
+                          queue_policy="block", block_timeout=0.05)
+    publisher.add_message(make_heartbeat())
+    with pytest.raises(queue.Full):
+        publisher.add_message(make_heartbeat())
@@ -0,0 +1,75 @@
+"""Test the metrics recorded on the publish path."""
+
+import threading
+import urllib.request
+
+import pytest
+from click.testing import CliRunner
+from snews import messages
+
+from snews_pt.__main__ import main
+from snews_pt.core import metrics
+from snews_pt.messages import Publisher
+
+
+@pytest.fixture
+def enabled_metrics():
+    metrics.enable()
+    yield metrics
+    metrics.disable()
+
+
+def _send_heartbeat():
+    with Publisher("kafka://host/topic", auth=False) as publisher:
+        publisher.add_message(
+            messages.HeartbeatMessage(detector_name="XENONnT", detector_status="ON")
+        )
+        publisher.send()
+
+
+def test_disabled_metrics_record_nothing(fake_stream):
+    _send_heartbeat()
+    assert "snews_pt_messages_sent_total{" not in metrics.render()
+
+
+def test_publish_metrics(fake_stream, enabled_metrics):
+    _send_heartbeat()
+    text = metrics.render()
+    assert 'snews_pt_messages_sent_total{tier="Heartbeat"} 1' in text
+    assert 'snews_pt_serialize_seconds_count{serializer="pickle"} 1' in text
+    assert 'snews_pt_queue_depth{topic="kafka://host/topic"} 0' in text
+
+
+def test_http_endpoint(enabled_metrics):
+    metrics.ALERTS_RECEIVED.labels("INITIAL").inc()
+    server = metrics.start_http_server(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/"
+        body = urllib.request.urlopen(url, timeout=5).read().decode()
+    finally:
+        server.shutdown()
+    assert 'snews_pt_alerts_received_total{alert_type="INITIAL"} 1' in body
+
+
+def test_textfile_from_cli(fake_stream, tmp_path):
+    path = tmp_path / "snews_pt.prom"
+    try:
+        result = CliRunner().invoke(main, ["--metrics-file", str(path), "heartbeat"])
+    finally:
+        metrics.disable()
+    assert result.exit_code == 0, result.output
+    assert 'snews_pt_messages_sent_total{tier="Heartbeat"} 1' in path.read_text()
+
+
+def test_render_escapes_labels_and_tolerates_new_ones():
+    counter = metrics.Counter("test_total", "Test counter", ["name"])
+    counter.labels('a "quoted"\\path\nline').inc()
+    assert 'test_total{name="a \\"quoted\\"\\\\path\\nline"} 1' in counter.render()
+
+    # new label sets while rendering from another thread
+    thread = threading.Thread(target=lambda: [counter.labels(i).inc() for i in range(20000)])
+    thread.start()
+    while thread.is_alive():
+        counter.render()
+    thread.join()
+    assert len(counter.render()) == 2 + 20001
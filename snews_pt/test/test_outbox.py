@@ -0,0 +1,96 @@
+"""Test the persistent outbox of the Publisher."""
+
+import os
+
+import pytest
+
+from snews_pt.core.outbox import Outbox
+from snews_pt.messages import Publisher
+
+
+def test_outbox_replays_unacknowledged(tmp_path):
+    outbox = Outbox(str(tmp_path), segment_size=4096)
+    first = outbox.append(b"first")
+    outbox.append(b"second")
+    outbox.ack(first)
+    outbox.close()
+
+    reopened = Outbox(str(tmp_path), segment_size=4096)
+    assert [payload for _, payload in reopened.pending()] == [b"second"]
+    assert len(reopened) == 1
+
+
+def test_outbox_compacts_acknowledged_segments(tmp_path):
+    outbox = Outbox(str(tmp_path), segment_size=64)
+    ids = [outbox.append(b"x" * 40) for _ in range(3)]
+    assert len(os.listdir(tmp_path)) == 3
+    for record_id in ids:
+        outbox.ack(record_id)
+    # only the active segment is left
+    assert len(os.listdir(tmp_path)) == 1
+    outbox.close()
+    assert Outbox(str(tmp_path)).pending() == []
+
+
+def test_outbox_ignores_torn_record(tmp_path):
+    outbox = Outbox(str(tmp_path), segment_size=4096)
+    outbox.append(b"complete")
+    index, pos = outbox.append(b"torn")
+    outbox._segments[index].mm[pos] = 0  # crash before the magic byte was written
+    outbox.close()
+
+    assert [p for _, p in Outbox(str(tmp_path)).pending()] == [b"complete"]
+
+
+def test_publisher_replays_after_failed_send(fake_stream, tmp_path, make_heartbeat):
+    publisher = Publisher("kafka://host/topic", auth=False, outbox=str(tmp_path))
+    publisher.add_message(make_heartbeat())
+    publisher.outbox.close()  # the process dies before sending
+
+    publisher = Publisher("kafka://host/topic", auth=False, outbox=str(tmp_path))
+    assert len(publisher.message_queue) == 1
+    publisher.send()
+    assert len(fake_stream.opened[0].written) == 1
+    assert len(publisher.outbox) == 0
+
+
+def test_publisher_acks_what_was_sent_before_a_failure(fake_stream, tmp_path, make_heartbeat):
+    publisher = Publisher("kafka://host/topic", auth=False, outbox=str(tmp_path))
+    for _ in range(3):
+        publisher.add_message(make_heartbeat())
+    queued = [m.uuid for m in publisher.message_queue]
+    deliver = publisher._deliver
+    calls = []
+
+    def fail_second(message):
+        calls.append(message)
+        if len(calls) == 2:
+            raise ConnectionError("broker went away")
+        deliver(message)
+
+    publisher._deliver = fail_second
+    with pytest.raises(ConnectionError):
+        publisher.send()
+    assert len(publisher.outbox) == 2
+    publisher.close()
+
+    publisher = Publisher("kafka://host/topic", auth=False, outbox=str(tmp_path))
+    # only the messages from the failed one on are replayed
+    assert [m.uuid for m in publisher.message_queue] == queued[1:]
+    publisher.send()
+    publisher.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_publisher_reopens_its_outbox_after_close(fake_stream, tmp_path, make_heartbeat):
+    with Publisher("kafka://host/topic", auth=False, outbox=str(tmp_path)) as publisher:
+        publisher.add_message(make_heartbeat())
+    assert len(publisher.message_queue) == 1
+
+    # still usable, the message queued before close is not replayed a second time
+    publisher.add_message(make_heartbeat())
+    assert len(publisher.message_queue) == 2
+    publisher.send()
+    publisher.close()
+    assert len(fake_stream.opened[-1].written) == 2
+    assert os.listdir(tmp_path) == []
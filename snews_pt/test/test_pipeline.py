@@ -0,0 +1,95 @@
+"""Test the alert processing pipeline."""
+
+import threading
+import time
+
+from snews_pt.benchmarks.throughput import example_alert
+from snews_pt.pipeline import Alert, Callback, Filter, Pipeline, Stage
+from snews_pt.snews_sub import Subscriber
+
+
+def _alerts(*messages):
+    return [Alert(m, topic="kafka://host/topic") for m in messages]
+
+
+def test_filter_criteria():
+    messages = [
+        {"_id": "0_test-connection"},
+        {"_id": "a", "alert_type": "INITIAL", "detector_names": ["JUNO"], "is_test": True},
+        {"_id": "b", "alert_type": "retraction", "detector_names": ["JUNO"], "is_test": False},
+        {"_id": "c", "alert_type": "RETRACTION", "detector_names": ["IceCube"], "is_test": True},
+    ]
+
+    def ids(stage):
+        return [a.message["_id"] for a in Pipeline(_alerts(*messages), [stage])]
+
+    assert ids(Filter()) == ["a", "b", "c"]
+    assert ids(Filter(alert_type="RETRACTION")) == ["b", "c"]
+    assert ids(Filter(alert_type=["RETRACTION"], detectors={"JUNO", "KM3NeT"})) == ["b"]
+    assert ids(Filter(is_test=True, predicate=lambda m: m["_id"] != "a")) == ["c"]
+
+
+class Broken(Stage):
+    def process(self, alert):
+        if alert.message["_id"] == "bad":
+            raise RuntimeError("broken stage")
+        return alert
+
+
+def test_failing_stage_drops_only_that_alert():
+    pipeline = Pipeline(_alerts({"_id": "bad"}, {"_id": "good"}), [Broken()])
+    assert [a.message["_id"] for a in pipeline] == ["good"]
+
+
+def test_queued_stage_runs_concurrently_with_the_source():
+    release = threading.Event()
+    consumed = []
+    handled = []
+
+    def source():
+        for i in range(5):
+            consumed.append(i)
+            yield Alert({"_id": str(i)})
+
+    def slow_sink(alert):
+        release.wait(5)
+        handled.append(alert.message["_id"])
+
+    opened = []
+
+    class Tracked(Stage):
+        def open(self):
+            opened.append("open")
+
+        def close(self):
+            opened.append("close")
+
+    pipeline = Pipeline(source(), [Tracked(), Callback(slow_sink, queue_size=10)])
+    runner = threading.Thread(target=pipeline.run)
+    runner.start()
+    # the source is read to the end while the sink is still stuck on the first alert
+    deadline = time.monotonic() + 5
+    while len(consumed) < 5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert consumed == [0, 1, 2, 3, 4] and handled == []
+
+    release.set()
+    runner.join(5)
+    assert handled == ["0", "1", "2", "3", "4"]
+    assert pipeline.processed == 5
+    assert opened == ["open", "close"]
+
+
+def test_subscriber_filters_without_display(tmp_path, capsys, loopback):
+    received = []
+    with loopback() as broker:
+        sub = Subscriber(firedrill_mode=False)
+        retraction = dict(example_alert(1), alert_type="RETRACTION")
+        for alert in [example_alert(0), retraction, example_alert(2)]:
+            broker.publish(sub.alert_topic, alert)
+        sub.subscribe(outputfolder=str(tmp_path), auth=False, plugin=received.append,
+                      filters={"alert_type": "RETRACTION"}, display=False, sink_queue_size=4)
+
+    assert [a["_id"] for a in received] == [retraction["_id"]]
+    assert len(list(tmp_path.iterdir())) == 1
+    assert "ALERT MESSAGE" not in capsys.readouterr().out
@@ -0,0 +1,234 @@
+"""Test loading alert plugins and running them from the subscriber."""
+
+import json
+import queue
+import sys
+import tempfile
+import textwrap
+import time
+
+import pytest
+
+from snews_pt import plugins
+from snews_pt.benchmarks.throughput import example_alert
+from snews_pt.snews_sub import Subscriber
+
+
+def _write(path, source):
+    path.write_text(textwrap.dedent(source))
+    return str(path)
+
+
+def test_file_plugin_with_setup_and_teardown(tmp_path):
+    spec = _write(tmp_path / "plugin.py", """
+        calls = []
+
+        def setup():
+            calls.append("setup")
+
+        def handle(alert):
+            calls.append(alert["_id"])
+
+        def teardown():
+            calls.append("teardown")
+    """)
+    plugin = plugins.load_plugin(spec)
+    assert not plugin.needs_file
+
+    with plugin:
+        plugin({"_id": "a"})
+        plugin({"_id": "b"})
+    assert plugin.handle.__globals__["calls"] == ["setup", "a", "b", "teardown"]
+
+
+def test_module_class_plugin(tmp_path, monkeypatch):
+    _write(tmp_path / "my_plugins.py", """
+        class Counter:
+            def __init__(self):
+                self.seen = 0
+
+            def handle(self, alert):
+                self.seen += 1
+    """)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    plugin = plugins.load_plugin("my_plugins:Counter")
+    plugin({})
+    plugin({})
+    assert plugin.handle.__self__.seen == 2
+    sys.modules.pop("my_plugins", None)
+
+
+def test_plain_callable_and_invalid_object():
+    seen = []
+    plugins.load_plugin(seen.append)({"_id": "x"})
+    assert seen == [{"_id": "x"}]
+
+    with pytest.raises(TypeError):
+        plugins.plugin_from_object(json)
+    with pytest.raises(FileNotFoundError):
+        plugins.load_plugin("no_such_plugin.py")
+
+
+LEGACY_PLUGIN = """
+    import json, sys
+    data = json.load(open(sys.argv[1]))
+    open({out!r}, "a").write(data["_id"] + "\\n")
+"""
+
+
+def test_legacy_script_plugin(tmp_path, monkeypatch):
+    out = tmp_path / "out.txt"
+    spec = _write(tmp_path / "legacy.py", LEGACY_PLUGIN.format(out=str(out)))
+    plugin = plugins.load_plugin(spec)
+    assert isinstance(plugin, plugins.ScriptPlugin)
+
+    temp = tmp_path / "temp"
+    temp.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(temp))
+    plugin({"_id": "legacy"})
+    assert out.read_text() == "legacy\n"
+    # the alert file written for the script is removed again
+    assert list(temp.iterdir()) == []
+
+
+def test_legacy_script_plugin_with_sqlite_storage(tmp_path, loopback):
+    out = tmp_path / "out.txt"
+    spec = _write(tmp_path / "legacy.py", LEGACY_PLUGIN.format(out=str(out)))
+    alerts = tmp_path / "alerts"
+    with loopback() as broker:
+        sub = Subscriber(firedrill_mode=False, storage="sqlite")
+        published = [example_alert(i) for i in range(2)]
+        for alert in published:
+            broker.publish(sub.alert_topic, alert)
+        sub.subscribe(outputfolder=str(alerts), auth=False, plugin=spec)
+
+    assert out.read_text().split() == [alert["_id"] for alert in published]
+    # the script read the saved files rather than temporary ones
+    assert len(list(alerts.glob("*.json"))) == 2
+
+
+def test_subscriber_hands_alerts_to_plugin(tmp_path, loopback):
+    received = []
+
+    def failing_then_ok(alert):
+        received.append(alert["_id"])
+        if len(received) == 1:
+            raise RuntimeError("plugin bug")
+
+    with loopback() as broker:
+        sub = Subscriber(firedrill_mode=False)
+        for i in range(3):
+            broker.publish(sub.alert_topic, example_alert(i))
+        sub.subscribe(outputfolder=str(tmp_path), auth=False, plugin=failing_then_ok)
+
+    # a failing plugin does not stop the subscription
+    assert len(received) == 3
+    assert len(list(tmp_path.iterdir())) == 3
+
+
+POOL_PLUGIN = """
+    import os, time
+
+    def handle(alert):
+        if alert["action"] == "sleep":
+            time.sleep(alert["seconds"])
+        elif alert["action"] == "crash":
+            os._exit(1)
+        elif alert["action"] == "raise":
+            raise ValueError("bad alert")
+        with open(alert["out"], "a") as f:
+            f.write(alert["_id"] + "\\n")
+"""
+
+
+def test_plugin_pool_survives_timeouts_crashes_and_errors(tmp_path):
+    spec = _write(tmp_path / "pool_plugin.py", POOL_PLUGIN)
+    out = str(tmp_path / "out.txt")
+    alerts = [
+        {"_id": "slow", "action": "sleep", "seconds": 30, "out": out},
+        {"_id": "crash", "action": "crash", "out": out},
+        {"_id": "raise", "action": "raise", "out": out},
+        {"_id": "ok", "action": "write", "out": out},
+    ]
+    results = {}
+    # slow and crash are killed or die before writing
+    with plugins.PluginPool(spec, workers=1, timeout=1.0) as pool:
+        for alert in alerts:
+            assert pool.submit(alert, callback=lambda ok, _id=alert["_id"]: results.update({_id: ok}))
+        pool.join()
+
+    assert open(out).read().split() == ["ok"]
+    assert results == {"slow": False, "crash": False, "raise": False, "ok": True}
+    assert pool.stats == {"submitted": 4, "done": 1, "failed": 1, "timeouts": 1,
+                          "crashes": 1, "dropped": 0}
+
+
+def test_plugin_pool_drops_when_queue_is_full(tmp_path):
+    spec = _write(tmp_path / "pool_plugin.py", POOL_PLUGIN)
+    out = str(tmp_path / "out.txt")
+    with plugins.PluginPool(spec, workers=1, max_pending=1) as pool:
+        pool.submit({"_id": "a", "action": "sleep", "seconds": 0.5, "out": out})
+        time.sleep(0.2)  # let the worker take the first alert
+        assert pool.submit({"_id": "b", "action": "write", "out": out})
+        assert not pool.submit({"_id": "c", "action": "write", "out": out})
+        with pytest.raises(queue.Full):
+            pool({"_id": "d", "action": "write", "out": out})
+    assert pool.stats["dropped"] == 2
+    assert open(out).read().split() == ["a", "b"]
+
+
+def test_plugin_pool_reports_broken_plugin(tmp_path):
+    spec = _write(tmp_path / "broken.py", "def handle(alert):\n    pass\nraise ImportError('x')\n")
+    with pytest.raises(RuntimeError, match="could not load plugin"):
+        plugins.PluginPool(spec, workers=1)
+
+
+def test_plugin_pool_stops_started_workers_if_one_fails(tmp_path, monkeypatch):
+    marker = tmp_path / "started"
+    # only the first worker loads the plugin
+    spec = _write(tmp_path / "once.py", f"""
+        import os
+        if os.path.exists({str(marker)!r}):
+            raise ImportError("second worker")
+        open({str(marker)!r}, "w").close()
+
+        def handle(alert):
+            pass
+    """)
+    started = []
+    start_worker = plugins.PluginPool._start_worker
+    monkeypatch.setattr(plugins.PluginPool, "_start_worker",
+                        lambda self: started.append(start_worker(self)) or started[-1])
+    with pytest.raises(RuntimeError, match="could not load plugin"):
+        plugins.PluginPool(spec, workers=3)
+    assert len(started) == 1 and not started[0].is_alive()
+
+
+def test_subscriber_with_plugin_workers(tmp_path, loopback):
+    spec = _write(tmp_path / "pool_plugin.py", POOL_PLUGIN)
+    out = str(tmp_path / "out.txt")
+    alerts = tmp_path / "alerts"
+    with loopback() as broker:
+        sub = Subscriber(firedrill_mode=False)
+        for i in range(3):
+            broker.publish(sub.alert_topic, dict(example_alert(i), action="write", out=out))
+        sub.subscribe(outputfolder=str(alerts), auth=False, plugin=spec, plugin_workers=2)
+
+    # the pool is drained when the subscription ends
+    assert len(open(out).read().split()) == 3
+
+
+def test_subscriber_commits_pooled_alerts_once_handled(tmp_path, loopback):
+    spec = _write(tmp_path / "pool_plugin.py", POOL_PLUGIN)
+    out = str(tmp_path / "out.txt")
+    checkpoint = tmp_path / "checkpoint.json"
+    with loopback() as broker:
+        sub = Subscriber(firedrill_mode=False, checkpoint=str(checkpoint), dedup=True)
+        broker.publish(sub.alert_topic, dict(example_alert(0), action="sleep", seconds=0.3, out=out))
+        broker.publish(sub.alert_topic, dict(example_alert(1), action="raise", out=out))
+        sub.subscribe(outputfolder=str(tmp_path / "alerts"), auth=False, plugin=spec,
+                      plugin_workers=2)
+
+    # the failed alert is neither checkpointed nor remembered as processed
+    assert json.loads(checkpoint.read_text()) == {sub.alert_topic: {"0": 1}}
+    assert sub.dedup.stats["size"] == 1
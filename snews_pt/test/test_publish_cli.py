@@ -0,0 +1,40 @@
+"""Test batch publishing from the command line without a broker."""
+
+import os
+import shutil
+
+import pytest
+from click.testing import CliRunner
+
+from snews_pt.__main__ import main
+from snews_pt.snews_pt_utils import collect_json_files
+
+here = os.path.dirname(__file__)
+
+
+def test_collect_json_files(tmp_path):
+    for name in ["a.json", "b.json", "notes.txt"]:
+        (tmp_path / name).write_text("{}")
+    a = str(tmp_path / "a.json")
+
+    assert collect_json_files([str(tmp_path)]) == [a, str(tmp_path / "b.json")]
+    assert collect_json_files([a, str(tmp_path / "*.json")])[0] == a
+    assert len(collect_json_files([a, str(tmp_path / "*")])) == 2
+    with pytest.raises(TypeError):
+        collect_json_files([str(tmp_path / "notes.txt")])
+
+
+def test_publish_directory_over_one_connection(fake_stream, tmp_path):
+    for tier in ["heartbeat", "coincidence_tier", "significance_tier"]:
+        name = f"example_{tier}_message.json"
+        shutil.copy(os.path.join(here, name), tmp_path / name)
+    (tmp_path / "broken.json").write_text("{not json")
+
+    result = CliRunner().invoke(main, ["publish", "-v", "1", str(tmp_path)])
+
+    assert result.exit_code == 0, result.output
+    assert "Published 3/4 file(s)" in result.output
+    assert "FAILED" in result.output and "broken.json" in result.output
+    assert "msg/s" in result.output
+    assert len(fake_stream.opened) == 1
+    assert len(fake_stream.opened[0].written) >= 3
@@ -0,0 +1,172 @@
+"""Test the remote commands against a loopback server."""
+
+import json
+import threading
+import time
+
+import pytest
+from hop.io import Deserializer
+
+from snews_pt import remote_commands
+
+OBSERVATION_TOPIC = "kafka://localhost/snews.experiments-firedrill"
+CONFIRMATION_TOPIC = "kafka://localhost/snews.connection-testing"
+
+
+@pytest.fixture
+def broker(monkeypatch, loopback):
+    monkeypatch.setenv("FIREDRILL_OBSERVATION_TOPIC", OBSERVATION_TOPIC)
+    monkeypatch.setenv("CONNECTION_TEST_TOPIC", CONFIRMATION_TOPIC)
+    with loopback(follow=True) as broker:
+        yield broker
+    remote_commands.close_default_session()
+
+
+def confirm_after(broker, delay):
+    """Reply to test-connection messages like the server, after `delay` seconds."""
+
+    def reply(content):
+        message = json.loads(content)
+        message["meta"]["status"] = "received"
+        if delay:
+            threading.Timer(delay, broker.publish, (CONFIRMATION_TOPIC, message)).start()
+        else:
+            broker.publish(CONFIRMATION_TOPIC, message)
+
+    broker.on_publish(OBSERVATION_TOPIC, reply)
+
+
+@pytest.mark.parametrize("delay", [0, 0.2])
+def test_connection_returns_on_confirmation(broker, delay):
+    # an older confirmation before the test must not count
+    broker.publish(CONFIRMATION_TOPIC, {"_id": "0_test-connection", "meta": {}})
+    confirm_after(broker, delay)
+
+    t0 = time.perf_counter()
+    assert remote_commands.test_connection("XENONnT", patience=5) is True
+
+    rtt = remote_commands.default_session().last_rtt
+    assert rtt is not None and delay <= rtt < 2
+    assert time.perf_counter() - t0 < 2
+
+
+def test_connection_gives_up_at_the_deadline(broker):
+    t0 = time.perf_counter()
+    assert remote_commands.test_connection("XENONnT", patience=0.3) is False
+    assert remote_commands.default_session().last_rtt is None
+    assert 0.3 <= time.perf_counter() - t0 < 2
+
+
+def test_probe_matches_replies_and_counts_losses(broker):
+    def reply(content):
+        message = json.loads(content)
+        if message["meta"]["probe"] % 4 == 3:
+            return  # lost
+        message["meta"]["status"] = "received"
+        threading.Timer(0.01, broker.publish, (CONFIRMATION_TOPIC, message)).start()
+
+    broker.on_publish(OBSERVATION_TOPIC, reply)
+    rows = remote_commands.probe(count=8, rate=100, detector_name="XENONnT", patience=0.5)
+
+    assert [row["probe"] for row in rows] == list(range(8))
+    assert [row["rtt_s"] is None for row in rows] == [False, False, False, True] * 2
+    stats = remote_commands.probe_stats(rows)
+    assert stats["sent"] == 8 and stats["received"] == 6 and stats["loss"] == 0.25
+    assert 10 <= stats["min_ms"] <= stats["p50_ms"] <= stats["p99_ms"] <= stats["max_ms"]
+
+
+def test_probe_cli_writes_csv(broker, tmp_path):
+    from click.testing import CliRunner
+
+    from snews_pt.__main__ import main
+
+    confirm_after(broker, 0)
+    file = tmp_path / "probes.csv"
+    result = CliRunner().invoke(main, ["probe", "-n", "3", "-r", "50", "--csv", str(file)])
+
+    assert result.exit_code == 0, result.output
+    assert "3/3 confirmed, loss 0.0%" in result.output
+    lines = file.read_text().splitlines()
+    assert lines[0] == "probe,sent_time_utc,rtt_ms" and len(lines) == 4
+
+
+def test_session_reuses_its_connections(broker):
+    with remote_commands.RemoteSession(detector_name="XENONnT", admin_pass="pw") as session:
+        for _ in range(3):
+            session.reset_cache()
+        producer = session.pool.get(OBSERVATION_TOPIC)
+        session.write_hb_logs()
+        confirm_after(broker, 0)
+        assert session.test_connection(patience=2) is True
+        consumer = session._consumer
+        assert session.test_connection(patience=2) is True
+
+        assert session.pool.get(OBSERVATION_TOPIC) is producer and len(session.pool) == 1
+        assert session._consumer is consumer
+
+    sent = [json.loads(m) if isinstance(m, str) else m for m in
+            (Deserializer.deserialize(r).content for r in broker.topics[OBSERVATION_TOPIC])]
+    assert [m.get("_id") or m["id"] for m in sent] == ["0_hard-reset"] * 3 + ["0_display-heartbeats"] + \
+        ["0_test-connection"] * 2
+    assert sent[0]["pass"] == "pw" and sent[0]["detector_name"] == "XENONnT"
+
+
+def test_module_functions_share_the_default_session(broker):
+    remote_commands.reset_cache("XENONnT")
+    session = remote_commands.default_session()
+    remote_commands.change_broker("kafka://other", "XENONnT")
+
+    assert remote_commands.default_session() is session and len(session.pool) == 1
+    assert len(broker.topics[OBSERVATION_TOPIC]) == 2
+
+
+def test_requests_resolve_by_correlation_id(broker):
+    replies = []
+
+    def reply(content):
+        message = json.loads(content) if isinstance(content, str) else content
+        replies.append(message)
+        if len(replies) == 3:
+            # answer in reverse order, and one not at all
+            for message in replies[:0:-1]:
+                message["meta"]["status"] = "received"
+                broker.publish(CONFIRMATION_TOPIC, message)
+
+    broker.on_publish(OBSERVATION_TOPIC, reply)
+    with remote_commands.RemoteSession(detector_name="XENONnT", replies=True,
+                                       reply_timeout=0.5) as session:
+        futures = [session.reset_cache(), session.write_hb_logs(), session.get_feedback(
+            email_address="me@example.org")]
+        assert futures[2].result(timeout=2)["_id"] == "0_Get-Feedback"
+        assert futures[1].result(timeout=2)["_id"] == "0_display-heartbeats"
+        with pytest.raises(TimeoutError):
+            futures[0].result(timeout=0.1)
+        # expired by the session once the reply timeout passed
+        time.sleep(0.6)
+        session.request({"_id": "0_hard-reset"}).cancel()
+        assert isinstance(futures[0].exception(timeout=1), TimeoutError)
+        assert not session._pending
+
+    assert len({m["meta"]["correlation_id"] for m in replies}) == 4
+
+
+@pytest.mark.parametrize("start_at", ["EARLIEST", "2000-01-01T00:00:00"])
+def test_connection_seeks_by_time(broker, monkeypatch, start_at):
+    # a long history of confirmations, older than the look back
+    old = int((time.time() - 3600) * 1000)
+    for i in range(500):
+        broker.publish(CONFIRMATION_TOPIC, {"id": "0_test-connection", "meta": {}}, timestamp=old)
+
+    def reply(content):
+        message = json.loads(content)
+        message["meta"]["status"] = "received"
+        message["received_time_utc"] = "now"  # extra fields do not matter
+        broker.publish(CONFIRMATION_TOPIC, message)
+
+    broker.on_publish(OBSERVATION_TOPIC, reply)
+    decoded = []
+    content = remote_commands._content
+    monkeypatch.setattr(remote_commands, "_content", lambda read: decoded.append(1) or content(read))
+
+    assert remote_commands.test_connection("XENONnT", start_at=start_at, patience=2) is True
+    assert len(decoded) == (1 if start_at == "EARLIEST" else 501)
@@ -0,0 +1,39 @@
+"""Test the wire serializers of the Publisher."""
+
+import json
+import pickle
+
+import pytest
+from hop.io import Producer
+from hop.models import JSONBlob
+from snews import messages
+
+from snews_pt.serializers import get_serializer
+
+
+def test_pickle_roundtrip(make_heartbeat):
+    message = make_heartbeat()
+    blob = get_serializer("pickle").serialize(message)
+    assert pickle.loads(blob.content) == message
+
+
+def test_json_is_sent_as_json_format(make_heartbeat):
+    message = make_heartbeat()
+    payload, headers = Producer.pack(get_serializer("json").serialize(message))
+
+    assert b"json" in [v for k, v in headers if k == "_format"]
+    received = JSONBlob.deserialize(payload).content
+    assert received == json.loads(message.model_dump_json())
+    assert messages.HeartbeatMessage(**received) == message
+
+
+def test_msgpack_roundtrip(make_heartbeat):
+    msgpack = pytest.importorskip("msgpack")
+    message = make_heartbeat()
+    blob = get_serializer("msgpack").serialize(message)
+    assert msgpack.unpackb(blob.content)["detector_name"] == "XENONnT"
+
+
+def test_unknown_serializer():
+    with pytest.raises(ValueError):
+        get_serializer("yaml")
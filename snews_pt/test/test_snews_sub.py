@@ -0,0 +1,92 @@
+"""Test how the subscriber names and saves alert files."""
+
+import json
+import os
+from datetime import datetime
+
+from click.testing import CliRunner
+
+from snews_pt import snews_sub
+from snews_pt.__main__ import main
+from snews_pt.benchmarks.throughput import example_alert
+
+
+def _date():
+    return datetime.utcnow().isoformat().split("T")[0]
+
+
+def test_make_file_increments(tmp_path):
+    folder = str(tmp_path)
+    first, second = snews_sub.make_file(folder), snews_sub.make_file(folder)
+
+    assert os.path.basename(first) == f"0-SNEWS_ALERT_{_date()}.json"
+    assert os.path.basename(second) == f"1-SNEWS_ALERT_{_date()}.json"
+    assert os.path.isfile(first) and os.path.isfile(second)
+
+
+def test_make_file_continues_after_existing_files(tmp_path):
+    (tmp_path / f"7-SNEWS_ALERT_{_date()}.json").write_text("{}")
+    assert os.path.basename(snews_sub.make_file(str(tmp_path))).startswith("8-")
+
+
+def test_make_file_skips_names_taken_by_another_subscriber(tmp_path):
+    folder = str(tmp_path)
+    snews_sub.make_file(folder)
+    # another process created the next file in the meantime
+    (tmp_path / f"1-SNEWS_ALERT_{_date()}.json").write_text("{}")
+    assert os.path.basename(snews_sub.make_file(folder)).startswith("2-")
+
+
+def test_save_message(tmp_path):
+    file = snews_sub.save_message({"alert_type": "INITIAL"}, str(tmp_path), return_file=True)
+    assert json.load(open(file)) == {"alert_type": "INITIAL"}
+
+
+def test_subscribe_topics_routes_by_topic(tmp_path, loopback):
+    sub = snews_sub.Subscriber(firedrill_mode=False)
+    other = "kafka://other.broker/snews.alert-extra"
+    received = {"alert": [], "firedrill": [], other: []}
+
+    with loopback() as broker:
+        broker.publish(sub.topic_url("alert"), example_alert(0))
+        broker.publish(sub.topic_url("firedrill"), example_alert(1))
+        broker.publish(sub.topic_url("firedrill"), example_alert(2))
+        broker.publish(sub.topic_url("test"), example_alert(3))
+        broker.publish(other, example_alert(4))
+        sub.subscribe_topics(
+            ["alert", "firedrill", other], outputfolder=str(tmp_path), auth=False,
+            plugin={topic: alerts.append for topic, alerts in received.items()},
+        )
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["alert", "firedrill",
+                                                            "snews.alert-extra"]
+    assert len(list((tmp_path / "firedrill").iterdir())) == 2
+    assert [a["_topic"] for a in received["firedrill"]] == [sub.topic_url("firedrill")] * 2
+    assert len(received["alert"]) == 1
+    saved = json.load(open(next((tmp_path / "snews.alert-extra").iterdir())))
+    assert saved["_topic"] == other
+    # the plugin of a kafka url topic is keyed by the url as given
+    assert [a["_id"] for a in received[other]] == [saved["_id"]]
+
+
+def test_subscribe_cli_runs_plugins_of_kafka_url_topics(tmp_path, loopback):
+    other = "kafka://other.broker/snews.alert-extra"
+    plugins = {}
+    for name in ("default", "extra"):
+        plugins[name] = tmp_path / f"{name}.py"
+        plugins[name].write_text(f"def handle(alert):\n"
+                                 f"    open({str(tmp_path / name)!r}, 'a').write(alert['_id'] + '\\n')\n")
+
+    alerts = [example_alert(0), example_alert(1)]
+    with loopback() as broker:
+        broker.publish(snews_sub.Subscriber(firedrill_mode=False).alert_topic, alerts[0])
+        broker.publish(other, alerts[1])
+        result = CliRunner().invoke(main, [
+            "subscribe", "--no-firedrill", "--no-display", "-o", str(tmp_path / "alerts"),
+            "-t", "alert", "-t", other, "-p", str(plugins["default"]),
+            "-p", f"{other}={plugins['extra']}",
+        ])
+
+    assert result.exit_code == 0, result.output
+    assert (tmp_path / "default").read_text().split() == [alerts[0]["_id"]]
+    assert (tmp_path / "extra").read_text().split() == [alerts[1]["_id"]]
@@ -0,0 +1,60 @@
+"""Keep the command line quick to start, e.g. for heartbeats sent from cron."""
+
+import subprocess
+import sys
+
+# cumulative import times in seconds, generous so slow machines pass too
+HELP_BUDGET = 0.5
+HEARTBEAT_BUDGET = 3.0
+
+# not needed to show the help or to send a heartbeat
+HEAVY = ("hop", "snews", "numpy", "inquirer", "snews_pt.messages", "snews_pt.snews_sub",
+         "snews_pt.auxiliary.try_scenarios", "snews_pt.remote_commands")
+NOT_FOR_HEARTBEAT = ("inquirer", "snews_pt.snews_sub", "snews_pt.pipeline",
+                     "snews_pt.auxiliary.try_scenarios", "snews_pt.remote_commands")
+
+
+def import_times(code):
+    """Run `code` with ``python -X importtime``.
+
+    Returns
+    -------
+    dict
+        Cumulative import time in seconds of every imported module.
+    float
+        Total of the top level imports.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True, check=True)
+    times, total = {}, 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative) / 1e6
+        if not name.startswith("  "):
+            total += int(cumulative) / 1e6
+    return times, total
+
+
+def test_help_imports_only_the_command_line():
+    times, _ = import_times(
+        "from snews_pt.__main__ import main\n"
+        "for args in (['--help'], ['heartbeat', '--help']):\n"
+        "    main(args, standalone_mode=False)\n"
+    )
+    assert not [module for module in HEAVY if module in times]
+    assert times["snews_pt.__main__"] < HELP_BUDGET, times["snews_pt.__main__"]
+
+
+def test_heartbeat_imports_only_the_publisher():
+    times, total = import_times(
+        "from unittest import mock\n"
+        "from snews_pt.__main__ import main\n"
+        "with mock.patch('snews_pt.core.connections.Stream') as stream:\n"
+        "    main(['heartbeat', '--status', 'ON'], standalone_mode=False)\n"
+        "assert stream.return_value.open.return_value.write.call_count == 1\n"
+    )
+    assert "snews_pt.messages" in times
+    assert not [module for module in NOT_FOR_HEARTBEAT if module in times]
+    assert total < HEARTBEAT_BUDGET, total